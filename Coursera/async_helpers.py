@@ -0,0 +1,43 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import render
+
+
+def _load_user(request):
+    # Evaluating the lazy user also loads the session, so later reads are in memory
+    request.user.is_authenticated
+    return request.user
+
+
+aget_user = sync_to_async(_load_user)
+
+# Templates may still touch lazy relations or the cache, so they render off the event loop
+arender = sync_to_async(render)
+
+
+def run_blocking(func):
+    """Run blocking network I/O (Stripe, SMTP) in a worker thread so the event loop keeps serving."""
+    return sync_to_async(func, thread_sensitive=False)
+
+
+def async_login_required(view_func, login_url=None):
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), login_url or settings.LOGIN_URL)
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class AsyncLoginRequiredMixin:
+    login_url = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), self.login_url or settings.LOGIN_URL)
+        return await super().dispatch(request, *args, **kwargs)
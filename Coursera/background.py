@@ -0,0 +1,52 @@
+"""
+Minimal background execution for work that must not block a request.
+
+Jobs are handed to a small thread pool once the surrounding transaction
+commits. Anything that has to survive a process restart should also be
+recoverable from the database by a management command.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+                                       thread_name_prefix='background')
+    return _executor
+
+
+def _call(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background job %s failed', getattr(func, '__name__', func))
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        _call(func, args, kwargs)
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args, **kwargs):
+    # BACKGROUND_TASKS_EAGER runs jobs inline, e.g. in tests
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        _call(func, args, kwargs)
+        return
+    _get_executor().submit(_run, func, args, kwargs)
+
+
+def defer(func, *args, **kwargs):
+    """Run `func` in the background after the current transaction commits."""
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
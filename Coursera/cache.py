@@ -0,0 +1,152 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+# Django builds a cache instance per thread; the LRU is kept per process
+_locals = {}
+_locks = {}
+
+
+class TieredCache(BaseCache):
+    """
+    A bounded in-process LRU in front of a shared cache alias (LOCATION).
+
+    Writes go through to the shared cache and replace the local copy; reads
+    are answered locally for at most LOCAL_TIMEOUT seconds, so a change made
+    by another process is visible within that window.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._local_max_entries = options.get('LOCAL_MAX_ENTRIES', 500)
+        self._local = _locals.setdefault(location, OrderedDict())
+        self._lock = _locks.setdefault(location, threading.Lock())
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_key(self, key, version):
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def _local_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self._local_timeout
+        return min(self._local_timeout, timeout)
+
+    def _get_local(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return _MISSING
+            expires, pickled = entry
+            if expires <= time.monotonic():
+                del self._local[local_key]
+                return _MISSING
+            self._local.move_to_end(local_key)
+        return pickle.loads(pickled)
+
+    def _set_local(self, local_key, value, timeout=DEFAULT_TIMEOUT):
+        ttl = self._local_ttl(timeout)
+        if ttl <= 0:
+            self._evict_local(local_key)
+            return
+        # Pickled like LocMemCache so callers never share a mutable object
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + ttl, pickled)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _evict_local(self, local_key):
+        with self._lock:
+            self._local.pop(local_key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        value = self._get_local(local_key)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._set_local(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys:
+            value = self._get_local(self._local_key(key, version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._set_local(self._local_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        if self._get_local(self._local_key(key, version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._set_local(self._local_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key in failed:
+                self._evict_local(self._local_key(key, version))
+            else:
+                self._set_local(self._local_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._set_local(local_key, value, timeout)
+        else:
+            # Another process owns the key; its value may differ from ours
+            self._evict_local(local_key)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._evict_local(self._local_key(key, version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        self._evict_local(local_key)
+        value = self.shared.incr(key, delta, version=version)
+        self._set_local(local_key, value)
+        return value
+
+    def delete(self, key, version=None):
+        self._evict_local(self._local_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._evict_local(self._local_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
@@ -0,0 +1,74 @@
+import datetime
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+
+def conditional_page(version_func):
+    """
+    Conditional GET for a rendered page. version_func(request, *args, **kwargs)
+    returns (last_modified, parts) describing the content, or None to always
+    render. The ETag also covers the viewer and the deployed release, so a
+    template change or a login never serves a stale page from the browser cache.
+    """
+    def version(request, *args, **kwargs):
+        # Queued flash messages only show on a full render
+        if request.COOKIES.get('messages'):
+            return None
+        if not hasattr(request, '_content_version'):
+            request._content_version = version_func(request, *args, **kwargs)
+        return request._content_version
+
+    def etag_func(request, *args, **kwargs):
+        content = version(request, *args, **kwargs)
+        if content is None:
+            return None
+        viewer = request.user.pk if request.user.is_authenticated else 'anon'
+        raw = '|'.join(str(part) for part in (settings.RELEASE_VERSION, viewer, content[0]) + tuple(content[1]))
+        return 'W/"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+
+    def last_modified_func(request, *args, **kwargs):
+        content = version(request, *args, **kwargs)
+        # If-Modified-Since alone can't tell viewers apart, so only anonymous pages use it
+        if content is None or request.user.is_authenticated:
+            return None
+        return content[0]
+
+    def validators(request, *args, **kwargs):
+        last_modified = last_modified_func(request, *args, **kwargs)
+        if last_modified is not None:
+            if not timezone.is_aware(last_modified):
+                last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)
+            last_modified = int(last_modified.timestamp())
+        return etag_func(request, *args, **kwargs), last_modified
+
+    # Django 4.2's condition() is sync only; this mirrors it for async views
+    def async_condition(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            # The version lookup reads the database and cache, so it runs off the event loop
+            etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+
+    sync_condition = condition(etag_func=etag_func, last_modified_func=last_modified_func)
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            return async_condition(view_func)
+        return sync_condition(view_func)
+    return decorator
@@ -0,0 +1,76 @@
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA = 'replica'
+# Apps whose reads tolerate a little replication lag; everything else,
+# memberships, auth and sessions included, always reads the primary.
+REPLICA_APPS = {'courses', 'blog', 'users', 'search'}
+PIN_COOKIE = 'db_pin'
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('db_router_state', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def get_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def start_request(pinned=False):
+    state = RequestState(pinned)
+    _state.set(state)
+    return state
+
+
+def end_request():
+    _state.set(None)
+
+
+def pinned_by_cookie(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def is_pinned():
+    state = _state.get()
+    return state is not None and (state.pinned or state.wrote)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send catalog, blog and profile reads to the replica when one is
+    configured. Every write goes to the primary, and a request that wrote,
+    or arrives within REPLICA_PIN_SECONDS of one from the same browser,
+    reads the primary too, so users always see their own changes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if replica_configured() and model._meta.app_label in REPLICA_APPS and not is_pinned():
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == 'default'
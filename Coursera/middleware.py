@@ -0,0 +1,110 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from Coursera import db_router, profiling
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/xhtml+xml',
+    'image/svg+xml',
+)
+
+
+def is_compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_CONTENT_TYPES
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress text responses with brotli when both the client and the server
+    (the optional brotli package) support it, and gzip otherwise. Pages that
+    carry a CSRF token always use gzip, for Django's BREACH mitigation. Media and
+    other binary responses pass through untouched so byte ranges keep working.
+    """
+
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        if not is_compressible(response):
+            return response
+        accepts_brotli = re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        # Pages holding a CSRF token need GZipMiddleware's BREACH mitigation, which brotli lacks
+        if brotli is None or response.streaming or not accepts_brotli or request.META.get('CSRF_COOKIE_USED'):
+            return super().process_response(request, response)
+
+        if len(response.content) < 200 or response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Track whether a request wrote to the primary, and if so pin the browser
+    to the primary for REPLICA_PIN_SECONDS so its next reads can't be stale.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = db_router.start_request(pinned=db_router.pinned_by_cookie(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.end_request()
+        if state.wrote and db_router.replica_configured():
+            seconds = db_router.get_pin_seconds()
+            response.set_cookie(db_router.PIN_COOKIE, str(time.time() + seconds), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Time each request's database, template and outbound work, report it as
+    Server-Timing and feed the slow-request log and staff report. Only loaded
+    when PROFILING_ENABLED is set; it should be the outermost middleware.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        profiling.install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = profiling.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile = profiling.stop(token)
+        # The serverless handler merges its cold start phases into this header
+        response['Server-Timing'] = profile.server_timing()
+        profiling.record(request, profile)
+        return response
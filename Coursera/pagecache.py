@@ -0,0 +1,119 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from Coursera import db_router
+
+# Anonymous pages are cached whole, keyed by path and a content version that
+# any catalog or blog change bumps, so invalidation never has to find keys.
+VERSION_KEY = 'pagecache:version'
+CHANGED_KEY = 'pagecache:changed'
+PAGE_KEY = 'pagecache:page:{release}:{version}:{path}'
+
+CACHED_HEADERS = ('Content-Type', 'Content-Language', 'ETag', 'Last-Modified')
+
+
+def get_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+    cache.set(CHANGED_KEY, time.time(), None)
+
+
+def can_store():
+    # Right after a change the replica may still serve the old content; don't cache it
+    if not db_router.replica_configured():
+        return True
+    return time.time() - cache.get(CHANGED_KEY, 0) > db_router.get_pin_seconds()
+
+
+def page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(release=settings.RELEASE_VERSION, version=get_version(), path=path)
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+        return False
+    # Queued flash messages are rendered into the page for this visitor only
+    if request.COOKIES.get('messages'):
+        return False
+    return not request.user.is_authenticated
+
+
+def _from_cache(request, entry):
+    content, status, headers = entry
+    conditional = get_conditional_response(
+        request, etag=headers.get('ETag'), last_modified=parse_http_date_safe(headers.get('Last-Modified', '')))
+    response = conditional or HttpResponse(content, status=status)
+    for name, value in headers.items():
+        response.headers.setdefault(name, value)
+    response.headers['X-Page-Cache'] = 'hit'
+    return response
+
+
+def _lookup(request):
+    """Return (key, cached response) for a cacheable request, (None, None) otherwise."""
+    if not is_cacheable_request(request):
+        return None, None
+    key = page_key(request)
+    entry = cache.get(key)
+    return key, _from_cache(request, entry) if entry is not None else None
+
+
+def _store(key, response):
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    # Responses that set cookies (CSRF, sessions, consumed messages) are per visitor
+    if response.status_code == 200 and not response.streaming and not response.cookies and can_store():
+        headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+        cache.set(key, (response.content, response.status_code, headers), get_timeout())
+        response.headers['X-Page-Cache'] = 'miss'
+    return response
+
+
+def cache_anonymous_page(view_func):
+    """Serve anonymous GETs from the page cache, storing plain 200 responses on a miss."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            # Loading the user and reading the cache may block, so they run off the event loop
+            key, cached = await sync_to_async(_lookup)(request)
+            if cached is not None:
+                return cached
+            response = await view_func(request, *args, **kwargs)
+            if key is None:
+                return response
+            return await sync_to_async(_store)(key, response)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key, cached = _lookup(request)
+        if cached is not None:
+            return cached
+        response = view_func(request, *args, **kwargs)
+        if key is None:
+            return response
+        return _store(key, response)
+    return wrapper
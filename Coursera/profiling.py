@@ -0,0 +1,246 @@
+"""
+Opt-in per-request profiling, enabled with PROFILING_ENABLED.
+
+ProfilingMiddleware opens a RequestProfile for each request. Hooks installed
+once per process add database, template and outbound (Stripe HTTP, email)
+time to it. Totals are sent as Server-Timing, requests slower than
+PROFILING_SLOW_MS are logged with their SQL, and statistics per URL pattern
+are merged into a shared cache for the staff report.
+"""
+import logging
+import math
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'profiling:stats'
+SLOW_KEY = 'profiling:slow'
+MAX_SAMPLES = 200
+MAX_SLOW_REQUESTS = 50
+MAX_LOGGED_QUERIES = 50
+FLUSH_SECONDS = 10
+
+_current = ContextVar('request_profile', default=None)
+_installed = False
+_install_lock = threading.Lock()
+
+# Each worker accumulates locally and merges into the cache every FLUSH_SECONDS
+_pending = {}
+_pending_slow = []
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.db_count = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.external_count = 0
+        self.external_ms = 0.0
+        self.queries = []
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        # Queries run while a template renders count towards both db and tpl
+        return ', '.join([
+            'db;dur={:.1f};desc="{} queries"'.format(self.db_ms, self.db_count),
+            'tpl;dur={:.1f}'.format(self.template_ms),
+            'ext;dur={:.1f};desc="{} calls"'.format(self.external_ms, self.external_count),
+            'total;dur={:.1f}'.format(self.total_ms),
+        ])
+
+
+def get_slow_ms():
+    return getattr(settings, 'PROFILING_SLOW_MS', 500)
+
+
+def get_cache():
+    return caches[getattr(settings, 'PROFILING_CACHE_ALIAS', 'default')]
+
+
+def start():
+    return _current.set(RequestProfile())
+
+
+def stop(token):
+    profile = _current.get()
+    _current.reset(token)
+    profile.finish()
+    return profile
+
+
+def _timed(duration, counter=None):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                setattr(profile, duration, getattr(profile, duration) + (time.perf_counter() - started) * 1000)
+                if counter:
+                    setattr(profile, counter, getattr(profile, counter) + 1)
+        return wrapper
+    return decorator
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        profile.db_count += 1
+        profile.db_ms += ms
+        if len(profile.queries) < MAX_LOGGED_QUERIES:
+            profile.queries.append((round(ms, 1), sql))
+
+
+def _add_query_wrapper(sender=None, connection=None, **kwargs):
+    # connection_created fires again on reconnect; the wrapper list survives it
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install():
+    """Hook the database, template and outbound call paths. Safe to call repeatedly."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        import http.client
+
+        from django.core.mail.message import EmailMessage
+        from django.db.backends.signals import connection_created
+        from django.template.backends.django import Template
+
+        Template.render = _timed('template_ms')(Template.render)
+        # Both urllib and urllib3 (requests, and so Stripe) send and read through these
+        http.client.HTTPConnection.send = _timed('external_ms')(http.client.HTTPConnection.send)
+        http.client.HTTPConnection.getresponse = _timed('external_ms', 'external_count')(
+            http.client.HTTPConnection.getresponse)
+        EmailMessage.send = _timed('external_ms', 'external_count')(EmailMessage.send)
+
+        connection_created.connect(_add_query_wrapper)
+        for connection in connections.all(initialized_only=True):
+            _add_query_wrapper(connection=connection)
+        _installed = True
+
+
+def _new_stats():
+    return {'count': 0, 'slow': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'db_count': 0, 'db_ms': 0.0,
+            'template_ms': 0.0, 'external_ms': 0.0, 'samples': []}
+
+
+def _merge(stats, other):
+    for field in ('count', 'slow', 'total_ms', 'db_count', 'db_ms', 'template_ms', 'external_ms'):
+        stats[field] += other[field]
+    stats['max_ms'] = max(stats['max_ms'], other['max_ms'])
+    stats['samples'] = (stats['samples'] + other['samples'])[-MAX_SAMPLES:]
+
+
+def record(request, profile):
+    """Add a finished request to this worker's statistics and log it if it was slow."""
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else None
+    slow = profile.total_ms >= get_slow_ms()
+    if slow:
+        logger.warning('Slow request %s %s (%s) took %.1f ms, %d queries in %.1f ms\n%s',
+                       request.method, request.path, view_name, profile.total_ms, profile.db_count, profile.db_ms,
+                       '\n'.join('{:>8.1f} ms  {}'.format(ms, sql) for ms, sql in profile.queries))
+    # Static files and 404s have no URL pattern to group under
+    if view_name is None:
+        return
+    with _pending_lock:
+        stats = _pending.setdefault(view_name, _new_stats())
+        _merge(stats, {
+            'count': 1, 'slow': int(slow), 'total_ms': profile.total_ms, 'max_ms': profile.total_ms,
+            'db_count': profile.db_count, 'db_ms': profile.db_ms, 'template_ms': profile.template_ms,
+            'external_ms': profile.external_ms, 'samples': [round(profile.total_ms, 1)],
+        })
+        if slow:
+            _pending_slow.append({
+                'time': time.time(), 'method': request.method, 'path': request.get_full_path(),
+                'view_name': view_name, 'total_ms': round(profile.total_ms, 1), 'db_count': profile.db_count,
+                'queries': profile.queries,
+            })
+        due = time.monotonic() - _last_flush >= FLUSH_SECONDS
+    if due:
+        flush()
+
+
+def flush():
+    """Merge this worker's pending statistics into the shared cache."""
+    global _last_flush
+    with _pending_lock:
+        pending, slow = dict(_pending), list(_pending_slow)
+        _pending.clear()
+        _pending_slow.clear()
+        _last_flush = time.monotonic()
+    if not pending and not slow:
+        return
+    # Read-modify-write: a concurrent flush from another worker can drop a
+    # batch, which is acceptable for sampling statistics.
+    cache = get_cache()
+    stored = cache.get(STATS_KEY) or {}
+    for view_name, stats in pending.items():
+        _merge(stored.setdefault(view_name, _new_stats()), stats)
+    cache.set(STATS_KEY, stored, None)
+    if slow:
+        cache.set(SLOW_KEY, ((cache.get(SLOW_KEY) or []) + slow)[-MAX_SLOW_REQUESTS:], None)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def report():
+    """Per URL pattern statistics, worst 95th percentile first, and the recent slow requests."""
+    flush()
+    cache = get_cache()
+    rows = []
+    for view_name, stats in (cache.get(STATS_KEY) or {}).items():
+        count = stats['count']
+        rows.append({
+            'view_name': view_name,
+            'count': count,
+            'slow': stats['slow'],
+            'mean_ms': stats['total_ms'] / count,
+            'p50_ms': percentile(stats['samples'], 0.5),
+            'p95_ms': percentile(stats['samples'], 0.95),
+            'max_ms': stats['max_ms'],
+            'db_count': stats['db_count'] / count,
+            'db_ms': stats['db_ms'] / count,
+            'template_ms': stats['template_ms'] / count,
+            'external_ms': stats['external_ms'] / count,
+        })
+    rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return rows, list(reversed(cache.get(SLOW_KEY) or []))
+
+
+def reset():
+    with _pending_lock:
+        _pending.clear()
+        _pending_slow.clear()
+    get_cache().delete_many([STATS_KEY, SLOW_KEY])
@@ -61,18 +61,38 @@ INSTALLED_APPS = [
     'memberships.apps.MembershipsConfig',
     'users.apps.UsersConfig',
     'blog.apps.BlogConfig',
+    'search.apps.SearchConfig',
     'crispy_forms',
     'crispy_bootstrap4',
     'allauth',
 ]
 
+# Serverless deployments can leave the admin out of the public function to
+# shorten cold starts; run the admin from a regular deployment instead.
+SERVERLESS_PUBLIC_ONLY = os.getenv('SERVERLESS_PUBLIC_ONLY', 'False').lower() in ('true', '1', 't')
+if SERVERLESS_PUBLIC_ONLY:
+    INSTALLED_APPS.remove('django.contrib.admin')
+
+# Compiled by Coursera.startup.warm_templates before the first request
+WARM_TEMPLATES = [
+    'base.html',
+    'index.html',
+    'courses/course_list.html',
+    'courses/course_detail.html',
+    'blog/post_list.html',
+]
+
 MIDDLEWARE = [
+    'Coursera.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'Coursera.middleware.CompressionMiddleware',
+    'Coursera.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'memberships.middleware.MembershipMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -105,6 +125,19 @@ AUTHENTICATION_BACKENDS = (
 )
 
 WSGI_APPLICATION = 'Coursera.wsgi.application'
+ASGI_APPLICATION = 'Coursera.asgi.application'
+
+# Part of every page ETag, so browsers revalidate after a deploy changes the templates
+RELEASE_VERSION = os.getenv('RELEASE_VERSION') or os.getenv('RENDER_GIT_COMMIT') or os.getenv('VERCEL_GIT_COMMIT_SHA', '')
+
+# Whole-page cache for anonymous visitors to the landing and catalog pages
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '600'))
+# Newest courses listed on each home page category card
+HOME_COURSES_PER_CATEGORY = int(os.getenv('HOME_COURSES_PER_CATEGORY', '3'))
+
+# Route the catalog and payment pages to their async views; only worth it under an ASGI server
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() in ('true', '1', 't')
 
 
 # Database
@@ -126,8 +159,65 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+
+# Optional read replica for catalog, blog and profile reads (see Coursera/db_router.py)
+if dj_database_url and os.getenv('REPLICA_DATABASE_URL'):
+    DATABASES['replica'] = dj_database_url.parse(os.getenv('REPLICA_DATABASE_URL'), conn_max_age=600)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['Coursera.db_router.PrimaryReplicaRouter']
+# How long a browser keeps reading the primary after it wrote something
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+# Cache
+# The shared tier is what every worker sees: CACHE_URL may be file:///path,
+# redis://host:6379/0 or memcached://host:11211, and defaults to this process's
+# memory. The default cache keeps a small LRU of it in-process (Coursera/cache.py).
+# redis:// and memcached:// need the optional redis or pymemcache package.
+
+def _cache_from_url(url):
+    if not url or url.startswith('locmem://'):
+        return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'coursera-shared'}
+    if url.startswith('file://'):
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': url[len('file://'):]}
+    if url.startswith(('redis://', 'rediss://')):
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url}
+    if url.startswith('memcached://'):
+        return {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+                'LOCATION': url[len('memcached://'):]}
+    raise ValueError(f'Unsupported CACHE_URL scheme: {url}')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'Coursera.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': int(os.getenv('CACHE_LOCAL_TIMEOUT', '5')),
+            'LOCAL_MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '500')),
+        },
+    },
+    'shared': _cache_from_url(os.getenv('CACHE_URL', '')),
+}
+
+# Sessions: 'cached_db' reads from the shared cache and only falls back to the
+# database on a miss; 'signed_cookies' keeps the session in the browser. A
+# locmem 'shared' cache lives in one process, so a logout handled by one worker
+# would never reach the others: sessions stay in the database unless CACHE_URL
+# names a cache that every worker sees.
+SHARED_CACHE_IS_LOCAL = CACHES['shared']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+SESSION_MODE = os.getenv('SESSION_MODE', 'db' if SHARED_CACHE_IS_LOCAL else 'cached_db')
+if SESSION_MODE in ('cached_db', 'cache') and SHARED_CACHE_IS_LOCAL:
+    raise ValueError(f'SESSION_MODE={SESSION_MODE} needs CACHE_URL to name a cache shared by all workers')
+SESSION_ENGINE = {
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}[SESSION_MODE]
+# Sessions skip the in-process tier of the default cache
+SESSION_CACHE_ALIAS = 'shared'
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -178,6 +268,13 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Lesson videos are served through an access-checked view. Set to
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache) to let the front proxy
+# send the file; nginx needs an internal location at LESSON_MEDIA_ACCEL_PREFIX
+# aliased to MEDIA_ROOT.
+LESSON_MEDIA_OFFLOAD = os.getenv('LESSON_MEDIA_OFFLOAD', '')
+LESSON_MEDIA_ACCEL_PREFIX = os.getenv('LESSON_MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 SITE_ID = 1
@@ -214,5 +311,18 @@ ACCOUNT_LOGIN_ON_EMAIL_CONFIRMATION = True
 
 
 
+# Request profiling: Server-Timing headers, a slow-request log and the staff report at /profiling/
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() in ('true', '1', 't')
+PROFILING_SLOW_MS = int(os.getenv('PROFILING_SLOW_MS', '500'))
+# Statistics are merged across workers, so they skip the in-process cache tier
+PROFILING_CACHE_ALIAS = 'shared'
+
+# Threads used by Coursera.background for work deferred off the request path
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '2'))
+
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
+# Optional API base for a local Stripe stand-in, e.g. http://localhost:12111 for stripe-mock
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
+# Signing secret of the endpoint registered for /stripe/webhook/
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
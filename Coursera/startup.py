@@ -0,0 +1,48 @@
+"""
+Helpers for keeping serverless cold starts short and measurable.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+
+def warm_templates(names=None):
+    """
+    Compile templates into the cached loader so the first request does not
+    pay for parsing them. Returns the number of templates compiled.
+    """
+    warmed = 0
+    for name in names if names is not None else getattr(settings, 'WARM_TEMPLATES', []):
+        try:
+            get_template(name)
+            warmed += 1
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            logger.warning('Could not warm template %s', name, exc_info=True)
+    return warmed
+
+
+class ColdStartTimer:
+    """Accumulates named startup phases in milliseconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def phase(self, name, since):
+        self.phases[name] = (time.perf_counter() - since) * 1000
+
+    @property
+    def total_ms(self):
+        return sum(self.phases.values())
+
+    def server_timing(self):
+        return ', '.join('coldstart-{};dur={:.1f}'.format(name, ms) for name, ms in self.phases.items())
+
+    def report(self):
+        return 'cold_start total_ms={:.1f} {}'.format(
+            self.total_ms, ' '.join('{}_ms={:.1f}'.format(name, ms) for name, ms in self.phases.items()))
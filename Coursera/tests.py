@@ -0,0 +1,210 @@
+import base64
+import contextlib
+import gzip
+import importlib
+import io
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from Coursera import db_router, profiling
+from Coursera.cache import TieredCache
+from Coursera.db_router import PrimaryReplicaRouter
+from Coursera.middleware import ReplicaPinningMiddleware
+from Coursera.startup import ColdStartTimer, warm_templates
+from blog.models import Post
+from courses.models import Category, Course
+from memberships.models import UserMembership
+
+
+@mock.patch('Coursera.db_router.replica_configured', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.addCleanup(db_router.end_request)
+
+    def test_catalog_reads_use_replica_and_memberships_stay_on_primary(self, configured):
+        db_router.start_request()
+        self.assertEqual(self.router.db_for_read(Course), 'replica')
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertEqual(self.router.db_for_read(UserMembership), 'default')
+        self.assertEqual(self.router.db_for_write(Course), 'default')
+
+    def test_request_that_wrote_reads_primary_and_pins_browser(self, configured):
+        def view(request):
+            self.assertEqual(self.router.db_for_read(Course), 'replica')
+            self.router.db_for_write(UserMembership)
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(RequestFactory().post('/'))
+        pin = response.cookies[db_router.PIN_COOKIE]
+
+        def next_view(request):
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = pin.value
+        response = ReplicaPinningMiddleware(next_view)(request)
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_expired_pin_reads_replica_again(self, configured):
+        request = RequestFactory().get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = str(time.time() - 1)
+        self.assertFalse(db_router.pinned_by_cookie(request))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'Coursera.cache.TieredCache', 'LOCATION': 'tier-test',
+                'OPTIONS': {'LOCAL_TIMEOUT': 60, 'LOCAL_MAX_ENTRIES': 2}},
+    'tier-test': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tier-test'},
+})
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.shared = caches['tier-test']
+
+    def test_reads_are_served_locally_and_writes_go_through(self):
+        tiered = caches['default']
+        self.assertIsInstance(tiered, TieredCache)
+        tiered.set('course', {'title': 'Django'})
+        self.assertEqual(self.shared.get('course'), {'title': 'Django'})
+
+        # Another worker's write is only seen once the local copy expires
+        self.shared.set('course', {'title': 'Flask'})
+        self.assertEqual(tiered.get('course'), {'title': 'Django'})
+        tiered.delete('course')
+        self.assertIsNone(tiered.get('course'))
+
+    def test_local_tier_is_bounded_and_shared_misses_are_filled(self):
+        tiered = caches['default']
+        self.shared.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(tiered.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2, 'c': 3})
+        self.shared.set_many({'a': 10, 'b': 20, 'c': 30})
+        # 'a' was evicted as least recently used; 'b' and 'c' are still local
+        self.assertEqual(tiered.get_many(['a', 'b', 'c']), {'a': 10, 'b': 2, 'c': 3})
+
+    def test_counters_stay_consistent(self):
+        tiered = caches['default']
+        tiered.add('version', 1)
+        self.shared.incr('version')
+        self.assertEqual(tiered.incr('version'), 3)
+        self.assertEqual(tiered.get('version'), 3)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   PROFILING_ENABLED=True, PROFILING_SLOW_MS=0)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profiling.install()
+        profiling.reset()
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        category = Category.objects.create(category='python')
+        Course.objects.create(creator=self.user, slug='django', title='Django', category=category,
+                              description='Learn Django', duration='1 hafta')
+
+    def test_requests_report_server_timing_and_reach_the_slow_log(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('Coursera.profiling', 'WARNING') as logs:
+            response = self.client.get('/courses/django/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+        self.assertIn('courses:course_detail', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+        rows, slow_requests = profiling.report()
+        self.assertEqual([row['view_name'] for row in rows], ['courses:course_detail'])
+        self.assertEqual(rows[0]['count'], 1)
+        self.assertGreater(rows[0]['db_count'], 0)
+        self.assertEqual(slow_requests[0]['path'], '/courses/django/')
+
+    def test_outbound_email_counts_as_external_time(self):
+        token = profiling.start()
+        mail.send_mail('Subject', 'Body', 'support@courseraclone.com', ['student@example.com'])
+        profile = profiling.stop(token)
+        self.assertEqual(profile.external_count, 1)
+
+    def test_report_is_staff_only(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('Coursera.profiling', 'WARNING'):
+            self.client.get('/courses/django/')
+            self.assertEqual(self.client.get('/profiling/').status_code, 302)
+            User.objects.filter(pk=self.user.pk).update(is_staff=True)
+            self.assertContains(self.client.get('/profiling/'), 'courses:course_detail')
+
+
+class FakeVercelRequest:
+    def __init__(self, path, headers):
+        self.method = 'GET'
+        self.path = self.url = path
+        self.headers = dict(headers, host='testserver')
+        self.body = b''
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ServerlessTestCase(TestCase):
+    def setUp(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.serverless = importlib.import_module('api.index')
+        # Like the test client, keep request signals from closing the test transaction's connection
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        category = Category.objects.create(category='python')
+        Course.objects.create(creator=user, slug='django', title='Django', category=category,
+                              description='Learn Django', duration='1 hafta')
+
+
+class ServerlessHandlerTests(ServerlessTestCase):
+    def test_compressed_response_is_base64_encoded(self):
+        response = self.serverless.handler(FakeVercelRequest('/courses/', {'accept-encoding': 'gzip'}))
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertTrue(response['isBase64Encoded'])
+        self.assertIn(b'Learn Django', gzip.decompress(base64.b64decode(response['body'])))
+
+        response = self.serverless.handler(FakeVercelRequest('/courses/', {}))
+        self.assertFalse(response['isBase64Encoded'])
+        self.assertIn('Learn Django', response['body'])
+
+    @mock.patch('api.index.MAX_BUFFERED_BODY', 100)
+    def test_oversized_response_is_refused(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            response = self.serverless.handler(FakeVercelRequest('/courses/', {}))
+        self.assertEqual(response['statusCode'], 502)
+
+
+class ColdStartTests(ServerlessTestCase):
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SLOW_MS=60000)
+    def test_cold_start_timing_joins_the_profiling_header(self):
+        app = WSGIHandler()
+        with mock.patch('api.index.django_app', app), \
+                mock.patch('api.index._pending_cold_start_timing', ['django;dur=120.0']):
+            response = self.serverless.handler(FakeVercelRequest('/courses/', {}))
+        self.assertNotIn('multiValueHeaders', response)
+        self.assertRegex(response['headers']['Server-Timing'], r'^django;dur=120\.0, db;dur=[\d.]+;desc=')
+
+    def test_warm_templates_skips_missing_templates(self):
+        with self.assertLogs('Coursera.startup', 'WARNING') as logs:
+            self.assertEqual(warm_templates(['base.html', 'missing.html']), 1)
+        self.assertIn('missing.html', logs.output[0])
+
+    def test_timer_reports_each_phase(self):
+        timer = ColdStartTimer()
+        timer.phases = {'imports': 12.0, 'django': 30.5}
+        self.assertEqual(timer.total_ms, 42.5)
+        self.assertEqual(timer.server_timing(), 'coldstart-imports;dur=12.0, coldstart-django;dur=30.5')
+        self.assertEqual(timer.report(), 'cold_start total_ms=42.5 imports_ms=12.0 django_ms=30.5')
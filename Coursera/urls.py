@@ -1,21 +1,33 @@
-from django.contrib import admin
-from django.urls import path,include
+from django.apps import apps
+from django.urls import path,include,re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.static import serve
+
+from Coursera.views import profiling_report
 
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', include('courses.urls',namespace='courses')),
     path('', include('blog.urls',namespace='blogs')),
     path('', include('memberships.urls',namespace='memberships')),
     path('', include('users.urls',namespace='users')),
+    path('', include('search.urls',namespace='search')),
     path('accounts/', include('allauth.urls')),
+    path('profiling/', profiling_report, name='profiling_report'),
 ]
 
+# The admin is left out of SERVERLESS_PUBLIC_ONLY deployments
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Lesson videos are only reachable through courses:lesson_video
+if settings.DEBUG:
+    urlpatterns += [
+        re_path(r'^media/(?!videos/)(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
 
 
 
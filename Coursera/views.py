@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.shortcuts import render
+
+from Coursera import profiling
+from courses.views import staff_required
+
+
+@staff_required
+def profiling_report(request):
+    rows, slow_requests = profiling.report()
+    return render(request, 'profiling.html', {
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'slow_ms': profiling.get_slow_ms(),
+        'rows': rows,
+        'slow_requests': slow_requests,
+    })
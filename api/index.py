@@ -1,9 +1,16 @@
 """
 Vercel serverless function handler for Django application
 """
+import time
+
+_import_started = time.perf_counter()
+
+import base64
 import os
 import sys
+from io import BytesIO
 from pathlib import Path
+from urllib.parse import urlparse
 
 # Add project root to Python path
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -14,15 +21,196 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Coursera.settings')
 
 # Import Django WSGI application
 from django.core.wsgi import get_wsgi_application
+from Coursera.startup import ColdStartTimer, warm_templates
+
+cold_start = ColdStartTimer()
+cold_start.phase('imports', _import_started)
 
 # Initialize Django application (only once, outside handler)
 try:
+    phase_started = time.perf_counter()
     django_app = get_wsgi_application()
+    cold_start.phase('django', phase_started)
+
+    # Compile the hot templates now rather than on the first request
+    if os.getenv('COLD_START_WARM_TEMPLATES', 'True').lower() in ('true', '1', 't'):
+        phase_started = time.perf_counter()
+        warm_templates()
+        cold_start.phase('templates', phase_started)
+    print(cold_start.report(), file=sys.stderr)
 except Exception as e:
     # Log error if Django fails to initialize
     print(f"Error initializing Django: {e}", file=sys.stderr)
     django_app = None
 
+# Set on the first response only, so cold starts show up in browser timings
+_pending_cold_start_timing = [cold_start.server_timing()]
+
+# Largest response body the buffered handler will hold in memory
+MAX_BUFFERED_BODY = int(os.getenv('VERCEL_MAX_RESPONSE_BYTES', str(6 * 1024 * 1024)))
+
+TEXT_CONTENT_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/xhtml+xml',
+    'image/svg+xml',
+)
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+def _error(status, message):
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'text/plain'},
+        'body': message,
+    }
+
+
+def _read_body(request):
+    """Return the request body as bytes without intermediate copies."""
+    try:
+        if hasattr(request, 'body'):
+            body = request.body
+            if isinstance(body, (bytes, bytearray, memoryview)):
+                return body
+            if body:
+                return str(body).encode('utf-8')
+            return b''
+        if hasattr(request, 'read'):
+            return request.read()
+        if hasattr(request, 'get_body'):
+            return request.get_body()
+    except Exception:
+        pass
+    return b''
+
+
+def _read_headers(request):
+    try:
+        if hasattr(request, 'headers'):
+            req_headers = request.headers
+            if isinstance(req_headers, dict):
+                return req_headers
+            if hasattr(req_headers, 'items'):
+                return dict(req_headers.items())
+            if hasattr(req_headers, 'get'):
+                return {k: req_headers.get(k) for k in dir(req_headers) if not k.startswith('_')}
+        elif hasattr(request, 'get'):
+            # Try to get headers as dict
+            return request.get('headers', {})
+    except Exception:
+        pass
+    return {}
+
+
+def _build_environ(request, body):
+    method = getattr(request, 'method', 'GET')
+
+    # Get URL path
+    url = getattr(request, 'url', '')
+    path = getattr(request, 'path', url)
+    if not url:
+        url = path
+    parsed = urlparse(url if url.startswith('http') else f'https://example.com{url}')
+
+    # Normalize headers (handle case-insensitive)
+    headers = {key.lower(): value for key, value in _read_headers(request).items()}
+
+    host = headers.get('host', 'localhost')
+    server_name = host.split(':')[0] if ':' in host else host
+
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': parsed.path or '/',
+        'QUERY_STRING': parsed.query,
+        'CONTENT_TYPE': headers.get('content-type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': headers.get('x-forwarded-port', '443'),
+        'HTTP_HOST': host,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': headers.get('x-forwarded-proto', 'https'),
+        # BytesIO over a bytes object shares its buffer until written to
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'SCRIPT_NAME': '',
+    }
+
+    # Add all HTTP headers, including X-Forwarded-*
+    for key, value in headers.items():
+        if key not in ('content-type', 'content-length', 'host'):
+            http_key = key.upper().replace('-', '_')
+            environ[f'HTTP_{http_key}'] = str(value)
+    return environ
+
+
+def _is_text(headers):
+    if any(name.lower() == 'content-encoding' for name, value in headers):
+        return False
+    content_type = next((value for name, value in headers if name.lower() == 'content-type'), '')
+    content_type = content_type.split(';')[0].strip().lower()
+    return content_type.startswith('text/') or content_type in TEXT_CONTENT_TYPES
+
+
+def _collect_body(result):
+    """Drain a WSGI iterable into one buffer, refusing to grow past the limit."""
+    body = bytearray()
+    try:
+        for part in result:
+            if not isinstance(part, (bytes, bytearray)):
+                part = str(part).encode('utf-8')
+            if len(body) + len(part) > MAX_BUFFERED_BODY:
+                raise ResponseTooLarge(f'Response exceeds {MAX_BUFFERED_BODY} bytes')
+            body += part
+    finally:
+        # Lets Django fire request_finished and release the DB connection
+        if hasattr(result, 'close'):
+            result.close()
+    return body
+
+
+def _encode_response(status, headers, body):
+    single, multi = {}, {}
+    for name, value in headers:
+        multi.setdefault(name, []).append(value)
+        single[name] = value
+
+    response = {
+        'statusCode': status,
+        'headers': single,
+    }
+    # Repeated headers such as Set-Cookie would be lost in a plain dict
+    if any(len(values) > 1 for values in multi.values()):
+        response['multiValueHeaders'] = multi
+
+    if _is_text(headers):
+        try:
+            response['body'] = body.decode('utf-8')
+            response['isBase64Encoded'] = False
+            return response
+        except UnicodeDecodeError:
+            pass
+    response['body'] = base64.b64encode(body).decode('ascii')
+    response['isBase64Encoded'] = True
+    return response
+
+
+def _add_server_timing(headers, timing):
+    # One Server-Timing header: cold start phases first, then ProfilingMiddleware's
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == 'server-timing':
+            headers[index] = (name, f'{timing}, {value}')
+            return
+    headers.append(('Server-Timing', timing))
+
+
 def handler(request):
     """
     Vercel serverless function handler for Django
@@ -30,150 +218,36 @@ def handler(request):
     """
     try:
         if django_app is None:
-            return {
-                'statusCode': 500,
-                'headers': {'Content-Type': 'text/plain'},
-                'body': 'Django application failed to initialize'
-            }
-        
-        from io import BytesIO
-        from urllib.parse import urlparse, parse_qs
-        
-        # Get request data from Vercel request object
-        method = getattr(request, 'method', 'GET')
-        
-        # Get URL path
-        url = getattr(request, 'url', '')
-        path = getattr(request, 'path', url)
-        
-        # Parse URL
-        if not url:
-            url = path
-        parsed = urlparse(url if url.startswith('http') else f'https://example.com{url}')
-        path_info = parsed.path
-        query_string = parsed.query
-        
-        # Get request body
-        body = b''
-        try:
-            if hasattr(request, 'body'):
-                body_bytes = request.body
-                if isinstance(body_bytes, bytes):
-                    body = body_bytes
-                elif body_bytes:
-                    body = str(body_bytes).encode('utf-8')
-            elif hasattr(request, 'read'):
-                body = request.read()
-            elif hasattr(request, 'get_body'):
-                body = request.get_body()
-        except Exception:
-            body = b''
-        
-        # Get headers
-        headers = {}
-        try:
-            if hasattr(request, 'headers'):
-                req_headers = request.headers
-                if isinstance(req_headers, dict):
-                    headers = req_headers
-                elif hasattr(req_headers, 'items'):
-                    headers = dict(req_headers.items())
-                elif hasattr(req_headers, 'get'):
-                    headers = {k: req_headers.get(k) for k in dir(req_headers) if not k.startswith('_')}
-            elif hasattr(request, 'get'):
-                # Try to get headers as dict
-                headers = request.get('headers', {})
-        except Exception:
-            headers = {}
-        
-        # Normalize headers (handle case-insensitive)
-        normalized_headers = {}
-        for key, value in headers.items():
-            normalized_headers[key.lower()] = value
-        
-        # Build WSGI environ
-        host = normalized_headers.get('host', 'localhost')
-        server_name = host.split(':')[0] if ':' in host else host
-        
-        environ = {
-            'REQUEST_METHOD': method,
-            'PATH_INFO': path_info or '/',
-            'QUERY_STRING': query_string,
-            'CONTENT_TYPE': normalized_headers.get('content-type', ''),
-            'CONTENT_LENGTH': str(len(body)),
-            'SERVER_NAME': server_name,
-            'SERVER_PORT': normalized_headers.get('x-forwarded-port', '443'),
-            'HTTP_HOST': host,
-            'wsgi.version': (1, 0),
-            'wsgi.url_scheme': normalized_headers.get('x-forwarded-proto', 'https'),
-            'wsgi.input': BytesIO(body),
-            'wsgi.errors': sys.stderr,
-            'wsgi.multithread': False,
-            'wsgi.multiprocess': True,
-            'wsgi.run_once': False,
-            'SCRIPT_NAME': '',
-        }
-        
-        # Add all HTTP headers
-        for key, value in normalized_headers.items():
-            if key not in ('content-type', 'content-length', 'host'):
-                http_key = key.upper().replace('-', '_')
-                environ[f'HTTP_{http_key}'] = str(value)
-        
-        # Handle X-Forwarded headers
-        for header_key in ['x-forwarded-for', 'x-forwarded-proto', 'x-forwarded-port']:
-            if header_key in normalized_headers:
-                http_key = header_key.upper().replace('-', '_')
-                environ[f'HTTP_{http_key}'] = str(normalized_headers[header_key])
-        
+            return _error(500, 'Django application failed to initialize')
+
+        environ = _build_environ(request, _read_body(request))
+
         # Response data
         response_status = [200]
         response_headers_list = []
-        
-        def start_response(status, response_headers):
+
+        def start_response(status, response_headers, exc_info=None):
             """WSGI start_response callback"""
             response_status[0] = int(status.split()[0])
             response_headers_list[:] = response_headers
-        
+            if _pending_cold_start_timing:
+                _add_server_timing(response_headers_list, _pending_cold_start_timing.pop())
+
         # Call Django WSGI application
         try:
-            response_body_parts = []
-            for part in django_app(environ, start_response):
-                if isinstance(part, bytes):
-                    response_body_parts.append(part)
-                else:
-                    response_body_parts.append(str(part).encode('utf-8'))
-            
-            response_body = b''.join(response_body_parts)
-            
-            # Convert headers list to dict
-            response_headers_dict = {}
-            for header_name, header_value in response_headers_list:
-                response_headers_dict[header_name] = header_value
-            
-            # Return Vercel response format
-            return {
-                'statusCode': response_status[0],
-                'headers': response_headers_dict,
-                'body': response_body.decode('utf-8', errors='ignore'),
-            }
+            body = _collect_body(django_app(environ, start_response))
+            return _encode_response(response_status[0], response_headers_list, body)
+        except ResponseTooLarge as e:
+            print(f"Error in Django application: {e}", file=sys.stderr)
+            return _error(502, 'Response too large for a buffered serverless response')
         except Exception as e:
             print(f"Error in Django application: {e}", file=sys.stderr)
             import traceback
             traceback.print_exc()
-            return {
-                'statusCode': 500,
-                'headers': {'Content-Type': 'text/plain'},
-                'body': f'Internal Server Error: {str(e)}'
-            }
-            
+            return _error(500, f'Internal Server Error: {str(e)}')
+
     except Exception as e:
         print(f"Error in handler: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'text/plain'},
-            'body': f'Handler Error: {str(e)}'
-        }
-
+        return _error(500, f'Handler Error: {str(e)}')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_alter_post_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_date',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
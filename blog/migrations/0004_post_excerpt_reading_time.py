@@ -0,0 +1,44 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:21
+
+import math
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def fill_excerpts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    posts = []
+    for post in Post.objects.only('pk', 'text').iterator(chunk_size=500):
+        post.excerpt = Truncator(Truncator(post.text).words(30)).chars(500)
+        post.reading_time = max(1, math.ceil(len(post.text.split()) / 200))
+        posts.append(post)
+        if len(posts) == 500:
+            Post.objects.bulk_update(posts, ['excerpt', 'reading_time'])
+            posts = []
+    Post.objects.bulk_update(posts, ['excerpt', 'reading_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_updated_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_date', '-id'], name='post_created_id_idx'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,49 @@
+import math
+
 from django.db import models
 from django.utils import timezone
+from django.utils.text import Truncator
 from django.urls import reverse
 from django.contrib.auth.models import User
 
 
+EXCERPT_WORDS = 30
+# Matches Post.excerpt's max_length; thirty long words (pasted URLs) can exceed it
+EXCERPT_CHARS = 500
+WORDS_PER_MINUTE = 200
+
+
+def make_excerpt(text):
+    return Truncator(Truncator(text).words(EXCERPT_WORDS)).chars(EXCERPT_CHARS)
+
+
+def estimate_reading_time(text):
+    return max(1, math.ceil(len(text.split()) / WORDS_PER_MINUTE))
+
+
 class Post(models.Model):
     author = models.ForeignKey(User,on_delete=models.CASCADE)
     title = models.CharField(max_length=30)
     text = models.TextField()
     created_date = models.DateTimeField(default=timezone.now)
+    updated_date = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to='post_images',blank=True,default='default.png')
+    # Derived from text on save, so the blog index never has to load the full text
+    excerpt = models.CharField(max_length=EXCERPT_CHARS, blank=True, editable=False)
+    reading_time = models.PositiveIntegerField(default=1, editable=False, help_text='Minutes')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_date', '-id'], name='post_created_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.excerpt = make_excerpt(self.text)
+        self.reading_time = estimate_reading_time(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'excerpt', 'reading_time'}
+        super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse("blogs:post_detail", kwargs={"pk": self.pk})
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from Coursera import pagecache
+from blog.models import Post
+from courses import images
+
+
+@receiver(post_save, sender=Post)
+def build_image_derivatives(sender, instance, **kwargs):
+    images.get_manifest(instance.image)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_content_changed(sender, **kwargs):
+    pagecache.bump_version()
@@ -1,2 +1,72 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
+from blog.models import Post
+from blog.views import PostListView
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ConditionalPostViewTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'password')
+        self.post = Post.objects.create(author=self.author, title='Hello', text='First post', image='')
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get('/blog/')['ETag']
+        self.assertEqual(self.client.get('/blog/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Post.objects.create(author=self.author, title='Second', text='Another post', image='')
+        self.assertContains(self.client.get('/blog/', HTTP_IF_NONE_MATCH=etag), 'Second')
+
+    def test_edited_post_is_served_again(self):
+        url = self.post.get_absolute_url()
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        self.post.text = 'Edited post'
+        self.post.save()
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']), 'Edited post')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PostListPaginationTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'password')
+        for i in range(25):
+            Post.objects.create(author=self.author, title='Post {}'.format(i), text='word ' * 450, image='')
+
+    def test_excerpt_and_reading_time_are_stored_on_save(self):
+        post = Post.objects.first()
+        self.assertEqual(post.excerpt, 'word ' * 29 + 'word…')
+        self.assertEqual(post.reading_time, 3)
+
+        post.text = 'Short now'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual((post.excerpt, post.reading_time), ('Short now', 1))
+
+    def test_excerpt_of_long_words_fits_the_column(self):
+        post = Post.objects.create(author=self.author, title='Links', text='https://example.com/' + 'x' * 100 + ' ',
+                                   image='')
+        post.text = post.text * 30
+        post.save()
+        self.assertEqual(len(post.excerpt), 500)
+        self.assertTrue(post.excerpt.endswith('…'))
+
+    def test_list_pages_without_loading_text(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/blog/')
+        self.assertEqual(len(response.context['posts']), PostListView.paginate_by)
+        self.assertFalse(any('"blog_post"."text"' in query['sql'] for query in queries.captured_queries))
+
+        seen = []
+        while True:
+            seen.extend(post.pk for post in response.context['posts'])
+            page = response.context['page_obj']
+            if not page.has_next:
+                break
+            response = self.client.get('/blog/', {'after': page.next_cursor})
+        self.assertEqual(sorted(seen), sorted(Post.objects.values_list('pk', flat=True)))
+        self.assertEqual(self.client.get('/blog/', {'after': 'garbage'}).status_code, 404)
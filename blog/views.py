@@ -4,17 +4,51 @@ from django.utils import timezone
 from blog.forms import PostForm
 from django.urls import reverse_lazy
 from django.views.generic import (TemplateView,ListView,DetailView,CreateView,UpdateView,DeleteView )
+from django.db.models import Count, Max
+from django.http import Http404
+from courses.pagination import InvalidCursor, KeysetPaginator
+from django.utils.decorators import method_decorator
+from Coursera.conditional import conditional_page
+from Coursera.pagecache import cache_anonymous_page
 
 # Create your views here.
 
+def post_list_version(request):
+    posts = Post.objects.filter(created_date__lte=timezone.now()).aggregate(
+        changed=Max('updated_date'), published=Max('created_date'), count=Count('pk'))
+    # A scheduled post going live changes the list without touching updated_date
+    last_modified = max(filter(None, (posts['changed'], posts['published'])), default=None)
+    return last_modified, (posts['count'], request.GET.get('after'), request.GET.get('before'))
+
+def post_detail_version(request, pk):
+    row = Post.objects.filter(pk=pk).values_list('created_date', 'updated_date').first()
+    if row is None:
+        return None
+    return max(row), ()
+
+@method_decorator(cache_anonymous_page, name='dispatch')
+@method_decorator(conditional_page(post_list_version), name='dispatch')
 class PostListView(ListView):
     context_object_name = 'posts'
     template_name = 'blog/post_list.html'
     model = Post
+    paginate_by = 10
 
     def get_queryset(self):
-        return Post.objects.filter(created_date__lte=timezone.now()).order_by('-created_date')
+        # The list shows the stored excerpt, never the full text
+        return (Post.objects.filter(created_date__lte=timezone.now())
+                .select_related('author')
+                .only('title', 'excerpt', 'reading_time', 'created_date', 'image', 'author__username'))
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, 'created_date', page_size)
+        try:
+            page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return paginator, page, page.object_list, page.has_next or page.has_previous
 
+@method_decorator(conditional_page(post_detail_version), name='dispatch')
 class PostDetailView(DetailView):
     context_object_name = 'post'
     template_name = 'blog/post_detail.html'
@@ -1,13 +1,78 @@
-from django.contrib import admin
-from courses.models import Course,Lesson,Category
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db import IntegrityError
+from django.template.response import TemplateResponse
+from courses.forms import LessonAdminForm
+from courses.models import Course,Lesson,Category,LessonUpload,move_lessons
+from courses.uploads import attach_upload
 # Register your models here.
 
+class LessonPositionsForm(forms.Form):
+    def __init__(self, lessons, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lessons = lessons
+        for lesson in lessons:
+            self.fields['position_{}'.format(lesson.pk)] = forms.IntegerField(
+                min_value=1, initial=lesson.position, label='{} ({})'.format(lesson, lesson.course))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        seen = set()
+        for lesson in self.lessons:
+            target = (lesson.course_id, cleaned_data.get('position_{}'.format(lesson.pk)))
+            if target[1] is not None and target in seen:
+                raise forms.ValidationError('Two lessons of {} would share position {}.'.format(lesson.course,
+                                                                                                target[1]))
+            seen.add(target)
+        return cleaned_data
+
+
 @admin.register(Lesson)
 class LessonAdmin(admin.ModelAdmin):
+    form = LessonAdminForm
     list_display = ['title', 'course', 'position', 'is_free_preview']
     list_filter = ['is_free_preview', 'course']
     search_fields = ['title', 'course__title']
-    list_editable = ['is_free_preview', 'position']
+    # Positions are unique per course, so they are edited through reorder_lessons
+    # where a swap is saved as one change rather than row by row
+    list_editable = ['is_free_preview']
+    actions = ['reorder_lessons']
+
+    @admin.action(description='Reorder selected lessons')
+    def reorder_lessons(self, request, queryset):
+        lessons = list(queryset.select_related('course').order_by('course', 'position'))
+        form = LessonPositionsForm(lessons, request.POST if 'apply' in request.POST else None)
+        if form.is_bound and form.is_valid():
+            try:
+                moved = move_lessons({lesson: form.cleaned_data['position_{}'.format(lesson.pk)]
+                                      for lesson in lessons})
+            except IntegrityError:
+                self.message_user(request, 'A new position is already used by a lesson that was not selected.',
+                                  messages.ERROR)
+            else:
+                self.message_user(request, '{} lessons moved.'.format(moved))
+            return None
+        context = dict(self.admin_site.each_context(request), title='Reorder lessons', form=form, lessons=lessons,
+                       opts=self.model._meta, action_checkbox_name=helpers.ACTION_CHECKBOX_NAME)
+        return TemplateResponse(request, 'admin/courses/lesson/reorder_lessons.html', context)
+
+    def get_form(self, request, obj=None, **kwargs):
+        # modelform_factory builds a new class per call, so this doesn't leak between requests
+        form = super().get_form(request, obj, **kwargs)
+        form.user = request.user
+        return form
+
+    def save_model(self, request, obj, form, change):
+        upload = form.cleaned_data.get('video_upload')
+        if upload:
+            attach_upload(obj, upload)
+        super().save_model(request, obj, form, change)
+
+@admin.register(LessonUpload)
+class LessonUploadAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'created_by', 'size', 'offset', 'created_time']
+    readonly_fields = ['filename', 'created_by', 'size', 'offset']
 
 admin.site.register(Course)
 admin.site.register(Category)
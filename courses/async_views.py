@@ -0,0 +1,80 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.views.generic import View
+
+from Coursera.async_helpers import AsyncLoginRequiredMixin, aget_user, arender
+from Coursera.conditional import conditional_page
+from Coursera.pagecache import cache_anonymous_page
+from courses.catalog import get_category_summary
+from courses.entitlements import has_course_access
+from courses.models import Category, Course
+from courses.pagination import InvalidCursor, KeysetPaginator
+from courses.views import (CourseListView, course_detail_context, course_detail_queryset, course_detail_version,
+                           course_list_queryset, course_list_version)
+
+# Async counterparts of the catalog views, routed in place of the sync ones
+# when ASYNC_VIEWS is on and the site is served through Coursera/asgi.py.
+# as_view() applies the same page cache and conditional GET as the sync views.
+
+
+class AsyncHomeView(View):
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return cache_anonymous_page(super().as_view(**initkwargs))
+
+    async def get(self, request, *args, **kwargs):
+        await aget_user(request)
+        categories = await sync_to_async(get_category_summary)()
+        return await arender(request, 'index.html', {'categories': categories, 'view': self})
+
+
+class AsyncCourseListView(View):
+    paginate_by = CourseListView.paginate_by
+    excerpt_length = CourseListView.excerpt_length
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return cache_anonymous_page(conditional_page(course_list_version)(super().as_view(**initkwargs)))
+
+    async def get(self, request, category_id=None, *args, **kwargs):
+        await aget_user(request)
+        queryset = course_list_queryset(self.excerpt_length)
+        category = None
+        if category_id is not None:
+            category = await Category.objects.filter(pk=category_id).afirst()
+            if category is None:
+                raise Http404('No category found matching the query')
+            queryset = queryset.filter(category=category)
+        paginator = KeysetPaginator(queryset, 'created_time', self.paginate_by)
+        try:
+            page = await paginator.apage(after=request.GET.get('after'), before=request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        context = {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_next or page.has_previous,
+            'object_list': page.object_list,
+            'courses': page.object_list,
+            'category': category,
+            'view': self,
+        }
+        return await arender(request, 'courses/course_list.html', context)
+
+
+class AsyncCourseDetailView(AsyncLoginRequiredMixin, View):
+    login_url = '/accounts/login/'
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return conditional_page(course_detail_version)(super().as_view(**initkwargs))
+
+    async def get(self, request, slug, *args, **kwargs):
+        try:
+            course = await course_detail_queryset().aget(slug=slug)
+        except Course.DoesNotExist:
+            raise Http404('No course found matching the query')
+        has_access = await sync_to_async(has_course_access)(request, course)
+        context = {'course': course, 'object': course, 'view': self}
+        context.update(course_detail_context(course, has_access))
+        return await arender(request, 'courses/course_detail.html', context)
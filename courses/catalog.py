@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from Coursera import pagecache
+from courses.models import Category
+
+# Shares the page cache content version, which every Category/Course/Lesson change bumps
+SUMMARY_KEY = 'catalog:categories:{version}:{top}'
+
+
+def get_top_courses():
+    return getattr(settings, 'HOME_COURSES_PER_CATEGORY', 3)
+
+
+def build_category_summary(top):
+    """
+    Every category with its course count and newest courses, from one query:
+    window functions number and count each category's courses, and only the
+    first `top` rows per category come back.
+    """
+    newest_first = [F('course__created_time').desc(nulls_last=True), F('course__id').desc(nulls_last=True)]
+    rows = (Category.objects
+            .annotate(position=Window(RowNumber(), partition_by=F('id'), order_by=newest_first),
+                      course_count=Window(Count('course__id'), partition_by=F('id')))
+            .filter(position__lte=max(top, 1))
+            .order_by('category', 'id', 'position')
+            .values_list('id', 'category', 'course_count', 'course__slug', 'course__title', 'position'))
+
+    categories = []
+    for category_id, name, course_count, slug, title, position in rows:
+        if not categories or categories[-1]['id'] != category_id:
+            categories.append({'id': category_id, 'name': name, 'course_count': course_count, 'courses': []})
+        if slug is not None and position <= top:
+            categories[-1]['courses'].append({'slug': slug, 'title': title})
+    return categories
+
+
+def get_category_summary(top=None):
+    top = get_top_courses() if top is None else top
+    key = SUMMARY_KEY.format(version=pagecache.get_version(), top=top)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_category_summary(top)
+        if pagecache.can_store():
+            cache.set(key, summary, pagecache.get_timeout())
+    return summary
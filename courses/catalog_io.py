@@ -0,0 +1,423 @@
+"""
+Streaming import and export of the catalog: categories, courses and lessons.
+
+A catalog file holds one record per line, as JSON lines or CSV, and every
+record has a "type" of category, course or lesson. Records are applied in
+batches with bulk_create/bulk_update, one transaction per batch. Courses are
+matched by slug and lessons by course slug and lesson slug, so importing a
+file again updates the catalog in place. The importer reports the last line
+of every committed batch, so an interrupted import can resume after it.
+"""
+import csv
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from Coursera import pagecache
+from courses import entitlements
+from courses.models import Category, Course, Lesson, park_lessons
+from memberships.models import Membership
+from search import index as search_index
+
+RECORD_TYPES = ('category', 'course', 'lesson')
+CSV_FIELDS = ('type', 'name', 'slug', 'title', 'category', 'creator', 'description', 'duration', 'starting_date',
+              'ending_date', 'allowed_memberships', 'course', 'position', 'is_free_preview', 'video_url', 'thumbnail')
+LIST_SEPARATOR = '|'
+BATCH_SIZE = 2000
+COURSE_FIELDS = ['title', 'category', 'creator', 'description', 'duration', 'starting_date', 'ending_date',
+                 'created_time']
+LESSON_FIELDS = ['title', 'position', 'is_free_preview', 'video_url', 'thumbnail', 'updated_time']
+
+
+class CatalogError(Exception):
+    def __init__(self, line, message):
+        super().__init__('line {}: {}'.format(line, message))
+        self.line = line
+        self.message = message
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def export_records():
+    """Yield the whole catalog as records, categories first so a file imports in order."""
+    for name in Category.objects.order_by('pk').values_list('category', flat=True).iterator():
+        yield {'type': 'category', 'name': name}
+
+    membership_types = dict(Membership.objects.values_list('pk', 'membership_type'))
+    allowed = {}
+    for course_id, membership_id in (Course.allowed_memberships.through.objects
+                                     .values_list('course_id', 'membership_id').iterator()):
+        allowed.setdefault(course_id, []).append(membership_types[membership_id])
+    courses = Course.objects.order_by('pk').values_list(
+        'pk', 'slug', 'title', 'category__category', 'creator__username', 'description', 'duration',
+        'starting_date', 'ending_date')
+    for pk, slug, title, category, creator, description, duration, starting, ending in courses.iterator(BATCH_SIZE):
+        yield {'type': 'course', 'slug': slug, 'title': title, 'category': category, 'creator': creator,
+               'description': description, 'duration': duration,
+               'starting_date': starting.isoformat() if starting else None,
+               'ending_date': ending.isoformat() if ending else None,
+               'allowed_memberships': sorted(allowed.get(pk, []))}
+
+    lessons = (Lesson.objects.filter(course__isnull=False).order_by('course_id', 'position')
+               .values_list('course__slug', 'slug', 'title', 'position', 'is_free_preview', 'video_url', 'thumbnail'))
+    for course, slug, title, position, is_free_preview, video_url, thumbnail in lessons.iterator(BATCH_SIZE):
+        yield {'type': 'lesson', 'course': course, 'slug': slug, 'title': title, 'position': position,
+               'is_free_preview': is_free_preview, 'video_url': video_url or '', 'thumbnail': thumbnail or ''}
+
+
+def write_records(records, stream, fmt):
+    written = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for record in records:
+            row = {}
+            for field, value in record.items():
+                if isinstance(value, list):
+                    value = LIST_SEPARATOR.join(value)
+                elif isinstance(value, bool):
+                    value = 'true' if value else 'false'
+                row[field] = '' if value is None else value
+            writer.writerow(row)
+            written += 1
+    else:
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            written += 1
+    return written
+
+
+def read_records(stream, fmt):
+    """
+    Yield (line number, record) pairs. A line that cannot be parsed is
+    yielded as a CatalogError so the importer can skip or stop on it.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            record = {field: value for field, value in row.items() if field and value != ''}
+            if 'allowed_memberships' in row and row.get('type') == 'course':
+                value = row['allowed_memberships'] or ''
+                record['allowed_memberships'] = [item for item in value.split(LIST_SEPARATOR) if item]
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, CatalogError(number, 'invalid JSON: {}'.format(e))
+            continue
+        if not isinstance(record, dict):
+            yield number, CatalogError(number, 'expected a JSON object')
+            continue
+        yield number, record
+
+
+def _text(record, field, max_length, required=True):
+    value = record.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError('{} is required'.format(field))
+    if len(value) > max_length:
+        raise ValueError('{} is longer than {} characters'.format(field, max_length))
+    return value
+
+
+def _slug(record, field):
+    value = _text(record, field, 50)
+    try:
+        validate_slug(value)
+    except ValidationError:
+        raise ValueError('{} "{}" is not a valid slug'.format(field, value))
+    return value
+
+
+def _date(record, field):
+    value = record.get(field)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError('{} must be a YYYY-MM-DD date'.format(field))
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 't', 'yes')
+
+
+def _position(record):
+    try:
+        position = int(record.get('position'))
+    except (TypeError, ValueError):
+        raise ValueError('position must be a whole number')
+    if position < 0:
+        raise ValueError('position must not be negative')
+    return position
+
+
+def _first_by_key(rows):
+    # Slugs and category names are not unique in the database; the oldest row wins
+    found = {}
+    for key, value in rows:
+        found.setdefault(key, value)
+    return found
+
+
+def _same_course_lessons(record, other):
+    return all(isinstance(item, dict) and item.get('type') == 'lesson' for item in (record, other)) and \
+        record.get('course') == other.get('course')
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=BATCH_SIZE, creator=None, skip_invalid=False):
+        self.batch_size = batch_size
+        self.creator = creator
+        self.skip_invalid = skip_invalid
+        self.stats = {kind: {'created': 0, 'updated': 0} for kind in RECORD_TYPES}
+        self.errors = []
+        self.seen_courses = set()
+        self.seen_lessons = set()
+        self.membership_ids = dict(Membership.objects.values_list('membership_type', 'pk'))
+
+    def run(self, records, after_line=0, on_batch=None):
+        """
+        Import records past after_line, calling on_batch with the last line of
+        each committed batch. A course's consecutive lesson records always go
+        in one batch, so lessons can trade positions (as export_catalog writes
+        them) even when the batch size is reached in the middle of the course.
+        """
+        batch = []
+        for line, record in records:
+            if line <= after_line:
+                continue
+            if len(batch) >= self.batch_size and not _same_course_lessons(batch[-1][1], record):
+                self.apply(batch)
+                if on_batch:
+                    on_batch(batch[-1][0])
+                batch = []
+            batch.append((line, record))
+        if batch:
+            self.apply(batch)
+            if on_batch:
+                on_batch(batch[-1][0])
+        return self.stats
+
+    def fail(self, line, message):
+        error = CatalogError(line, message)
+        if not self.skip_invalid:
+            raise error
+        self.errors.append(error)
+
+    def clean(self, line, record):
+        kind = record.get('type')
+        if kind == 'category':
+            return {'name': _text(record, 'name', 150)}
+        if kind == 'course':
+            slug = _slug(record, 'slug')
+            if slug in self.seen_courses:
+                raise ValueError('course "{}" appears more than once'.format(slug))
+            memberships = record.get('allowed_memberships')
+            if isinstance(memberships, str):
+                memberships = [item for item in memberships.split(LIST_SEPARATOR) if item]
+            unknown = set(memberships or []) - set(self.membership_ids)
+            if unknown:
+                raise ValueError('unknown membership {}'.format(', '.join(sorted(unknown))))
+            self.seen_courses.add(slug)
+            return {
+                'slug': slug, 'title': _text(record, 'title', 30), 'category': _text(record, 'category', 150),
+                'creator': _text(record, 'creator', 150, required=False),
+                'description': _text(record, 'description', 400, required=False),
+                'duration': _text(record, 'duration', 10), 'starting_date': _date(record, 'starting_date'),
+                'ending_date': _date(record, 'ending_date'),
+                'allowed_memberships': None if memberships is None else [self.membership_ids[m] for m in memberships],
+            }
+        if kind == 'lesson':
+            key = (_slug(record, 'course'), _slug(record, 'slug'))
+            if key in self.seen_lessons:
+                raise ValueError('lesson "{}" of course "{}" appears more than once'.format(key[1], key[0]))
+            self.seen_lessons.add(key)
+            return {
+                'course': key[0], 'slug': key[1], 'title': _text(record, 'title', 30), 'position': _position(record),
+                'is_free_preview': _bool(record.get('is_free_preview')),
+                'video_url': _text(record, 'video_url', 100, required=False) or None,
+                'thumbnail': _text(record, 'thumbnail', 100, required=False),
+            }
+        raise ValueError('type must be one of {}'.format(', '.join(RECORD_TYPES)))
+
+    def apply(self, batch):
+        cleaned = {kind: [] for kind in RECORD_TYPES}
+        for line, record in batch:
+            if isinstance(record, CatalogError):
+                self.fail(line, record.message)
+                continue
+            try:
+                cleaned[record.get('type')].append((line, self.clean(line, record)))
+            except ValueError as e:
+                self.fail(line, str(e))
+
+        try:
+            with transaction.atomic():
+                category_ids = self.save_categories(cleaned['category'], cleaned['course'])
+                course_ids = self.save_courses(cleaned['course'], category_ids)
+                self.save_lessons(cleaned['lesson'], course_ids)
+        except IntegrityError as e:
+            raise CatalogError(batch[0][0], 'the batch ending on line {} conflicts with existing rows: {}'.format(
+                batch[-1][0], e))
+        # Bulk writes skip the signals that keep these current
+        pagecache.bump_version()
+        entitlements.invalidate_index()
+
+    def save_categories(self, categories, courses):
+        names = {category['name'] for line, category in categories} | {course['category'] for line, course in courses}
+        existing = _first_by_key(Category.objects.filter(category__in=names).order_by('pk')
+                                 .values_list('category', 'pk'))
+        missing = sorted(names - set(existing))
+        if missing:
+            Category.objects.bulk_create([Category(category=name) for name in missing])
+            created = list(Category.objects.filter(category__in=missing).order_by('pk'))
+            existing.update(_first_by_key((category.category, category.pk) for category in created))
+            search_index.index_many('category', created)
+            self.stats['category']['created'] += len(missing)
+        return existing
+
+    def save_courses(self, courses, category_ids):
+        if not courses:
+            return {}
+        slugs = [course['slug'] for line, course in courses]
+        existing = _first_by_key((course.slug, course) for course in Course.objects.filter(slug__in=slugs).order_by('pk'))
+        users = dict(User.objects.filter(username__in={course['creator'] for line, course in courses})
+                     .values_list('username', 'pk'))
+        now = timezone.now()
+        to_create, to_update, unchanged, retitled, memberships = [], [], [], [], {}
+        for line, values in courses:
+            course = existing.get(values['slug']) or Course(slug=values['slug'])
+            if values['creator']:
+                creator_id = users.get(values['creator'])
+                if creator_id is None:
+                    self.fail(line, 'unknown creator "{}"'.format(values['creator']))
+                    continue
+            else:
+                creator_id = course.creator_id or getattr(self.creator, 'pk', None)
+                if creator_id is None:
+                    self.fail(line, 'creator is required for a new course')
+                    continue
+            if values['allowed_memberships'] is not None:
+                memberships[values['slug']] = values['allowed_memberships']
+            fields = {
+                'title': values['title'], 'category_id': category_ids[values['category']], 'creator_id': creator_id,
+                'description': values['description'], 'duration': values['duration'],
+                'starting_date': values['starting_date'], 'ending_date': values['ending_date'],
+            }
+            # Re-importing an unchanged course must not bump its Last-Modified
+            if course.pk and all(getattr(course, field) == value for field, value in fields.items()):
+                unchanged.append(course)
+                continue
+            if course.pk and course.title != values['title']:
+                retitled.append(course.pk)
+            for field, value in fields.items():
+                setattr(course, field, value)
+            course.created_time = now
+            (to_update if course.pk else to_create).append(course)
+
+        Course.objects.bulk_create(to_create)
+        Course.objects.bulk_update(to_update, COURSE_FIELDS)
+        saved = [course.slug for course in to_create + to_update + unchanged]
+        courses = _first_by_key((course.slug, course)
+                                for course in Course.objects.filter(slug__in=saved).order_by('pk'))
+
+        Allowed = Course.allowed_memberships.through
+        Allowed.objects.filter(course_id__in=[courses[slug].pk for slug in memberships]).delete()
+        Allowed.objects.bulk_create([Allowed(course_id=courses[slug].pk, membership_id=membership_id)
+                                     for slug, membership_ids in memberships.items()
+                                     for membership_id in membership_ids])
+
+        written = {course.slug for course in to_create + to_update}
+        search_index.index_many('course', [course for slug, course in courses.items() if slug in written])
+        if retitled:
+            # Lesson documents carry the course title
+            search_index.index_many('lesson', Lesson.objects.filter(course_id__in=retitled).select_related('course'))
+        self.stats['course']['created'] += len(to_create)
+        self.stats['course']['updated'] += len(to_update)
+        return {slug: course.pk for slug, course in courses.items()}
+
+    def save_lessons(self, lessons, course_ids):
+        if not lessons:
+            return
+        missing = {lesson['course'] for line, lesson in lessons} - set(course_ids)
+        course_ids = dict(course_ids, **_first_by_key(Course.objects.filter(slug__in=missing).order_by('pk')
+                                                      .values_list('slug', 'pk')))
+        resolved = []
+        for line, values in lessons:
+            course_id = course_ids.get(values['course'])
+            if course_id is None:
+                self.fail(line, 'unknown course "{}"'.format(values['course']))
+                continue
+            resolved.append((line, course_id, values))
+
+        ids = {course_id for line, course_id, values in resolved}
+        existing = {(lesson.course_id, lesson.slug): lesson for lesson in Lesson.objects.filter(
+            course_id__in=ids, slug__in={values['slug'] for line, course_id, values in resolved})}
+        occupied = {(course_id, position): pk for course_id, position, pk in Lesson.objects.filter(
+            course_id__in=ids, position__in={values['position'] for line, course_id, values in resolved}
+        ).values_list('course_id', 'position', 'pk')}
+        # Lessons leaving their position free it for another lesson in the same batch
+        moving = set()
+        for line, course_id, values in resolved:
+            lesson = existing.get((course_id, values['slug']))
+            if lesson is not None and lesson.position != values['position']:
+                moving.add(lesson.pk)
+
+        now = timezone.now()
+        to_create, to_update, positions = [], [], set()
+        for line, course_id, values in resolved:
+            lesson = existing.get((course_id, values['slug']))
+            target = (course_id, values['position'])
+            occupant = occupied.get(target)
+            if target in positions or (occupant not in (None, lesson and lesson.pk) and occupant not in moving):
+                self.fail(line, 'position {} of course "{}" is already taken'.format(values['position'],
+                                                                                    values['course']))
+                continue
+            positions.add(target)
+            if lesson is None:
+                lesson = Lesson(course_id=course_id, slug=values['slug'])
+            elif (lesson.title, lesson.position, lesson.is_free_preview, lesson.video_url.name or None,
+                  lesson.thumbnail.name or '') == (values['title'], values['position'], values['is_free_preview'],
+                                                   values['video_url'], values['thumbnail']):
+                continue
+            lesson.title = values['title']
+            lesson.is_free_preview = values['is_free_preview']
+            lesson.video_url = values['video_url']
+            lesson.thumbnail = values['thumbnail']
+            lesson.updated_time = now
+            (to_update if lesson.pk else to_create).append((lesson, values['position']))
+
+        # Park reordered lessons so swaps never trip the unique constraint
+        park_lessons([lesson for lesson, position in to_update if lesson.position != position])
+        for lesson, position in to_update + to_create:
+            lesson.position = position
+        Lesson.objects.bulk_update([lesson for lesson, position in to_update], LESSON_FIELDS)
+        Lesson.objects.bulk_create([lesson for lesson, position in to_create])
+
+        written = {(lesson.course_id, lesson.slug) for lesson, position in to_create + to_update}
+        if written:
+            search_index.index_many('lesson', [
+                lesson for lesson in Lesson.objects.filter(
+                    course_id__in={course_id for course_id, slug in written},
+                    slug__in={slug for course_id, slug in written}).select_related('course')
+                if (lesson.course_id, lesson.slug) in written])
+        self.stats['lesson']['created'] += len(to_create)
+        self.stats['lesson']['updated'] += len(to_update)
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from courses.models import Course
+from memberships.models import UserMembership
+
+# Course access is precomputed as membership_type -> frozenset(course ids) and a
+# user's tier is cached per user, so an access check is a set lookup.
+VERSION_KEY = 'entitlements:version'
+INDEX_KEY = 'entitlements:index:{version}'
+USER_KEY = 'entitlements:user:{version}:{user_id}'
+
+ENTITLEMENT_CACHE_TIMEOUT = getattr(settings, 'ENTITLEMENT_CACHE_TIMEOUT', 300)
+# Without a shared cache, invalidation only reaches this process: other workers
+# may rebuild the index from stale rules for at most this long.
+LOCAL_INDEX_TIMEOUT = 5
+
+# Cached tiers are (has_user_membership, membership_type) tuples
+NO_USER_MEMBERSHIP = (False, None)
+
+
+def caches_are_shared():
+    return not getattr(settings, 'SHARED_CACHE_IS_LOCAL', False)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate_index():
+    # Bumping the version orphans the index and every cached user tier
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def invalidate_user(user_id):
+    cache.delete(USER_KEY.format(version=get_version(), user_id=user_id))
+
+
+def build_index():
+    index = {}
+    # Always from the primary: a lagging replica would get cached as the access rules
+    rows = Course.allowed_memberships.through.objects.using(DEFAULT_DB_ALIAS).values_list(
+        'course_id', 'membership__membership_type')
+    for course_id, membership_type in rows:
+        index.setdefault(membership_type, set()).add(course_id)
+    return {membership_type: frozenset(ids) for membership_type, ids in index.items()}
+
+
+def get_index():
+    key = INDEX_KEY.format(version=get_version())
+    index = cache.get(key)
+    if index is None:
+        index = build_index()
+        cache.set(key, index, ENTITLEMENT_CACHE_TIMEOUT if caches_are_shared() else LOCAL_INDEX_TIMEOUT)
+    return index
+
+
+def load_user_tier(user_id):
+    row = UserMembership.objects.filter(user_id=user_id).values_list(
+        'membership__membership_type', flat=True)[:1]
+    row = list(row)
+    if not row:
+        return NO_USER_MEMBERSHIP
+    return (True, row[0])
+
+
+def _load_tier(request):
+    membership = getattr(request, 'membership', None)
+    if membership is None:
+        return load_user_tier(request.user.pk)
+    # Share request.membership's query when the middleware is installed
+    plan = membership.plan
+    return (True, plan.membership_type if plan else None) if membership else NO_USER_MEMBERSHIP
+
+
+def get_user_tier(request):
+    """
+    Return (has_user_membership, membership_type), resolved once per request.
+    Tiers are only cached across requests when every worker shares the cache,
+    so an upgrade or cancellation is seen by all of them at once.
+    """
+    tier = getattr(request, '_entitlement_tier', None)
+    if tier is not None:
+        return tier
+    user = request.user
+    if not user.is_authenticated:
+        tier = NO_USER_MEMBERSHIP
+    elif caches_are_shared():
+        key = USER_KEY.format(version=get_version(), user_id=user.pk)
+        tier = cache.get(key)
+        if tier is None:
+            tier = _load_tier(request)
+            cache.set(key, tier, ENTITLEMENT_CACHE_TIMEOUT)
+    else:
+        tier = _load_tier(request)
+    request._entitlement_tier = tier
+    return tier
+
+
+def has_course_access(request, course):
+    has_user_membership, membership_type = get_user_tier(request)
+    if not has_user_membership or membership_type is None:
+        return False
+    course_id = getattr(course, 'pk', course)
+    return course_id in get_index().get(membership_type, ())
@@ -0,0 +1,50 @@
+from django import forms
+from django.urls import reverse_lazy
+from courses.models import Lesson, LessonUpload
+
+
+class ChunkedUploadWidget(forms.HiddenInput):
+    template_name = 'courses/widgets/chunked_upload.html'
+
+    class Media:
+        js = ('courses/chunked_upload.js',)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['create_url'] = reverse_lazy('courses:lesson_upload_create')
+        return context
+
+
+class LessonAdminForm(forms.ModelForm):
+    video_upload = forms.UUIDField(required=False, widget=ChunkedUploadWidget,
+                                   label='Upload video',
+                                   help_text='Large videos are sent in resumable chunks. Interrupted uploads continue where they stopped when the same file is selected again.')
+
+    # Set by LessonAdmin.get_form; only this user's uploads can be attached
+    user = None
+
+    class Meta:
+        model = Lesson
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['video_url'].required = False
+
+    def clean_video_upload(self):
+        upload_id = self.cleaned_data.get('video_upload')
+        if not upload_id:
+            return None
+        try:
+            upload = LessonUpload.objects.get(pk=upload_id, created_by=self.user)
+        except LessonUpload.DoesNotExist:
+            raise forms.ValidationError('This upload no longer exists, please upload the video again.')
+        if not upload.completed:
+            raise forms.ValidationError('The video upload has not finished yet.')
+        return upload
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('video_url') and not cleaned_data.get('video_upload') and not self.errors.get('video_upload'):
+            self.add_error('video_url', 'Choose a video file or upload one below.')
+        return cleaned_data
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+# Derivatives live next to the original in a derivatives/ folder, named by the
+# original's content hash so a replaced image never reuses a stale URL.
+DERIVATIVE_FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+MANIFEST_CACHE_KEY = 'images:manifest:{}'
+MANIFEST_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_widths():
+    return getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 960, 1280))
+
+
+def derivative_name(name, digest, width, ext):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return os.path.join(os.path.dirname(name), 'derivatives', '{}.{}.{}w.{}'.format(stem, digest, width, ext))
+
+
+def manifest_name(name):
+    return os.path.join(os.path.dirname(name), 'derivatives', os.path.basename(name) + '.json')
+
+
+def _encode(image, fmt):
+    from PIL import Image
+
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.split()[-1])
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, fmt, quality=80, optimize=fmt == 'JPEG')
+    return buffer.getvalue()
+
+
+def build_derivatives(field_file):
+    # PIL is imported on first use to keep it out of process startup
+    from PIL import Image, ImageOps
+
+    storage, name = field_file.storage, field_file.name
+    with storage.open(name, 'rb') as original:
+        data = original.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+
+    # Never upscale; an image narrower than every width gets one derivative at its own size
+    widths = [width for width in get_widths() if width < image.width] or [image.width]
+    sources = {ext: [] for ext, fmt in DERIVATIVE_FORMATS}
+    for width in widths:
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.LANCZOS)
+        for ext, fmt in DERIVATIVE_FORMATS:
+            target = derivative_name(name, digest, width, ext)
+            if not storage.exists(target):
+                storage.save(target, ContentFile(_encode(resized, fmt)))
+            sources[ext].append([width, target])
+
+    manifest = {'hash': digest, 'width': image.width, 'sources': sources}
+    target = manifest_name(name)
+    if storage.exists(target):
+        storage.delete(target)
+    storage.save(target, ContentFile(json.dumps(manifest).encode()))
+    cache.set(MANIFEST_CACHE_KEY.format(name), manifest, MANIFEST_CACHE_TIMEOUT)
+    return manifest
+
+
+def get_manifest(field_file):
+    """
+    Return the derivative manifest for an image, reading the cached copy, then
+    the manifest stored beside the derivatives, and only building them as a
+    last resort. Returns None when the image cannot be processed.
+    """
+    if not field_file or not field_file.name:
+        return None
+    key = MANIFEST_CACHE_KEY.format(field_file.name)
+    manifest = cache.get(key)
+    if manifest is not None:
+        # An empty manifest records an image that could not be processed
+        return manifest or None
+    storage = field_file.storage
+    try:
+        with storage.open(manifest_name(field_file.name), 'rb') as stored:
+            manifest = json.loads(stored.read())
+    except (OSError, ValueError):
+        from PIL import Image
+        try:
+            return build_derivatives(field_file)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            cache.set(key, {}, MANIFEST_CACHE_TIMEOUT)
+            return None
+    cache.set(key, manifest, MANIFEST_CACHE_TIMEOUT)
+    return manifest
+
+
+def srcset(field_file, manifest, ext):
+    return ', '.join('{} {}w'.format(field_file.storage.url(name), width)
+                     for width, name in manifest['sources'][ext])
+
+
+def url_for_width(field_file, width, ext='jpeg'):
+    manifest = get_manifest(field_file)
+    if manifest is None:
+        return field_file.url
+    candidates = manifest['sources'][ext]
+    for candidate_width, name in candidates:
+        if candidate_width >= width:
+            return field_file.storage.url(name)
+    return field_file.storage.url(candidates[-1][1])
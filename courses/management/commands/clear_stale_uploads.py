@@ -0,0 +1,36 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import LessonUpload
+
+
+class Command(BaseCommand):
+    help = ('Delete lesson video uploads that were started but never attached to a lesson, with their part files. '
+            'Run it daily, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=getattr(settings, 'LESSON_UPLOAD_EXPIRY_HOURS', 24),
+                            help='Age after which an unattached upload is considered abandoned.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        # post_delete removes each upload's part file
+        stale, deleted = LessonUpload.objects.filter(created_time__lt=cutoff).delete()
+
+        # Part files left behind by a crash between the row and the file
+        orphans = 0
+        directory = os.path.join(settings.MEDIA_ROOT, 'uploads')
+        if os.path.isdir(directory):
+            known = {'{}.part'.format(pk) for pk in LessonUpload.objects.values_list('pk', flat=True)}
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if (name.endswith('.part') and name not in known
+                        and os.path.getmtime(path) < time.time() - options['hours'] * 3600):
+                    os.remove(path)
+                    orphans += 1
+        self.stdout.write('Deleted {} stale uploads and {} orphaned part files.'.format(stale, orphans))
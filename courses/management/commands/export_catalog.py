@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from courses.catalog_io import detect_format, export_records, write_records
+
+
+class Command(BaseCommand):
+    help = 'Stream categories, courses and lessons to a JSON lines or CSV file that import_catalog can read.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Output file, or - for stdout.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help='Defaults to the file extension, else jsonl.')
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        if options['path'] == '-':
+            write_records(export_records(), sys.stdout, fmt)
+            return
+        with open(options['path'], 'w', newline='', encoding='utf-8') as output:
+            written = write_records(export_records(), output, fmt)
+        self.stdout.write('Exported {} records to {}.'.format(written, options['path']))
@@ -0,0 +1,184 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blog.models import Post, estimate_reading_time, make_excerpt
+from Coursera import pagecache
+from courses import entitlements
+from courses.models import Category, Course, Lesson
+from memberships.models import Membership, UserMembership, placeholder_customer_id
+from users.models import Profile
+
+WORDS = ('python', 'django', 'data', 'web', 'model', 'query', 'cache', 'design', 'test', 'deploy', 'async',
+         'index', 'server', 'client', 'api', 'form', 'view', 'template', 'signal', 'admin', 'stripe', 'search',
+         'lesson', 'course', 'learn', 'build', 'scale', 'review', 'practice', 'project', 'intro', 'advanced')
+MEMBERSHIPS = (('Bepul', 'free', 0), ('Professional', 'pro', 15), ('Korxona', 'ent', 40))
+# Share of generated users on each membership, in MEMBERSHIPS order
+MEMBERSHIP_WEIGHTS = (70, 25, 5)
+PASSWORD = 'load-test-password'
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic users, courses, lessons and posts for load testing. '
+            'Rows are written with bulk inserts; every generated name starts with --prefix.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--lessons-per-course', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42, help='Same seed and scale give the same data.')
+        parser.add_argument('--prefix', default='load', help='Prefix for generated usernames, slugs and titles.')
+        parser.add_argument('--clear', action='store_true', help='Delete rows generated with this prefix first.')
+
+    def words(self, count):
+        return ' '.join(self.random.choice(WORDS) for i in range(count))
+
+    def title(self, index):
+        return '{} {}'.format(self.words(2), index).capitalize()[:30]
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['courses'] and options['categories'] < 1:
+            raise CommandError('Courses need at least one category.')
+        self.random = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        if options['clear']:
+            self.clear()
+        elif User.objects.filter(username__startswith=self.prefix + '-').exists():
+            raise CommandError('Data with prefix "{}" exists; pass --clear or a different --prefix.'.format(self.prefix))
+
+        started = time.perf_counter()
+        memberships = self.memberships()
+        categories = self.timed('categories', self.create_categories, options['categories'])
+        users = self.timed('users', self.create_users, options['users'], memberships)
+        if not users:
+            raise CommandError('At least one user is needed to author courses and posts.')
+        courses = self.timed('courses', self.create_courses, options['courses'], users, categories, memberships)
+        self.timed('lessons', self.create_lessons, courses, options['lessons_per_course'])
+        self.timed('posts', self.create_posts, options['posts'], users)
+
+        # Bulk inserts skip the signals that keep the caches current
+        pagecache.bump_version()
+        entitlements.invalidate_index()
+        self.stdout.write('Done in {:.1f}s. Users can sign in with password "{}". '
+                          'Run rebuild_search_index to make the data searchable.'.format(
+                              time.perf_counter() - started, PASSWORD))
+
+    def timed(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write('{:>10} {}  {:.1f}s'.format(count, label, time.perf_counter() - started))
+        return result
+
+    def clear(self):
+        pattern = self.prefix + '-'
+        Post.objects.filter(author__username__startswith=pattern).delete()
+        Lesson.objects.filter(course__slug__startswith=pattern).delete()
+        Course.objects.filter(slug__startswith=pattern).delete()
+        Category.objects.filter(category__startswith=pattern).delete()
+        User.objects.filter(username__startswith=pattern).delete()
+
+    def memberships(self):
+        memberships = []
+        for membership_type, slug, price in MEMBERSHIPS:
+            membership = Membership.objects.filter(membership_type=membership_type).first()
+            if membership is None:
+                membership = Membership.objects.create(membership_type=membership_type, slug=slug, price=price,
+                                                       stripe_plan_id='plan_{}'.format(slug))
+            memberships.append(membership)
+        return memberships
+
+    def create_categories(self, count):
+        return Category.objects.bulk_create(
+            [Category(category='{}-{}-{}'.format(self.prefix, self.words(1), i)) for i in range(count)])
+
+    def create_users(self, count, memberships):
+        # Hashing is the slow part of creating users, so every account shares one hash
+        password = make_password(PASSWORD)
+        users = []
+        for batch in batched(range(count), self.batch_size):
+            with transaction.atomic():
+                created = User.objects.bulk_create([
+                    User(username='{}-user-{}'.format(self.prefix, i), email='{}-user-{}@example.com'.format(self.prefix, i),
+                         password=password)
+                    for i in batch])
+                if created[0].pk is None:
+                    created = list(User.objects.filter(username__in=[user.username for user in created]).order_by('pk'))
+                UserMembership.objects.bulk_create([
+                    UserMembership(user=user, stripe_customer_id=placeholder_customer_id(user),
+                                   membership=self.random.choices(memberships, MEMBERSHIP_WEIGHTS)[0])
+                    for user in created])
+                Profile.objects.bulk_create([Profile(user=user, is_teacher=self.random.random() < 0.05)
+                                             for user in created])
+            users.extend(user.pk for user in created)
+        return users
+
+    def create_courses(self, count, users, categories, memberships):
+        Allowed = Course.allowed_memberships.through
+        courses = []
+        for batch in batched(range(count), self.batch_size):
+            with transaction.atomic():
+                created = Course.objects.bulk_create([
+                    Course(creator_id=self.random.choice(users), slug='{}-course-{}'.format(self.prefix, i),
+                           title=self.title(i), category=self.random.choice(categories),
+                           description=self.words(self.random.randint(20, 60)).capitalize()[:400],
+                           duration='{} hafta'.format(self.random.randint(1, 12)))
+                    for i in batch])
+                if created[0].pk is None:
+                    created = list(Course.objects.filter(slug__in=[course.slug for course in created]).order_by('pk'))
+                # Free courses are open to every membership, the rest to paid ones
+                Allowed.objects.bulk_create([
+                    Allowed(course_id=course.pk, membership_id=membership.pk)
+                    for course in created
+                    for membership in (memberships if self.random.random() < 0.2 else memberships[1:])])
+            courses.extend(created)
+        return courses
+
+    def create_lessons(self, courses, per_course):
+        def lessons():
+            for course in courses:
+                for position in range(1, per_course + 1):
+                    yield Lesson(course_id=course.pk, slug='lesson-{}'.format(position), title=self.title(position),
+                                 position=position, thumbnail='', is_free_preview=position == 1)
+
+        created = 0
+        for batch in batched(lessons(), self.batch_size):
+            Lesson.objects.bulk_create(batch)
+            created += len(batch)
+        return created
+
+    def create_posts(self, count, users):
+        def posts():
+            for i in range(count):
+                text = '\n\n'.join(self.words(self.random.randint(40, 120)).capitalize() + '.'
+                                   for paragraph in range(self.random.randint(2, 8)))
+                # bulk_create skips Post.save(), which derives these
+                yield Post(author_id=self.random.choice(users), title=self.title(i), text=text,
+                           excerpt=make_excerpt(text), reading_time=estimate_reading_time(text))
+
+        created = 0
+        for batch in batched(posts(), self.batch_size):
+            Post.objects.bulk_create(batch)
+            created += len(batch)
+        return created
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.catalog_io import BATCH_SIZE, CatalogError, CatalogImporter, detect_format, read_records
+
+
+class Command(BaseCommand):
+    help = ('Create or update categories, courses and lessons from a JSON lines or CSV file, in batches. '
+            'Progress is checkpointed after every batch so a failed import can continue with --resume.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file, or - for stdin.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help='Defaults to the file extension, else jsonl.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--creator', help='Username that owns new courses without a creator column.')
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help='Report invalid records and import the rest instead of stopping.')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last checkpointed batch.')
+        parser.add_argument('--checkpoint', help='Checkpoint file. Defaults to PATH.checkpoint.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        creator = None
+        if options['creator']:
+            creator = User.objects.filter(username=options['creator']).first()
+            if creator is None:
+                raise CommandError('Unknown user "{}".'.format(options['creator']))
+        checkpoint = options['checkpoint'] or (
+            'catalog-import.checkpoint' if options['path'] == '-' else options['path'] + '.checkpoint')
+
+        after_line = 0
+        if options['resume']:
+            try:
+                with open(checkpoint) as saved:
+                    after_line = json.load(saved)['line']
+                self.stdout.write('Resuming after line {}.'.format(after_line))
+            except FileNotFoundError:
+                # The first batch failed, so there is nothing to skip
+                self.stdout.write('No checkpoint at {}; starting from the beginning.'.format(checkpoint))
+            except (ValueError, KeyError):
+                raise CommandError('Checkpoint {} is not readable.'.format(checkpoint))
+
+        def save_checkpoint(line):
+            with open(checkpoint, 'w') as saved:
+                json.dump({'line': line, 'path': options['path']}, saved)
+
+        importer = CatalogImporter(options['batch_size'], creator, options['skip_invalid'])
+        fmt = detect_format(options['path'], options['format'])
+        started = time.perf_counter()
+        try:
+            if options['path'] == '-':
+                importer.run(read_records(sys.stdin, fmt), after_line, save_checkpoint)
+            else:
+                with open(options['path'], newline='', encoding='utf-8') as source:
+                    importer.run(read_records(source, fmt), after_line, save_checkpoint)
+        except CatalogError as e:
+            raise CommandError('{}. Batches before it are saved; fix the file and run again with --resume.'.format(e))
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        for error in importer.errors[:20]:
+            self.stderr.write('Skipped {}'.format(error))
+        if len(importer.errors) > 20:
+            self.stderr.write('... and {} more skipped records.'.format(len(importer.errors) - 20))
+        for kind, counts in importer.stats.items():
+            self.stdout.write('{:>10} {}: {created} created, {updated} updated'.format('', kind, **counts).lstrip())
+        self.stdout.write('Imported in {:.1f}s.'.format(time.perf_counter() - started))
@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Measure how long a fresh process takes to import the serverless entry point, '
+            'and list the slowest imports.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='api.index', help='Module to import in a fresh interpreter.')
+        parser.add_argument('--top', type=int, default=25, help='Number of slowest imports to list.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+        parser.add_argument('--history', help='Append the report as a JSON line to this file to track it over time.')
+        parser.add_argument('--public-only', action='store_true',
+                            help='Profile with SERVERLESS_PUBLIC_ONLY enabled.')
+
+    def profile(self, module, public_only):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'Coursera.settings'))
+        if public_only:
+            env['SERVERLESS_PUBLIC_ONLY'] = 'True'
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                                cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True)
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode:
+            raise CommandError('Importing {} failed:\n{}'.format(module, result.stderr[-2000:]))
+
+        imports = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            imports.append({
+                'module': name.strip(),
+                'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+            })
+        return wall_ms, imports
+
+    def handle(self, *args, **options):
+        wall_ms, imports = self.profile(options['module'], options['public_only'])
+        top_level = [entry for entry in imports if entry['depth'] == 0]
+        # Self time summed per top-level package shows which dependency to make lazy
+        packages = {}
+        for entry in imports:
+            package = entry['module'].split('.')[0]
+            packages[package] = packages.get(package, 0) + entry['self_ms']
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+        report = {
+            'module': options['module'],
+            'public_only': options['public_only'],
+            'timestamp': int(time.time()),
+            'wall_ms': round(wall_ms, 1),
+            'import_ms': round(sum(entry['cumulative_ms'] for entry in top_level), 1),
+            'modules': len(imports),
+            'slowest': [{'package': package, 'self_ms': round(ms, 1)} for package, ms in slowest],
+        }
+
+        if options['history']:
+            with open(options['history'], 'a') as history:
+                history.write(json.dumps(report) + '\n')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write('Process wall time: {wall_ms} ms, imports: {import_ms} ms across {modules} modules'.format(**report))
+        for entry in report['slowest']:
+            self.stdout.write('{:>10.1f} ms  {}'.format(entry['self_ms'], entry['package']))
@@ -0,0 +1,183 @@
+import json
+import queue
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from Coursera import profiling
+from blog.models import Post
+from courses.models import Lesson
+
+re_query_count = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+
+def summarize(samples):
+    durations = [duration for duration, status, queries in samples]
+    queries = [queries for duration, status, queries in samples if queries is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for duration, status, queries in samples if status >= 400),
+        'statuses': {str(status): sum(1 for sample in samples if sample[1] == status)
+                     for status in sorted({sample[1] for sample in samples})},
+        'mean_ms': round(sum(durations) / len(durations), 2) if durations else None,
+        'p50_ms': round(profiling.percentile(durations, 0.50), 2),
+        'p95_ms': round(profiling.percentile(durations, 0.95), 2),
+        'p99_ms': round(profiling.percentile(durations, 0.99), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Drive the main pages under concurrency and print p50/p95/p99 latency, throughput and queries per '
+            'request as JSON. Runs in-process by default; pass --base-url to load a running server instead.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per URL.')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per URL before the run.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--username', help='User for the signed-in pages. Defaults to a paying member.')
+        parser.add_argument('--base-url', help='Benchmark a running server, e.g. http://localhost:8000. Queries per '
+                                               'request are read from Server-Timing when it runs with profiling.')
+        parser.add_argument('--sessionid', help='Session cookie for the signed-in pages with --base-url.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def scenario(self, count, seed):
+        """The URLs to hit, spread over random courses and posts so caches see a realistic mix."""
+        rng = random.Random(seed)
+        lessons = list(Lesson.objects.filter(course__isnull=False).select_related('course')
+                       .order_by('pk').values_list('course__slug', 'slug')[:5000])
+        if not lessons:
+            raise CommandError('There are no lessons; run generate_load_data first.')
+        posts = list(Post.objects.values_list('pk', flat=True)[:5000]) or [None]
+        urls = {
+            'courses:home': lambda: reverse('courses:home'),
+            'courses:course_list': lambda: reverse('courses:course_list'),
+            'courses:course_detail': lambda: reverse('courses:course_detail', args=[rng.choice(lessons)[0]]),
+            'courses:lesson_detail': lambda: reverse('courses:lesson_detail', args=rng.choice(lessons)),
+            'blogs:post_list': lambda: reverse('blogs:post_list'),
+            'users:profile': lambda: reverse('users:profile'),
+            'memberships:select_membership': lambda: reverse('memberships:select_membership'),
+        }
+        if posts[0] is not None:
+            urls['blogs:post_detail'] = lambda: reverse('blogs:post_detail', args=[rng.choice(posts)])
+        jobs = [(name, build()) for name, build in urls.items() for i in range(count)]
+        rng.shuffle(jobs)
+        return jobs
+
+    def member(self, username):
+        users = User.objects.all()
+        if username:
+            users = users.filter(username=username)
+        else:
+            users = users.filter(usermembership__membership__membership_type='Professional').order_by('pk')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to sign in as; pass --username or run generate_load_data.')
+        return user
+
+    def local_client(self, user):
+        host = next((host for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost')
+        # Server errors are counted in the report instead of stopping the run
+        client = Client(raise_request_exception=False, HTTP_HOST=host.lstrip('.'))
+        client.force_login(user)
+
+        def request(path):
+            token = profiling.start()
+            try:
+                status = client.get(path).status_code
+            finally:
+                profile = profiling.stop(token)
+            return status, profile.db_count
+        return request
+
+    def remote_client(self, base_url, sessionid):
+        headers = {'Cookie': 'sessionid={}'.format(sessionid)} if sessionid else {}
+        opener = urllib.request.build_opener(NoRedirect)
+
+        def request(path):
+            try:
+                response = opener.open(urllib.request.Request(base_url.rstrip('/') + path, headers=headers))
+            except urllib.error.HTTPError as e:
+                response = e
+            with response:
+                response.read()
+                match = re_query_count.search(response.headers.get('Server-Timing', ''))
+                return response.status, int(match.group(1)) if match else None
+        return request
+
+    def run(self, jobs, concurrency, make_client):
+        results = {}
+        pending = queue.Queue()
+        for job in jobs:
+            pending.put(job)
+
+        def worker():
+            request = make_client()
+            try:
+                while True:
+                    try:
+                        name, path = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    started = time.perf_counter()
+                    status, queries = request(path)
+                    results.setdefault(name, []).append(((time.perf_counter() - started) * 1000, status, queries))
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive.')
+        if options['base_url']:
+            make_client = lambda: self.remote_client(options['base_url'], options['sessionid'])
+        else:
+            profiling.install()
+            user = self.member(options['username'])
+            make_client = lambda: self.local_client(user)
+
+        if options['warmup']:
+            self.run(self.scenario(options['warmup'], options['seed'] + 1), options['concurrency'], make_client)
+        results, elapsed = self.run(self.scenario(options['requests'], options['seed']),
+                                    options['concurrency'], make_client)
+
+        report = {
+            'version': getattr(settings, 'RELEASE_VERSION', '') or None,
+            'timestamp': int(time.time()),
+            'target': options['base_url'] or 'in-process',
+            'database': connections['default'].vendor,
+            'concurrency': options['concurrency'],
+            'duration_s': round(elapsed, 2),
+            'throughput_rps': round(sum(len(samples) for samples in results.values()) / elapsed, 1),
+            'overall': summarize([sample for samples in results.values() for sample in samples]),
+            'urls': {name: summarize(samples) for name, samples in sorted(results.items())},
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+        self.stdout.write(output)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect usually means the session is missing; report it rather than follow it
+    def redirect_request(self, *args, **kwargs):
+        return None
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from courses.catalog import get_category_summary
+from courses.pagination import KeysetPaginator
+from courses.views import CourseListView, course_list_queryset
+
+DEFAULT_PAGES = ('courses:home', 'courses:about', 'courses:contact', 'courses:course_list', 'blogs:post_list')
+
+
+class Command(BaseCommand):
+    help = ('Render the landing and catalog pages once so anonymous visitors are served from the page cache. '
+            'Run after deploy; only useful when CACHES points at a cache shared with the web processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Extra paths to warm, e.g. /blog/?page=2')
+        parser.add_argument('--catalog-pages', type=int, default=3,
+                            help='Number of course list pages to warm, following the pager.')
+        parser.add_argument('--host', help='Host header to send. Defaults to the first ALLOWED_HOSTS entry.')
+
+    def catalog_paths(self, pages):
+        paginator = KeysetPaginator(course_list_queryset(), 'created_time', CourseListView.paginate_by)
+        cursor = paginator.page().next_cursor
+        paths = []
+        while cursor and len(paths) < pages - 1:
+            paths.append('{}?after={}'.format(reverse('courses:course_list'), cursor))
+            cursor = paginator.page(after=cursor).next_cursor
+        return paths
+
+    def handle(self, *args, **options):
+        backend = settings.CACHES['default']
+        if backend['BACKEND'] == 'Coursera.cache.TieredCache':
+            backend = settings.CACHES[backend['LOCATION']]
+        if 'locmem' in backend['BACKEND'].lower():
+            self.stderr.write('The default cache is per process, so warming it from here has no effect on the site.')
+        host = options['host'] or next((host for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost')
+        client = Client(HTTP_HOST=host.lstrip('.'))
+
+        paths = [reverse(name) for name in DEFAULT_PAGES]
+        paths += self.catalog_paths(options['catalog_pages'])
+        paths += [reverse('courses:category_course_list', args=[category['id']]) for category in get_category_summary()]
+        paths += options['paths']
+        warmed = 0
+        for path in paths:
+            response = client.get(path)
+            state = response.get('X-Page-Cache', 'not cached')
+            if response.status_code == 200 and state != 'not cached':
+                warmed += 1
+            self.stdout.write('{} {} {}'.format(response.status_code, state, path))
+        self.stdout.write(self.style.SUCCESS('Warmed {} of {} pages.'.format(warmed, len(paths))))
@@ -0,0 +1,122 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    File wrapper that stops reading after `length` bytes. It keeps `fileno`
+    so servers with a sendfile-capable wsgi.file_wrapper (gunicorn) can send
+    the range straight from the kernel, starting at the current offset.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) of a single-range `Range` header, None when the
+    header should be ignored, or raise ValueError when it is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def if_range_matches(header, etag, mtime):
+    """
+    Whether an `If-Range` validator still names the file on disk: a strong
+    ETag must match exactly (weak ones never do), a date must equal its
+    Last-Modified.
+    """
+    header = header.strip()
+    if header.startswith(('"', 'W/')):
+        return header == etag
+    return parse_http_date_safe(header) == int(mtime)
+
+
+def offload_response(field_file, mode):
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.LESSON_MEDIA_ACCEL_PREFIX + field_file.name
+    else:
+        response['X-Sendfile'] = field_file.path
+    return response
+
+
+def serve_lesson_media(request, field_file):
+    # Front proxies handle Range themselves when they serve the file
+    if settings.LESSON_MEDIA_OFFLOAD:
+        return offload_response(field_file, settings.LESSON_MEDIA_OFFLOAD)
+
+    path = field_file.path
+    size = field_file.size
+    mtime = os.path.getmtime(path)
+    etag = '"{:x}-{:x}"'.format(int(mtime), size)
+    range_header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and if_range and not if_range_matches(if_range, etag, mtime):
+        # The video was replaced since the client's copy: resend all of it
+        range_header = ''
+    byte_range = None
+    if range_header:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = FileResponse(RangeFile(open(path, 'rb'), start, length))
+    response.block_size = 64 * 1024
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+    response['Cache-Control'] = 'private, max-age=3600'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    return response
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_lesson_is_free_preview'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-created_time', '-id'], name='course_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_lessonupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='updated_time',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+def resolve_duplicates(apps, schema_editor):
+    """Make existing lessons satisfy the new constraints: suffix clashing slugs, append clashing positions."""
+    Lesson = apps.get_model('courses', 'Lesson')
+    seen_slugs, seen_positions, last_position = set(), set(), {}
+    lessons = list(Lesson.objects.filter(course__isnull=False).order_by('course_id', 'position', 'id'))
+    # Renamed slugs must not collide with any slug in the course, including ones not reached yet
+    taken_slugs = {(lesson.course_id, lesson.slug) for lesson in lessons}
+    for lesson in lessons:
+        last_position[lesson.course_id] = lesson.position
+    for lesson in lessons:
+        changed = []
+        if (lesson.course_id, lesson.slug) in seen_slugs:
+            slug, suffix = '{}-{}'.format(lesson.slug[:40], lesson.pk), 1
+            while (lesson.course_id, slug) in taken_slugs:
+                slug, suffix = '{}-{}-{}'.format(lesson.slug[:36], lesson.pk, suffix), suffix + 1
+            lesson.slug = slug
+            taken_slugs.add((lesson.course_id, slug))
+            changed.append('slug')
+        if (lesson.course_id, lesson.position) in seen_positions:
+            last_position[lesson.course_id] += 1
+            lesson.position = last_position[lesson.course_id]
+            changed.append('position')
+        seen_slugs.add((lesson.course_id, lesson.slug))
+        seen_positions.add((lesson.course_id, lesson.position))
+        if changed:
+            lesson.save(update_fields=changed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_lesson_updated_time'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('course', 'slug'), name='lesson_course_slug_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('course', 'position'), name='lesson_course_position_unique'),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
 from memberships.models import Membership
 from django.contrib.auth.models import User
 from django.urls import reverse
@@ -22,9 +26,28 @@ class Course(models.Model):
     ending_date = models.DateField(null=True)
     allowed_memberships = models.ManyToManyField(Membership,related_name='membershipsallowed')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_time', '-id'], name='course_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_title_slug = (instance.__dict__.get('title'), instance.__dict__.get('slug'))
+        return instance
+
+    def title_or_slug_changed(self):
+        # Lesson search documents carry both, so only then do they need rebuilding
+        return (self.title, self.slug) != getattr(self, '_saved_title_slug', (None, None))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_title_slug = (self.title, self.slug)
+
     def get_absolute_url(self):
         return reverse("courses:course_detail", kwargs={"slug": self.slug})
 
@@ -43,9 +66,67 @@ class Lesson(models.Model):
     thumbnail = models.ImageField()
     position = models.IntegerField()
     is_free_preview = models.BooleanField(default=False, help_text='Mark this lesson as a free preview/demo that all users can access')
+    updated_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Lessons are addressed by (course slug, lesson slug) and listed by position
+            models.UniqueConstraint(fields=['course', 'slug'], name='lesson_course_slug_unique'),
+            models.UniqueConstraint(fields=['course', 'position'], name='lesson_course_position_unique'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
         return reverse("courses:lesson_detail", kwargs={"course_slug": self.course.slug,'lesson_slug':self.slug})
+
+    def get_video_url(self):
+        return reverse("courses:lesson_video", kwargs={"course_slug": self.course.slug,'lesson_slug':self.slug})
+
+
+def park_lessons(lessons):
+    """
+    Move lessons onto unused negative positions (their negated pk), so they
+    can then take each other's places without tripping
+    lesson_course_position_unique. Call inside the transaction that writes
+    the final positions.
+    """
+    Lesson.objects.filter(pk__in=[lesson.pk for lesson in lessons]).update(position=-models.F('pk'))
+    for lesson in lessons:
+        lesson.position = -lesson.pk
+
+
+def move_lessons(positions):
+    """
+    Save new positions for lessons ({lesson: position}). Moved lessons are
+    parked first, so lessons can swap places.
+    """
+    moved = {lesson: position for lesson, position in positions.items() if lesson.position != position}
+    with transaction.atomic():
+        park_lessons(list(moved))
+        for lesson, position in moved.items():
+            lesson.position = position
+            lesson.save(update_fields=['position', 'updated_time'])
+    return len(moved)
+
+
+class LessonUpload(models.Model):
+    """A resumable lesson video upload, assembled chunk by chunk on disk."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(User,on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.filename
+
+    @property
+    def completed(self):
+        return self.offset >= self.size
+
+    @property
+    def part_path(self):
+        return os.path.join(settings.MEDIA_ROOT, 'uploads', '{}.part'.format(self.id))
@@ -0,0 +1,100 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = '{}|{}'.format(value.isoformat(), pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if value is None:
+        raise InvalidCursor(cursor)
+    return value, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Newest-first pagination on (field, pk) that seeks with a WHERE clause
+    instead of OFFSET, so every page costs the same however deep it is.
+    """
+
+    def __init__(self, queryset, field, per_page):
+        self.queryset = queryset
+        self.field = field
+        self.per_page = per_page
+
+    def _seek(self, cursor, older):
+        value, pk = decode_cursor(cursor)
+        lookup = 'lt' if older else 'gt'
+        return Q(**{'{}__{}'.format(self.field, lookup): value}) | Q(
+            **{self.field: value, 'pk__{}'.format(lookup): pk})
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    def _query(self, after, before):
+        if before:
+            qs = self.queryset.filter(self._seek(before, older=False)).order_by(self.field, 'pk')
+        else:
+            qs = self.queryset.order_by('-{}'.format(self.field), '-pk')
+            if after:
+                qs = qs.filter(self._seek(after, older=True))
+        return qs[:self.per_page + 1]
+
+    def _build(self, rows, after, before):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before:
+            rows = rows[::-1]
+            return KeysetPage(
+                rows,
+                next_cursor=self._cursor(rows[-1]) if rows else None,
+                previous_cursor=self._cursor(rows[0]) if rows and has_more else None,
+            )
+        return KeysetPage(
+            rows,
+            next_cursor=self._cursor(rows[-1]) if rows and has_more else None,
+            previous_cursor=self._cursor(rows[0]) if rows and after else None,
+        )
+
+    def page(self, after=None, before=None):
+        return self._build(list(self._query(after, before)), after, before)
+
+    async def apage(self, after=None, before=None):
+        return self._build([obj async for obj in self._query(after, before)], after, before)
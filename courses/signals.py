@@ -0,0 +1,48 @@
+import os
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from Coursera import pagecache
+from courses import entitlements, images
+from courses.models import Category, Course, Lesson, LessonUpload
+from memberships.models import Membership, UserMembership
+
+
+@receiver(m2m_changed, sender=Course.allowed_memberships.through)
+def allowed_memberships_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        entitlements.invalidate_index()
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def catalog_membership_changed(sender, **kwargs):
+    entitlements.invalidate_index()
+
+
+@receiver(post_save, sender=UserMembership)
+@receiver(post_delete, sender=UserMembership)
+def user_membership_changed(sender, instance, **kwargs):
+    entitlements.invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=LessonUpload)
+def remove_upload_part(sender, instance, **kwargs):
+    if os.path.exists(instance.part_path):
+        os.remove(instance.part_path)
+
+
+@receiver(post_save, sender=Lesson)
+def build_thumbnail_derivatives(sender, instance, **kwargs):
+    images.get_manifest(instance.thumbnail)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def catalog_content_changed(sender, **kwargs):
+    pagecache.bump_version()
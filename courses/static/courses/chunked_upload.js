@@ -0,0 +1,147 @@
+(function () {
+  'use strict';
+
+  var MAX_RETRIES = 5;
+
+  function getCookie(name) {
+    var match = document.cookie.match('(^|;)\\s*' + name + '=([^;]*)');
+    return match ? decodeURIComponent(match[2]) : '';
+  }
+
+  function request(method, url, body, headers) {
+    headers = headers || {};
+    headers['X-CSRFToken'] = getCookie('csrftoken');
+    return fetch(url, {method: method, body: body, headers: headers, credentials: 'same-origin'})
+      .then(function (response) {
+        return response.json().then(function (data) {
+          data.status = response.status;
+          return data;
+        });
+      });
+  }
+
+  function sha256(blob) {
+    if (!window.crypto || !window.crypto.subtle) {
+      return Promise.resolve('');
+    }
+    return blob.arrayBuffer().then(function (buffer) {
+      return window.crypto.subtle.digest('SHA-256', buffer);
+    }).then(function (hash) {
+      return Array.prototype.map.call(new Uint8Array(hash), function (b) {
+        return ('0' + b.toString(16)).slice(-2);
+      }).join('');
+    });
+  }
+
+  function wait(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+  }
+
+  function ChunkedUpload(container) {
+    this.container = container;
+    this.createUrl = container.getAttribute('data-create-url');
+    this.fileInput = container.querySelector('.chunked-upload-file');
+    this.progress = container.querySelector('.chunked-upload-progress');
+    this.status = container.querySelector('.chunked-upload-status');
+    this.hidden = container.querySelector('input[type=hidden]');
+    this.fileInput.addEventListener('change', this.start.bind(this));
+  }
+
+  ChunkedUpload.prototype.storageKey = function (file) {
+    return 'chunked-upload:' + [file.name, file.size, file.lastModified].join(':');
+  };
+
+  ChunkedUpload.prototype.report = function (text, offset, size) {
+    this.status.textContent = text;
+    if (size) {
+      this.progress.style.display = '';
+      this.progress.value = Math.floor(offset * 100 / size);
+    }
+  };
+
+  ChunkedUpload.prototype.resumeOrCreate = function (file) {
+    var self = this;
+    var uploadId = window.localStorage.getItem(this.storageKey(file));
+    var created = function () {
+      var form = new FormData();
+      form.append('filename', file.name);
+      form.append('size', file.size);
+      return request('POST', self.createUrl, form).then(function (data) {
+        if (data.status !== 201) {
+          throw new Error(data.error || 'Could not start the upload.');
+        }
+        window.localStorage.setItem(self.storageKey(file), data.upload_id);
+        return data;
+      });
+    };
+    if (!uploadId) {
+      return created();
+    }
+    return request('GET', this.createUrl + uploadId + '/').then(function (data) {
+      return data.status === 200 ? data : created();
+    });
+  };
+
+  ChunkedUpload.prototype.sendChunk = function (file, upload, attempt) {
+    var self = this;
+    var url = this.createUrl + upload.upload_id + '/';
+    var end = Math.min(upload.offset + upload.chunk_size, file.size);
+    var chunk = file.slice(upload.offset, end);
+    return sha256(chunk).then(function (checksum) {
+      var headers = {
+        'Content-Type': 'application/octet-stream',
+        'Content-Range': 'bytes ' + upload.offset + '-' + (end - 1) + '/' + file.size
+      };
+      if (checksum) {
+        headers['X-Chunk-SHA256'] = checksum;
+      }
+      return request('PUT', url, chunk, headers);
+    }).then(function (data) {
+      // 409 carries the server's offset, so the loop continues from there
+      if (data.status === 200 || data.status === 409) {
+        return data;
+      }
+      throw new Error(data.error || 'Chunk upload failed.');
+    }).catch(function (error) {
+      if (attempt >= MAX_RETRIES) {
+        throw error;
+      }
+      self.report('Connection problem, retrying...', upload.offset, file.size);
+      return wait(1000 * Math.pow(2, attempt)).then(function () {
+        return self.sendChunk(file, upload, attempt + 1);
+      });
+    });
+  };
+
+  ChunkedUpload.prototype.start = function () {
+    var self = this;
+    var file = this.fileInput.files[0];
+    if (!file) {
+      return;
+    }
+    this.hidden.value = '';
+    this.report('Preparing upload...');
+
+    var loop = function (upload) {
+      self.report('Uploading ' + file.name, upload.offset, file.size);
+      if (upload.completed) {
+        return upload;
+      }
+      return self.sendChunk(file, upload, 0).then(loop);
+    };
+
+    this.resumeOrCreate(file).then(loop).then(function (upload) {
+      window.localStorage.removeItem(self.storageKey(file));
+      self.hidden.value = upload.upload_id;
+      self.report('Upload complete. Save the lesson to attach the video.', upload.size, upload.size);
+    }).catch(function (error) {
+      self.report('Upload stopped: ' + error.message + ' Select the file again to resume.');
+    });
+  };
+
+  document.addEventListener('DOMContentLoaded', function () {
+    Array.prototype.forEach.call(document.querySelectorAll('.chunked-upload'), function (container) {
+      new ChunkedUpload(container);
+    });
+  });
+})();
@@ -0,0 +1,32 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from courses import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(field_file, alt='', sizes='100vw', **attrs):
+    """
+    Render a <picture> with WebP and JPEG srcsets for an uploaded image,
+    falling back to a plain <img> of the original when no derivatives exist.
+    """
+    extra = format_html_join('', ' {}="{}"', ((key.replace('_', '-'), value) for key, value in attrs.items()))
+    manifest = images.get_manifest(field_file)
+    if manifest is None:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', field_file.url, alt, extra)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy"{}></picture>',
+        images.srcset(field_file, manifest, 'webp'), sizes,
+        field_file.storage.url(manifest['sources']['jpeg'][-1][1]), images.srcset(field_file, manifest, 'jpeg'), sizes,
+        alt, extra,
+    )
+
+
+@register.filter
+def image_width(field_file, width):
+    """URL of the smallest JPEG derivative at least `width` pixels wide."""
+    if not field_file:
+        return ''
+    return images.url_for_width(field_file, int(width))
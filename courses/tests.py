@@ -1,3 +1,702 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404, HttpResponse
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from Coursera.middleware import CompressionMiddleware
+from blog.models import Post
+from courses import catalog, entitlements, images
+from courses.async_views import AsyncCourseDetailView, AsyncCourseListView, AsyncHomeView
+from courses.management.commands.run_benchmark import summarize
+from courses.forms import LessonAdminForm
+from courses.models import Category, Course, Lesson, LessonUpload
+from courses.uploads import attach_upload, start_upload
+from courses.views import CourseListView
+from memberships.models import Membership, UserMembership
+
+
+class EntitlementIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.pro = Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+        self.free = Membership.objects.create(slug='free', membership_type='Bepul', stripe_plan_id='plan_free')
+        category = Category.objects.create(category='python')
+        self.course = Course.objects.create(creator=self.user, slug='django', title='Django', category=category,
+                                            description='Learn Django', duration='1 hafta')
+        self.course.allowed_memberships.add(self.pro)
+
+    def make_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return request
+
+    def test_access_follows_membership_changes(self):
+        user_membership = UserMembership.objects.get(user=self.user)
+        user_membership.membership = self.free
+        user_membership.save()
+        self.assertFalse(entitlements.has_course_access(self.make_request(), self.course))
+
+        user_membership.membership = self.pro
+        user_membership.save()
+        self.assertTrue(entitlements.has_course_access(self.make_request(), self.course))
+
+        self.course.allowed_memberships.remove(self.pro)
+        self.assertFalse(entitlements.has_course_access(self.make_request(), self.course))
+
+    @override_settings(SHARED_CACHE_IS_LOCAL=False)
+    def test_cached_check_does_not_query(self):
+        request = self.make_request()
+        entitlements.has_course_access(request, self.course)
+        with self.assertNumQueries(0):
+            entitlements.has_course_access(self.make_request(), self.course)
+
+    def test_per_process_cache_never_serves_another_workers_stale_tier(self):
+        worker_a, worker_b = LocMemCache('worker-a', {}), LocMemCache('worker-b', {})
+        user_membership = UserMembership.objects.get(user=self.user)
+        user_membership.membership = self.pro
+        user_membership.save()
+        with mock.patch('courses.entitlements.cache', worker_a):
+            self.assertTrue(entitlements.has_course_access(self.make_request(), self.course))
+        # The cancellation is handled, and invalidated, by another worker
+        with mock.patch('courses.entitlements.cache', worker_b):
+            user_membership.membership = self.free
+            user_membership.save()
+        with mock.patch('courses.entitlements.cache', worker_a):
+            self.assertFalse(entitlements.has_course_access(self.make_request(), self.course))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CourseListViewTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        category = Category.objects.create(category='python')
+        for i in range(30):
+            Course.objects.create(creator=user, slug='course-{}'.format(i), title='Course {}'.format(i),
+                                  category=category, description='word ' * 100, duration='1 hafta')
+
+    def test_pages_walk_catalog_without_overlap(self):
+        seen = []
+        response = self.client.get('/courses/')
+        while True:
+            seen.extend(course.pk for course in response.context['courses'])
+            page = response.context['page_obj']
+            if not page.has_next:
+                break
+            response = self.client.get('/courses/', {'after': page.next_cursor})
+        self.assertEqual(sorted(seen), sorted(Course.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+        previous = self.client.get('/courses/', {'before': page.previous_cursor})
+        self.assertEqual(len(previous.context['courses']), CourseListView.paginate_by)
+
+    def test_page_query_count_is_constant(self):
+        # catalog version for the ETag, then the page itself
+        with self.assertNumQueries(2):
+            self.client.get('/courses/')
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/courses/', {'after': 'garbage'}).status_code, 404)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CategoryCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        self.python = Category.objects.create(category='python')
+        self.design = Category.objects.create(category='design')
+        Category.objects.create(category='music')
+        for i in range(5):
+            Course.objects.create(creator=user, slug='python-{}'.format(i), title='Python {}'.format(i),
+                                  category=self.python, description='Python course', duration='1 hafta')
+        Course.objects.create(creator=user, slug='figma', title='Figma', category=self.design,
+                              description='Design course', duration='1 hafta')
+
+    def test_summary_counts_and_newest_courses_in_one_query(self):
+        with self.assertNumQueries(1):
+            summary = catalog.build_category_summary(top=3)
+        by_name = {category['name']: category for category in summary}
+        self.assertEqual([category['name'] for category in summary], ['design', 'music', 'python'])
+        self.assertEqual(by_name['python']['course_count'], 5)
+        self.assertEqual([course['slug'] for course in by_name['python']['courses']],
+                         ['python-4', 'python-3', 'python-2'])
+        self.assertEqual(by_name['music']['course_count'], 0)
+        self.assertEqual(by_name['music']['courses'], [])
+
+    def test_summary_is_cached_until_catalog_changes(self):
+        catalog.get_category_summary()
+        with self.assertNumQueries(0):
+            catalog.get_category_summary()
+        self.design.category = 'ui design'
+        self.design.save()
+        self.assertIn('ui design', [category['name'] for category in catalog.get_category_summary()])
+
+    def test_category_page_lists_only_its_courses(self):
+        response = self.client.get('/categories/{}/'.format(self.design.pk))
+        self.assertEqual([course.slug for course in response.context['courses']], ['figma'])
+        self.assertEqual(response.context['category'], self.design)
+        self.assertEqual(self.client.get('/categories/999/').status_code, 404)
+
+    def test_home_links_category_cards(self):
+        response = self.client.get('/')
+        self.assertContains(response, '/categories/{}/'.format(self.python.pk))
+        self.assertContains(response, '5 courses')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CourseDetailQueryBudgetTests(TestCase):
+    # session, user, content version, course with creator/category, lessons, user tier, entitlement index
+    QUERY_BUDGET = 7
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        pro = Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+        UserMembership.objects.filter(user=self.user).update(membership=pro)
+        category = Category.objects.create(category='python')
+        self.course = Course.objects.create(creator=self.user, slug='django', title='Django', category=category,
+                                            description='Learn Django', duration='1 hafta')
+        self.course.allowed_memberships.add(pro)
+        self.client.force_login(self.user)
+
+    def add_lessons(self, count):
+        start = self.course.lesson_set.count()
+        Lesson.objects.bulk_create([
+            Lesson(course=self.course, slug='lesson-{}'.format(i), title='Lesson {}'.format(i),
+                   thumbnail='lesson.jpg', position=i, is_free_preview=i == 0)
+            for i in range(start, start + count)
+        ])
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.course.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_is_flat_as_lessons_grow(self):
+        counts = []
+        for batch in (1, 9, 40):
+            self.add_lessons(batch)
+            counts.append(self.count_queries())
+        self.assertEqual(len(set(counts)), 1, counts)
+        self.assertLessEqual(counts[0], self.QUERY_BUDGET)
+
+    def test_first_lesson_and_demo_flags(self):
+        self.add_lessons(3)
+        response = self.client.get(self.course.get_absolute_url())
+        self.assertTrue(response.context['has_access'])
+        self.assertEqual(response.context['first_lesson'].position, 0)
+        self.assertTrue(response.context['showing_demo'])
+        self.assertEqual([lesson.position for lesson in response.context['demo_lessons']], [0])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        category = Category.objects.create(category='python')
+        self.course = Course.objects.create(creator=self.user, slug='django', title='Django', category=category,
+                                            description='Learn Django', duration='1 hafta')
+        self.lesson = Lesson.objects.create(course=self.course, slug='intro', title='Intro', position=1,
+                                            is_free_preview=True)
+        self.client.force_login(self.user)
+
+    def test_unchanged_detail_is_not_modified(self):
+        etag = self.client.get(self.course.get_absolute_url())['ETag']
+        response = self.client.get(self.course.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_lesson_edit_and_logout_change_detail_etag(self):
+        etag = self.client.get(self.course.get_absolute_url())['ETag']
+        self.lesson.title = 'Welcome'
+        self.lesson.save()
+        response = self.client.get(self.course.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Welcome')
+
+        self.client.logout()
+        response = self.client.get('/courses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_catalog_revalidates_by_last_modified_for_anonymous_visitors(self):
+        self.client.logout()
+        last_modified = self.client.get('/courses/')['Last-Modified']
+        self.assertEqual(self.client.get('/courses/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_html_is_gzipped_but_video_is_not(self):
+        response = self.client.get('/courses/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+        response = HttpResponse(b'\0' * 1000, content_type='video/mp4')
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(CompressionMiddleware(lambda request: response)(request).has_header('Content-Encoding'))
+
+    @mock.patch('Coursera.middleware.brotli')
+    def test_pages_with_a_csrf_token_are_never_brotli_compressed(self, brotli):
+        brotli.compress.return_value = b'br'
+        middleware = CompressionMiddleware(lambda request: HttpResponse('<p>page</p>' * 100))
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(middleware(request)['Content-Encoding'], 'br')
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        request.META['CSRF_COOKIE_USED'] = True
+        self.assertEqual(middleware(request)['Content-Encoding'], 'gzip')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        self.category = Category.objects.create(category='python')
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Python')
+
+    def test_content_changes_invalidate_cached_pages(self):
+        self.client.get('/courses/')
+        Course.objects.create(creator=self.user, slug='django', title='Django', category=self.category,
+                              description='Learn Django', duration='1 hafta')
+        response = self.client.get('/courses/')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Learn Django')
+
+    def test_cached_catalog_still_answers_conditional_requests(self):
+        etag = self.client.get('/courses/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/courses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_signed_in_pages_are_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get('/')
+        self.assertFalse(self.client.get('/').has_header('X-Page-Cache'))
+
+    def test_warm_command_fills_cache(self):
+        out = io.StringIO()
+        call_command('warm_page_cache', stdout=out, stderr=io.StringIO())
+        self.assertIn('Warmed 6 of 6 pages.', out.getvalue())
+        self.assertEqual(self.client.get('/blog/')['X-Page-Cache'], 'hit')
+
+
+class LoadDataTests(TestCase):
+    def test_generator_fills_what_signals_normally_would(self):
+        call_command('generate_load_data', users=30, categories=40, courses=5, lessons_per_course=4, posts=6,
+                     batch_size=7, stdout=io.StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='load-').count(), 30)
+        self.assertEqual(UserMembership.objects.filter(user__username__startswith='load-').count(), 30)
+        self.assertEqual(Lesson.objects.filter(course__slug__startswith='load-').count(), 20)
+        self.assertTrue(all(course.allowed_memberships.exists() for course in Course.objects.all()))
+        self.assertFalse(Post.objects.filter(excerpt='').exists())
+        names = Category.objects.filter(category__startswith='load-').values_list('category', flat=True)
+        self.assertEqual(len(set(names)), 40)
+
+        # Same seed, same data
+        first = list(Course.objects.order_by('slug').values_list('slug', 'title', 'description'))
+        call_command('generate_load_data', users=30, categories=40, courses=5, lessons_per_course=4, posts=6,
+                     clear=True, stdout=io.StringIO())
+        self.assertEqual(list(Course.objects.order_by('slug').values_list('slug', 'title', 'description')), first)
+
+    def test_benchmark_summary(self):
+        samples = [(float(ms), 200, 3) for ms in range(1, 101)] + [(500.0, 500, None)]
+        summary = summarize(samples)
+        self.assertEqual(summary['requests'], 101)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['statuses'], {'200': 100, '500': 1})
+        self.assertEqual(summary['p50_ms'], 51.0)
+        self.assertEqual(summary['p99_ms'], 100.0)
+        self.assertEqual(summary['queries_per_request'], 3)
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        self.pro = Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+        category = Category.objects.create(category='python')
+        self.course = Course.objects.create(creator=self.user, slug='django', title='Django', category=category,
+                                            description='Learn Django', duration='1 hafta')
+        self.course.allowed_memberships.add(self.pro)
+        for position in (1, 2):
+            Lesson.objects.create(course=self.course, slug='part-{}'.format(position), title='Part {}'.format(position),
+                                  position=position, thumbnail='', is_free_preview=position == 1)
+
+    def write(self, name, records):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as output:
+            output.write(''.join(json.dumps(record) + '\n' for record in records))
+        return path
+
+    def test_csv_round_trip(self):
+        path = os.path.join(self.directory, 'catalog.csv')
+        call_command('export_catalog', path, stdout=io.StringIO())
+        Course.objects.all().delete()
+        Lesson.objects.all().delete()
+
+        call_command('import_catalog', path, stdout=io.StringIO())
+        course = Course.objects.get(slug='django')
+        self.assertEqual(course.creator, self.user)
+        self.assertEqual(list(course.allowed_memberships.all()), [self.pro])
+        self.assertEqual(list(course.lessons.values_list('slug', 'position', 'is_free_preview')),
+                         [('part-1', 1, True), ('part-2', 2, False)])
+        self.assertEqual(Category.objects.count(), 1)
+
+    def test_reimport_swaps_positions_and_skips_unchanged_rows(self):
+        Lesson.objects.create(course=self.course, slug='part-3', title='Part 3', position=3, thumbnail='')
+        path = self.write('catalog.jsonl', [
+            {'type': 'course', 'slug': 'django', 'title': 'Django', 'category': 'python', 'creator': 'teacher',
+             'description': 'Learn Django', 'duration': '1 hafta'},
+            {'type': 'lesson', 'course': 'django', 'slug': 'part-1', 'title': 'Part 1', 'position': 2,
+             'is_free_preview': True},
+            {'type': 'lesson', 'course': 'django', 'slug': 'part-2', 'title': 'Part 2', 'position': 1},
+            {'type': 'lesson', 'course': 'django', 'slug': 'part-3', 'title': 'Part 3', 'position': 3},
+        ])
+        course_modified = self.course.created_time
+        unchanged = Lesson.objects.get(slug='part-3')
+        # A batch of two would split the course's lessons; they are kept together instead
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_catalog', path, batch_size=2, stdout=io.StringIO())
+        self.assertEqual(list(self.course.lessons.values_list('slug', flat=True)), ['part-2', 'part-1', 'part-3'])
+        self.assertEqual(Course.objects.get(pk=self.course.pk).created_time, course_modified)
+        self.assertEqual(Lesson.objects.get(slug='part-3').updated_time, unchanged.updated_time)
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertFalse([sql for sql in updates if sql.startswith('UPDATE "courses_course"')], updates)
+        self.assertFalse([sql for sql in updates if '"courses_lesson"."id" = {})'.format(unchanged.pk) in sql], updates)
+
+    def test_invalid_record_stops_and_resume_continues(self):
+        records = [{'type': 'course', 'slug': 'flask-{}'.format(i), 'title': 'Flask {}'.format(i),
+                    'category': 'web', 'creator': 'teacher', 'duration': '2 hafta'} for i in range(4)]
+        records[3]['slug'] = 'not a slug'
+        path = self.write('catalog.jsonl', records)
+        with self.assertRaisesMessage(CommandError, 'line 4: slug "not a slug" is not a valid slug'):
+            call_command('import_catalog', path, batch_size=2, stdout=io.StringIO())
+        # The first batch was committed and checkpointed
+        self.assertEqual(Course.objects.filter(slug__startswith='flask-').count(), 2)
+        self.assertTrue(os.path.exists(path + '.checkpoint'))
+
+        records[3]['slug'] = 'flask-3'
+        self.write('catalog.jsonl', records)
+        out = io.StringIO()
+        call_command('import_catalog', path, batch_size=2, resume=True, stdout=out)
+        self.assertIn('Resuming after line 2.', out.getvalue())
+        self.assertIn('course: 2 created', out.getvalue())
+        self.assertEqual(Course.objects.filter(slug__startswith='flask-').count(), 4)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AsyncCatalogViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        category = Category.objects.create(category='python')
+        self.course = Course.objects.create(creator=self.user, slug='django', title='Django', category=category,
+                                            description='Learn Django', duration='1 hafta')
+        Lesson.objects.create(course=self.course, slug='intro', title='Intro', position=1, is_free_preview=True)
+
+    def make_request(self, path, user=None, **params):
+        request = AsyncRequestFactory().get(path, params)
+        request.user = user or AnonymousUser()
+        request.session = SessionStore()
+        return request
+
+    async def test_home_lists_categories(self):
+        response = await AsyncHomeView.as_view()(self.make_request('/'))
+        self.assertContains(response, 'Python')
+
+    async def test_course_list_pages_like_sync_view(self):
+        response = await AsyncCourseListView.as_view()(self.make_request('/courses/'))
+        self.assertContains(response, 'Learn Django')
+        with self.assertRaises(Http404):
+            await AsyncCourseListView.as_view()(self.make_request('/courses/', after='garbage'))
+
+    async def test_course_detail_requires_login(self):
+        response = await AsyncCourseDetailView.as_view()(self.make_request('/courses/django/'), slug='django')
+        self.assertEqual(response.status_code, 302)
+
+    async def test_course_detail_shows_demo_lesson(self):
+        request = self.make_request('/courses/django/', user=self.user)
+        response = await AsyncCourseDetailView.as_view()(request, slug='django')
+        self.assertContains(response, 'Intro')
+        with self.assertRaises(Http404):
+            await AsyncCourseDetailView.as_view()(request, slug='missing')
+
+    async def test_pages_use_conditional_get_and_page_cache(self):
+        view = AsyncCourseListView.as_view()
+        response = await view(self.make_request('/courses/'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual((await view(self.make_request('/courses/')))['X-Page-Cache'], 'hit')
+
+        request = self.make_request('/courses/', user=self.user)
+        etag = (await view(request))['ETag']
+        request = self.make_request('/courses/', user=self.user)
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        self.assertEqual((await view(request)).status_code, 304)
+
+        request = self.make_request('/courses/django/', user=self.user)
+        etag = (await AsyncCourseDetailView.as_view()(request, slug='django'))['ETag']
+        request = self.make_request('/courses/django/', user=self.user)
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        self.assertEqual((await AsyncCourseDetailView.as_view()(request, slug='django')).status_code, 304)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class LessonLookupTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('student', 'student@example.com', 'password')
+        category = Category.objects.create(category='python')
+        for slug in ('django', 'flask'):
+            course = Course.objects.create(creator=user, slug=slug, title=slug.title(), category=category,
+                                           description='Learn {}'.format(slug), duration='1 hafta')
+            Lesson.objects.create(course=course, slug='intro', title='{} intro'.format(slug.title()), position=1,
+                                  is_free_preview=True)
+        self.client.force_login(user)
+
+    def test_shared_lesson_slug_resolves_within_course(self):
+        self.assertContains(self.client.get('/courses/flask/intro/'), 'Flask intro')
+        self.assertContains(self.client.get('/courses/django/intro/'), 'Django intro')
+        self.assertEqual(self.client.get('/courses/rails/intro/').status_code, 404)
+
+    def test_lesson_and_course_load_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/courses/flask/intro/')
+        lesson_queries = [query['sql'] for query in queries.captured_queries if 'courses_' in query['sql']]
+        self.assertEqual(len(lesson_queries), 1, lesson_queries)
+
+    def test_slug_and_position_are_unique_per_course(self):
+        course = Course.objects.get(slug='django')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Lesson.objects.create(course=course, slug='intro', title='Again', position=2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Lesson.objects.create(course=course, slug='setup', title='Setup', position=1)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_admin_swaps_positions(self):
+        course = Course.objects.get(slug='django')
+        setup = Lesson.objects.create(course=course, slug='setup', title='Setup', position=2)
+        intro = Lesson.objects.get(course=course, slug='intro')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:courses_lesson_changelist')
+        data = {'action': 'reorder_lessons', '_selected_action': [intro.pk, setup.pk]}
+        self.assertContains(self.client.post(url, data), 'Save positions')
+
+        data.update({'apply': 'Save positions', 'position_{}'.format(intro.pk): 2,
+                     'position_{}'.format(setup.pk): 1})
+        self.assertRedirects(self.client.post(url, data), url, fetch_redirect_response=False)
+        self.assertEqual(list(course.lessons.values_list('slug', flat=True)), ['setup', 'intro'])
+
+        # Clashing with a lesson that was not selected is refused without changes
+        data = {'action': 'reorder_lessons', '_selected_action': [intro.pk], 'apply': 'Save positions',
+                'position_{}'.format(intro.pk): 1}
+        self.client.post(url, data)
+        self.assertEqual(list(course.lessons.values_list('slug', flat=True)), ['setup', 'intro'])
+
+
+class LessonVideoViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, LESSON_MEDIA_OFFLOAD='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.pro = Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+        category = Category.objects.create(category='python')
+        course = Course.objects.create(creator=self.user, slug='django', title='Django', category=category,
+                                       description='Learn Django', duration='1 hafta')
+        course.allowed_memberships.add(self.pro)
+        self.lesson = Lesson(course=course, slug='intro', title='Intro', thumbnail='lesson.jpg', position=1)
+        self.lesson.video_url.save('intro.mp4', ContentFile(bytes(range(256)) * 4))
+        self.client.force_login(self.user)
+
+    def subscribe(self):
+        user_membership = UserMembership.objects.get(user=self.user)
+        user_membership.membership = self.pro
+        user_membership.save()
+
+    def test_premium_video_requires_access(self):
+        self.assertEqual(self.client.get(self.lesson.get_video_url()).status_code, 403)
+        self.subscribe()
+        response = self.client.get(self.lesson.get_video_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(len(b''.join(response.streaming_content)), 1024)
+
+    def test_range_request_returns_partial_content(self):
+        self.subscribe()
+        response = self.client.get(self.lesson.get_video_url(), HTTP_RANGE='bytes=256-511')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 256-511/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)))
+
+        response = self.client.get(self.lesson.get_video_url(), HTTP_RANGE='bytes=-10')
+        self.assertEqual(response['Content-Range'], 'bytes 1014-1023/1024')
+
+        response = self.client.get(self.lesson.get_video_url(), HTTP_RANGE='bytes=2048-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range_only_resumes_the_same_file(self):
+        self.subscribe()
+        url = self.lesson.get_video_url()
+        full = self.client.get(url)
+        for validator in (full['ETag'], full['Last-Modified']):
+            response = self.client.get(url, HTTP_RANGE='bytes=256-511', HTTP_IF_RANGE=validator)
+            self.assertEqual(response.status_code, 206)
+
+        for validator in ('"stale"', 'W/' + full['ETag'], 'Thu, 01 Jan 2015 00:00:00 GMT'):
+            response = self.client.get(url, HTTP_RANGE='bytes=256-511', HTTP_IF_RANGE=validator)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('Content-Range'))
+            self.assertEqual(len(b''.join(response.streaming_content)), 1024)
+
+    @override_settings(LESSON_MEDIA_OFFLOAD='x-accel-redirect')
+    def test_offload_to_front_proxy(self):
+        self.subscribe()
+        response = self.client.get(self.lesson.get_video_url())
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.lesson.video_url.name)
+
+
+@override_settings(LESSON_UPLOAD_CHUNK_SIZE=4)
+class LessonUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def put_chunk(self, upload_id, data, start, total, checksum=None):
+        headers = {'HTTP_CONTENT_RANGE': 'bytes {}-{}/{}'.format(start, start + len(data) - 1, total)}
+        if checksum is not None:
+            headers['HTTP_X_CHUNK_SHA256'] = checksum
+        return self.client.put('/lesson-uploads/{}/'.format(upload_id), data,
+                               content_type='application/octet-stream', **headers)
+
+    def test_chunks_resume_and_attach(self):
+        payload = b'0123456789'
+        upload_id = self.client.post('/lesson-uploads/', {'filename': 'lecture.mp4', 'size': 10}).json()['upload_id']
+
+        self.assertEqual(self.put_chunk(upload_id, payload[:4], 0, 10).json()['offset'], 4)
+        # A bad checksum does not advance the upload
+        response = self.put_chunk(upload_id, payload[4:8], 4, 10, checksum='0' * 64)
+        self.assertEqual((response.status_code, response.json()['offset']), (422, 4))
+        # Replaying an old chunk reports where to resume
+        self.assertEqual(self.put_chunk(upload_id, payload[:4], 0, 10).status_code, 409)
+
+        self.put_chunk(upload_id, payload[4:8], 4, 10, checksum=hashlib.sha256(payload[4:8]).hexdigest())
+        status = self.put_chunk(upload_id, payload[8:], 8, 10).json()
+        self.assertTrue(status['completed'])
+
+        upload = LessonUpload.objects.get(pk=upload_id)
+        lesson = Lesson(slug='intro', title='Intro', thumbnail='lesson.jpg', position=1)
+        attach_upload(lesson, upload)
+        with lesson.video_url.open('rb') as video:
+            self.assertEqual(video.read(), payload)
+        self.assertFalse(LessonUpload.objects.filter(pk=upload_id).exists())
+
+    def test_admin_only_attaches_own_uploads(self):
+        other = User.objects.create_superuser('other', 'other@example.com', 'password')
+        upload = start_upload(other, 'lecture.mp4', 4)
+        LessonUpload.objects.filter(pk=upload.pk).update(offset=4)
+        form = LessonAdminForm()
+        form.user = self.admin
+        form.cleaned_data = {'video_upload': upload.pk}
+        with self.assertRaises(ValidationError):
+            form.clean_video_upload()
+        form.user = other
+        self.assertEqual(form.clean_video_upload(), upload)
+
+    def test_stale_uploads_and_orphaned_parts_are_cleared(self):
+        fresh = start_upload(self.admin, 'fresh.mp4', 10)
+        stale = start_upload(self.admin, 'stale.mp4', 10)
+        LessonUpload.objects.filter(pk=stale.pk).update(created_time=timezone.now() - timedelta(days=2))
+        orphan = os.path.join(self.media_root, 'uploads', 'lost.part')
+        open(orphan, 'wb').close()
+        os.utime(orphan, (time.time() - 2 * 86400,) * 2)
+
+        out = io.StringIO()
+        call_command('clear_stale_uploads', stdout=out)
+        self.assertIn('Deleted 1 stale uploads and 1 orphaned part files.', out.getvalue())
+        self.assertEqual(list(LessonUpload.objects.all()), [fresh])
+        self.assertTrue(os.path.exists(fresh.part_path))
+        self.assertFalse(os.path.exists(stale.part_path) or os.path.exists(orphan))
+
+    def test_oversized_chunk_is_rejected(self):
+        upload_id = self.client.post('/lesson-uploads/', {'filename': 'lecture.mp4', 'size': 10}).json()['upload_id']
+        self.assertEqual(self.put_chunk(upload_id, b'012345', 0, 10).status_code, 413)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WIDTHS=(320, 640, 1280))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make_post(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (1000, 500), (200, 10, 10, 128)).save(buffer, 'PNG')
+        author = User.objects.create_user('author', 'author@example.com', 'password')
+        post = Post(author=author, title='Hello', text='Hello world')
+        post.image.save('hello.png', ContentFile(buffer.getvalue()))
+        return post
+
+    def test_derivatives_built_on_save_and_rendered(self):
+        post = self.make_post()
+        manifest = images.get_manifest(post.image)
+        self.assertEqual([width for width, name in manifest['sources']['webp']], [320, 640])
+        for ext in ('webp', 'jpeg'):
+            for width, name in manifest['sources'][ext]:
+                with Image.open(os.path.join(self.media_root, name)) as derivative:
+                    self.assertEqual(derivative.width, width)
+
+        html = Template('{% load responsive_images %}{% responsive_image post.image alt="Hi" %}').render(
+            Context({'post': post}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('320w', html)
+
+    def test_manifest_read_back_after_cache_loss(self):
+        post = self.make_post()
+        cache.clear()
+        self.assertEqual(images.get_manifest(post.image)['width'], 1000)
+
+    def test_unreadable_image_falls_back_to_original(self):
+        author = User.objects.create_user('author', 'author@example.com', 'password')
+        post = Post.objects.create(author=author, title='Hello', text='Hello world')
+        html = Template('{% load responsive_images %}{% responsive_image post.image %}').render(Context({'post': post}))
+        self.assertIn('src="/media/default.png"', html)
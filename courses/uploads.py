@@ -0,0 +1,115 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
+
+from courses.models import LessonUpload
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledFile(File):
+    # FileSystemStorage moves files that expose temporary_file_path instead
+    # of copying them, so attaching a multi-GB upload is a rename
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_chunk_size():
+    return getattr(settings, 'LESSON_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def start_upload(user, filename, size):
+    if size <= 0:
+        raise UploadError('Upload size must be positive.')
+    upload = LessonUpload.objects.create(created_by=user, filename=get_valid_filename(filename), size=size)
+    os.makedirs(os.path.dirname(upload.part_path), exist_ok=True)
+    with open(upload.part_path, 'wb'):
+        pass
+    return upload
+
+
+def parse_content_range(header, upload):
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('Content-Range header is required.')
+    start, end, total = (int(value) for value in match.groups())
+    if total != upload.size or end < start or end >= total:
+        raise UploadError('Content-Range does not match the upload.')
+    if end - start + 1 > get_chunk_size():
+        raise UploadError('Chunk is larger than the allowed chunk size.', status=413)
+    if start != upload.offset:
+        raise UploadError('Expected a chunk starting at byte {}.'.format(upload.offset), status=409)
+    return start, end
+
+
+def write_chunk(upload, stream, content_range, checksum=None):
+    """
+    Stream one chunk from `stream` into the part file and advance the upload
+    offset. The body is copied in small reads and hashed on the way, so it is
+    never held in memory. A chunk with a bad checksum leaves the offset where
+    it was and is simply overwritten by the retry.
+    """
+    start, end = parse_content_range(content_range, upload)
+    expected = end - start + 1
+    digest = hashlib.sha256()
+    written = 0
+    with open(upload.part_path, 'r+b') as part:
+        part.seek(start)
+        while written < expected:
+            data = stream.read(min(READ_SIZE, expected - written))
+            if not data:
+                break
+            part.write(data)
+            digest.update(data)
+            written += len(data)
+
+    if written != expected:
+        raise UploadError('Chunk body is shorter than its Content-Range.')
+    if checksum and checksum.lower() != digest.hexdigest():
+        raise UploadError('Chunk checksum mismatch.', status=422)
+
+    # Only the writer that saw the current offset may advance it
+    updated = LessonUpload.objects.filter(pk=upload.pk, offset=start).update(offset=end + 1)
+    if not updated:
+        raise UploadError('Chunk was already received.', status=409)
+    upload.offset = end + 1
+    if upload.completed:
+        os.truncate(upload.part_path, upload.size)
+    return upload
+
+
+def attach_upload(lesson, upload):
+    if not upload.completed:
+        raise UploadError('Upload is not complete.')
+    with open(upload.part_path, 'rb') as part:
+        name = default_storage.save('videos/{}'.format(upload.filename), AssembledFile(part))
+    lesson.video_url.name = name
+    upload.delete()
+    return lesson
+
+
+def discard_upload(upload):
+    # The part file is removed by the post_delete signal
+    upload.delete()
+
+
+def upload_status(upload):
+    return {
+        'upload_id': str(upload.pk),
+        'offset': upload.offset,
+        'size': upload.size,
+        'chunk_size': get_chunk_size(),
+        'completed': upload.completed,
+    }
@@ -1,14 +1,24 @@
+from django.conf import settings
 from django.urls import path
 
-from courses.views import HomeView,AboutView,ContactView,CourseListView, CourseDetailView,LessonDetailView
+from courses.views import (HomeView,AboutView,ContactView,CourseListView, CourseDetailView,LessonDetailView,LessonVideoView,
+                           lesson_upload_create,lesson_upload_detail)
 
 app_name = 'courses'
 
+if settings.ASYNC_VIEWS:
+    from courses.async_views import AsyncCourseDetailView, AsyncCourseListView, AsyncHomeView
+    HomeView, CourseListView, CourseDetailView = AsyncHomeView, AsyncCourseListView, AsyncCourseDetailView
+
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
     path('about/', AboutView.as_view(), name='about'),
     path('contact/', ContactView.as_view(), name='contact'),
     path('courses/', CourseListView.as_view(), name='course_list'),
+    path('categories/<int:category_id>/', CourseListView.as_view(), name='category_course_list'),
+    path('lesson-uploads/', lesson_upload_create, name='lesson_upload_create'),
+    path('lesson-uploads/<uuid:upload_id>/', lesson_upload_detail, name='lesson_upload_detail'),
     path('courses/<slug>/', CourseDetailView.as_view(), name='course_detail'),
     path('courses/<course_slug>/<lesson_slug>/', LessonDetailView.as_view(), name='lesson_detail'),
+    path('courses/<course_slug>/<lesson_slug>/video/', LessonVideoView.as_view(), name='lesson_video'),
 ]
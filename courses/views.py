@@ -1,89 +1,157 @@
 from django.shortcuts import render
 from django.views.generic import TemplateView,ListView,DetailView,View
-from courses.models import Course,Lesson,Category
-from memberships.models import UserMembership
+from courses.models import Course,Lesson,Category,LessonUpload
+from courses.catalog import get_category_summary
+from courses.entitlements import get_user_tier, has_course_access
+from courses.media import serve_lesson_media
+from courses.pagination import InvalidCursor, KeysetPaginator
+from courses.uploads import UploadError, discard_upload, start_upload, upload_status, write_chunk
+from django.contrib.auth.decorators import user_passes_test
+from django.db.models import Count, Max, Prefetch
+from django.db.models.functions import Substr
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST, require_http_methods
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin,UserPassesTestMixin
 from django.contrib import messages
+from django.utils.decorators import method_decorator
+from Coursera.conditional import conditional_page
+from Coursera.pagecache import cache_anonymous_page
 # Create your views here.
 
+@method_decorator(cache_anonymous_page, name='dispatch')
 class HomeView(TemplateView):
     template_name = 'index.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category = Category.objects.all()
-        context['category'] = category
+        context['categories'] = get_category_summary()
         return context
 
+@method_decorator(cache_anonymous_page, name='dispatch')
 class AboutView(TemplateView):
     template_name = 'about.html'
 
+@method_decorator(cache_anonymous_page, name='dispatch')
 class ContactView(TemplateView):
     template_name = 'contact.html'
 
+
+def course_list_queryset(excerpt_length=160):
+    # Only the columns the catalog cards render, with a short description excerpt
+    return (Course.objects
+            .select_related('category', 'creator')
+            .only('slug', 'title', 'created_time', 'category__category', 'creator__username')
+            .annotate(description_excerpt=Substr('description', 1, excerpt_length)))
+
+
+def course_detail_queryset():
+    # Course, creator, category and its ordered lessons in a single fetch
+    return Course.objects.select_related('creator', 'category').prefetch_related(
+        Prefetch('lesson_set', queryset=Lesson.objects.order_by('position'), to_attr='ordered_lessons'))
+
+
+def course_detail_context(course, has_access):
+    lessons = course.ordered_lessons
+    # Demo/free preview lessons are accessible to all users
+    demo_lessons = [lesson for lesson in lessons if lesson.is_free_preview]
+    context = {
+        'lessons': lessons,
+        'has_access': has_access,
+        'demo_lessons': demo_lessons,
+        'has_demo_lessons': bool(demo_lessons),
+        'showing_demo': False,
+    }
+
+    # Get first lesson for initial video display
+    # Show video player if user has access OR if there are demo lessons
+    if has_access and lessons:
+        first_lesson = lessons[0]
+        context['first_lesson'] = first_lesson
+        context['showing_demo'] = first_lesson.is_free_preview
+    elif demo_lessons:
+        # Prioritize showing a demo lesson if the user doesn't have access
+        context['first_lesson'] = demo_lessons[0]
+        context['showing_demo'] = True
+    return context
+
+
+def course_list_version(request, category_id=None):
+    courses = Course.objects.all()
+    if category_id is not None:
+        courses = courses.filter(category_id=category_id)
+    catalog = courses.aggregate(latest=Max('created_time'), count=Count('pk'))
+    return catalog['latest'], (catalog['count'], category_id, request.GET.get('after'), request.GET.get('before'))
+
+
+def course_detail_version(request, slug):
+    # Only members see the page, and what they see depends on their access
+    if not request.user.is_authenticated:
+        return None
+    row = (Course.objects.filter(slug=slug)
+           .annotate(lessons_changed=Max('lesson__updated_time'), lesson_count=Count('lesson'))
+           .values_list('pk', 'created_time', 'lessons_changed', 'lesson_count').first())
+    if row is None:
+        return None
+    pk, created_time, lessons_changed, lesson_count = row
+    last_modified = max(created_time, lessons_changed) if lessons_changed else created_time
+    return last_modified, (pk, lesson_count, has_course_access(request, pk))
+
+
+@method_decorator(cache_anonymous_page, name='dispatch')
+@method_decorator(conditional_page(course_list_version), name='dispatch')
 class CourseListView(ListView):
     context_object_name = 'courses'
     template_name = 'courses/course_list.html'
     model = Course
+    paginate_by = 24
+    excerpt_length = 160
+
+    def get_queryset(self):
+        queryset = course_list_queryset(self.excerpt_length)
+        self.category = None
+        if 'category_id' in self.kwargs:
+            self.category = get_object_or_404(Category, pk=self.kwargs['category_id'])
+            queryset = queryset.filter(category=self.category)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['category'] = self.category
+        return context
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, 'created_time', page_size)
+        try:
+            page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return paginator, page, page.object_list, page.has_next or page.has_previous
 
 
+@method_decorator(conditional_page(course_detail_version), name='dispatch')
 class CourseDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'course'
     template_name = 'courses/course_detail.html'
     model = Course
     login_url = '/accounts/login/'
     
+    def get_queryset(self):
+        return course_detail_queryset()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        course = self.get_object()
-        lessons = course.lessons
-        context['lessons'] = lessons
-        
-        # Check if user has access to this course
-        has_access = False
-        try:
-            user_membership = UserMembership.objects.get(user=self.request.user)
-            if user_membership.membership:
-                user_membership_type = user_membership.membership.membership_type
-                course_allowed_membership_type = course.allowed_memberships.all()
-                if course_allowed_membership_type.filter(membership_type=user_membership_type).exists():
-                    has_access = True
-        except UserMembership.DoesNotExist:
-            pass
-        
-        context['has_access'] = has_access
-        
-        # Get demo/free preview lessons (accessible to all users)
-        demo_lessons = lessons.filter(is_free_preview=True)
-        context['demo_lessons'] = demo_lessons
-        context['has_demo_lessons'] = demo_lessons.exists()
-        
-        # Get first lesson for initial video display
-        # Show video player if user has access OR if there are demo lessons
-        context['showing_demo'] = False  # Default value
-        if lessons and lessons.exists():
-            # Prioritize showing a demo lesson if available and user doesn't have access
-            if not has_access and demo_lessons.exists():
-                first_lesson = demo_lessons.first()
-                context['first_lesson'] = first_lesson
-                context['showing_demo'] = True
-            elif has_access:
-                first_lesson = lessons.first()
-                context['first_lesson'] = first_lesson
-                # Check if the first lesson is actually a demo lesson
-                if first_lesson and first_lesson.is_free_preview:
-                    context['showing_demo'] = True
-                else:
-                    context['showing_demo'] = False
+        context.update(course_detail_context(self.object, has_course_access(self.request, self.object)))
         return context
 
 class LessonDetailView(LoginRequiredMixin, View):
     login_url = '/accounts/login/'
     
     def get(self, request, course_slug, lesson_slug, *args, **kwargs):
-        course = get_object_or_404(Course, slug=course_slug)
-        lesson = get_object_or_404(Lesson, slug=lesson_slug)
+        # One joined lookup, served by the unique (course, slug) index
+        lesson = get_object_or_404(Lesson.objects.select_related('course'), course__slug=course_slug, slug=lesson_slug)
+        course = lesson.course
         
         # Check if lesson is a free preview (accessible to all users)
         if lesson.is_free_preview:
@@ -91,21 +159,60 @@ class LessonDetailView(LoginRequiredMixin, View):
             return render(request, "courses/lesson_detail.html", context)
         
         # Check if user has a membership for paid lessons
-        try:
-            user_membership = UserMembership.objects.get(user=request.user)
-            if user_membership.membership:
-                user_membership_type = user_membership.membership.membership_type
-                course_allowed_membership_type = course.allowed_memberships.all()
-                context = { 'lesson': None }
-                if course_allowed_membership_type.filter(membership_type=user_membership_type).exists():
-                    context = {'lesson': lesson, 'is_demo': False}
-                else:
-                    messages.info(request, 'You need to upgrade your membership to access this lesson.')
-            else:
-                context = { 'lesson': None }
-                messages.info(request, 'You need to select a membership to access this lesson.')
-        except UserMembership.DoesNotExist:
-            context = { 'lesson': None }
+        has_user_membership, membership_type = get_user_tier(request)
+        context = { 'lesson': None }
+        if not has_user_membership:
             messages.info(request, 'You need to create a membership to access this lesson.')
+        elif membership_type is None:
+            messages.info(request, 'You need to select a membership to access this lesson.')
+        elif has_course_access(request, course):
+            context = {'lesson': lesson, 'is_demo': False}
+        else:
+            messages.info(request, 'You need to upgrade your membership to access this lesson.')
         
         return render(request, "courses/lesson_detail.html", context)
+
+class LessonVideoView(LoginRequiredMixin, View):
+    login_url = '/accounts/login/'
+
+    def get(self, request, course_slug, lesson_slug, *args, **kwargs):
+        lesson = get_object_or_404(Lesson.objects.select_related('course'), course__slug=course_slug, slug=lesson_slug)
+        if not lesson.video_url:
+            raise Http404('This lesson has no video.')
+        if not lesson.is_free_preview and not has_course_access(request, lesson.course):
+            raise PermissionDenied('You need to upgrade your membership to watch this lesson.')
+        return serve_lesson_media(request, lesson.video_url)
+
+
+# Works without django.contrib.admin installed, unlike staff_member_required
+staff_required = user_passes_test(lambda user: user.is_active and user.is_staff, login_url='/accounts/login/')
+
+
+@staff_required
+@require_POST
+def lesson_upload_create(request):
+    try:
+        size = int(request.POST.get('size', ''))
+        upload = start_upload(request.user, request.POST.get('filename', 'video'), size)
+    except ValueError:
+        return JsonResponse({'error': 'A numeric upload size is required.'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(upload_status(upload), status=201)
+
+
+@staff_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def lesson_upload_detail(request, upload_id):
+    upload = get_object_or_404(LessonUpload, pk=upload_id, created_by=request.user)
+    if request.method == 'PUT':
+        try:
+            write_chunk(upload, request, request.META.get('HTTP_CONTENT_RANGE'),
+                        request.META.get('HTTP_X_CHUNK_SHA256'))
+        except UploadError as e:
+            upload.refresh_from_db()
+            return JsonResponse(dict(upload_status(upload), error=str(e)), status=e.status)
+    elif request.method == 'DELETE':
+        discard_upload(upload)
+        return JsonResponse({'upload_id': str(upload_id), 'deleted': True})
+    return JsonResponse(upload_status(upload))
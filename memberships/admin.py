@@ -1,7 +1,15 @@
 from django.contrib import admin
-from memberships.models import UserMembership,Membership,Subscription
+from memberships.models import UserMembership,Membership,Subscription,StripeEvent
 # Register your models here.
 
 admin.site.register(UserMembership)
 admin.site.register(Membership)
 admin.site.register(Subscription)
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'received_time', 'processed_time']
+    list_filter = ['type']
+    search_fields = ['event_id']
+    readonly_fields = ['event_id', 'type', 'payload', 'received_time', 'processed_time', 'error']
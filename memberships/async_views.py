@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponseRedirect
+from django.shortcuts import redirect
+from django.urls import reverse
+
+from Coursera.async_helpers import arender, async_login_required, run_blocking
+from memberships.models import Membership, provision_stripe_customer, stripe_enabled
+from memberships.views import cancel_stripe_subscription, charge_subscription, send_cancellation_email
+
+# Async counterparts of the payment views. Stripe and SMTP calls run in worker
+# threads, so a slow provider holds a thread rather than the whole worker.
+
+
+@async_login_required
+async def AsyncPaymentView(request):
+    user_membership = (await request.membership.aload()).user_membership
+    if not user_membership:
+        messages.error(request, 'Please create a membership first.')
+        return redirect(reverse("memberships:select_membership"))
+    membership_type = request.session.get('selected_membership_type')
+    if membership_type is None:
+        return redirect(reverse("memberships:select_membership"))
+    selected_membership = await Membership.objects.filter(membership_type=membership_type).afirst()
+
+    if request.method == "POST":
+        try:
+            token = request.POST['stripeToken']
+
+            # The customer may still be queued from signup; payment needs it now
+            if stripe_enabled() and user_membership.stripe_customer_id.startswith('temp_'):
+                await run_blocking(provision_stripe_customer)(user_membership.pk)
+                await user_membership.arefresh_from_db(fields=['stripe_customer_id'])
+
+            if stripe_enabled() and not user_membership.stripe_customer_id.startswith('temp_'):
+                subscription_id = await run_blocking(charge_subscription)(
+                    user_membership.stripe_customer_id, token, selected_membership.stripe_plan_id)
+            else:
+                # Create a temporary subscription ID for testing
+                subscription_id = f'temp_sub_{request.user.id}_{selected_membership.membership_type}'
+
+            return redirect(reverse('memberships:update_transaction',
+                                    kwargs={'subscription_id': subscription_id}))
+        except Exception as e:
+            messages.error(request, f'Payment processing failed: {str(e)}')
+            return redirect(reverse("memberships:select_membership"))
+
+    context = {
+        'publishKey': settings.STRIPE_PUBLISHABLE_KEY,
+        'selected_membership': selected_membership
+    }
+    return await arender(request, "memberships/membership_payment.html", context)
+
+
+@async_login_required
+async def AsyncCancelSubscription(request):
+    membership = await request.membership.aload()
+    user_membership, user_sub = membership.user_membership, membership.subscription
+
+    if not user_sub or user_sub.active is False:
+        messages.info(request, "You don't have an active membership")
+        return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+
+    # Only cancel Stripe subscription if it's a real one
+    if stripe_enabled() and not user_sub.stripe_subscription_id.startswith('temp_'):
+        try:
+            await run_blocking(cancel_stripe_subscription)(user_sub.stripe_subscription_id)
+        except Exception as e:
+            messages.warning(request, f'Stripe subscription cancellation failed: {str(e)}')
+
+    user_sub.active = False
+    user_sub.status = 'canceled'
+    await user_sub.asave()
+
+    free_membership = (await Membership.objects.filter(membership_type='Bepul').afirst()
+                       or await Membership.objects.filter(membership_type='free').afirst())
+    if not free_membership:
+        messages.error(request, 'Free membership not found. Please contact support.')
+        return redirect(reverse('memberships:select_membership'))
+
+    user_membership.membership = free_membership
+    await user_membership.asave()
+
+    messages.info(
+        request, "Subscription successfully cancelled. We have sent you an email notification")
+    await run_blocking(send_cancellation_email)(request.user.email)
+    return redirect(reverse('memberships:select_membership'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from memberships.webhooks import BATCH_SIZE, process_pending_events, retry_failed_events
+
+
+class Command(BaseCommand):
+    help = 'Apply logged Stripe webhook events to subscriptions and memberships.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop.')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Retry events that failed too many times to be picked up again.')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write('Retrying {} failed events.'.format(retry_failed_events()))
+        while True:
+            handled = process_pending_events(batch_size=options['batch_size'])
+            if handled:
+                self.stdout.write('Applied {} events.'.format(handled))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
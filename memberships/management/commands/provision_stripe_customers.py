@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from memberships.models import UserMembership, provision_stripe_customer, stripe_enabled
+
+
+class Command(BaseCommand):
+    help = 'Create Stripe customers for memberships that still have a temp_ placeholder id.'
+
+    def handle(self, *args, **options):
+        if not stripe_enabled():
+            self.stdout.write('STRIPE_SECRET_KEY is not configured, nothing to provision.')
+            return
+        pending = (UserMembership.objects.filter(stripe_customer_id__startswith='temp_')
+                   .exclude(user__email='').values_list('pk', flat=True))
+        provisioned = failed = 0
+        for pk in pending.iterator():
+            try:
+                if provision_stripe_customer(pk):
+                    provisioned += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write('UserMembership {}: {}'.format(pk, e))
+        self.stdout.write(self.style.SUCCESS('Provisioned {} customers ({} failed).'.format(provisioned, failed)))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from memberships.models import Subscription, stripe_enabled
+
+
+class Command(BaseCommand):
+    help = 'Refresh the local copy of subscription status and billing dates from Stripe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-only', action='store_true',
+                            help='Only refresh subscriptions that have never been synced.')
+
+    def handle(self, *args, **options):
+        if not stripe_enabled():
+            self.stdout.write('STRIPE_SECRET_KEY is not configured, nothing to sync.')
+            return
+        subscriptions = Subscription.objects.exclude(stripe_subscription_id__startswith='temp_')
+        if options['stale_only']:
+            subscriptions = subscriptions.filter(synced_time__isnull=True)
+        synced = failed = 0
+        for subscription in subscriptions.iterator():
+            try:
+                subscription.refresh_from_stripe()
+                synced += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write('{}: {}'.format(subscription.stripe_subscription_id, e))
+        self.stdout.write(self.style.SUCCESS('Synced {} subscriptions ({} failed).'.format(synced, failed)))
@@ -0,0 +1,83 @@
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.utils.functional import cached_property
+
+from memberships.models import Subscription, UserMembership
+
+SUBSCRIPTION_FIELDS = [field.attname for field in Subscription._meta.concrete_fields]
+
+
+def load_membership(user):
+    """
+    Return (user_membership, subscription) for the user in a single query:
+    the plan is joined in with select_related and the oldest subscription's
+    columns are read through the reverse join.
+    """
+    if not user.is_authenticated:
+        return None, None
+    user_membership = (UserMembership.objects.filter(user_id=user.pk).select_related('membership')
+                       .annotate(**{'subscription_' + name: F('subscription__' + name)
+                                    for name in SUBSCRIPTION_FIELDS})
+                       .order_by('pk', 'subscription__pk').first())
+    if user_membership is None:
+        return None, None
+    values = [getattr(user_membership, 'subscription_' + name) for name in SUBSCRIPTION_FIELDS]
+    subscription = None
+    if values[SUBSCRIPTION_FIELDS.index('id')] is not None:
+        subscription = Subscription.from_db(user_membership._state.db, SUBSCRIPTION_FIELDS, values)
+        subscription.user_membership = user_membership
+    return user_membership, subscription
+
+
+class RequestMembership:
+    """
+    The signed-in user's membership, plan and subscription, loaded together
+    the first time any of them is read and then reused for the request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _loaded(self):
+        return load_membership(self.user)
+
+    @property
+    def user_membership(self):
+        return self._loaded[0]
+
+    @property
+    def subscription(self):
+        return self._loaded[1]
+
+    @property
+    def plan(self):
+        user_membership = self.user_membership
+        return user_membership.membership if user_membership else None
+
+    def __bool__(self):
+        return self.user_membership is not None
+
+    async def aload(self):
+        """Load outside the event loop, so async views can use the attributes."""
+        if '_loaded' not in self.__dict__:
+            self._loaded = await sync_to_async(load_membership)(self.user)
+        return self
+
+    def reload(self):
+        self.__dict__.pop('_loaded', None)
+
+
+class MembershipMiddleware:
+    """
+    Give every request a lazy request.membership. Nothing is queried until a
+    view or template reads it, and then only once. Must come after
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.membership = RequestMembership(request.user)
+        return self.get_response(request)
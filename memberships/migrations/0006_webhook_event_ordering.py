@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memberships', '0005_stripeevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripeevent',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='event_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
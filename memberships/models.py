@@ -2,12 +2,24 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.conf import settings
-import stripe
-from datetime import datetime
+from Coursera import background
+from datetime import datetime, timezone as dt_timezone
+from django.utils import timezone
 
-# Only set Stripe API key if it's configured
-if hasattr(settings, 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY:
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+
+def get_stripe():
+    """
+    Import and configure the Stripe client on first use. The package takes a
+    large share of startup time, and most requests never touch it.
+    """
+    import stripe
+    # Only set Stripe API key if it's configured
+    if hasattr(settings, 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY:
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+    # Point the client at a local stand-in such as stripe-mock
+    if getattr(settings, 'STRIPE_API_BASE', ''):
+        stripe.api_base = settings.STRIPE_API_BASE
+    return stripe
 
 
 # Create your models here.
@@ -35,53 +47,123 @@ class UserMembership(models.Model):
     def __str__(self):
         return self.user.username
 
-def post_save_create_user_membership(sender, instance, created, *args, **kwargs):
-    user_membership, created_membership = UserMembership.objects.get_or_create(user=instance)
-    if user_membership.stripe_customer_id is None or user_membership.stripe_customer_id == '':
-        try:
-            if instance.email and hasattr(settings, 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY:
-                new_customer_id = stripe.Customer.create(email=instance.email)
-                user_membership.stripe_customer_id = new_customer_id['id']
-                user_membership.save()
-            else:
-                # Create a placeholder customer ID if Stripe is not configured
-                user_membership.stripe_customer_id = f'temp_{instance.id}_{instance.username}'
-                user_membership.save()
-        except Exception as e:
-            # If Stripe fails, create a placeholder customer ID
-            # This allows the user to be created even if Stripe is not configured
-            user_membership.stripe_customer_id = f'temp_{instance.id}_{instance.username}'
-            user_membership.save()
+def placeholder_customer_id(user):
+    return f'temp_{user.id}_{user.username}'[:40]
+
+
+def provision_stripe_customer(user_membership_id):
+    """
+    Replace a placeholder customer id with a real Stripe customer. Safe to
+    retry: the idempotency key stops Stripe creating duplicates, and the
+    conditional update leaves an id that was already upgraded alone.
+    """
+    if not stripe_enabled():
+        return None
+    user_membership = UserMembership.objects.select_related('user').filter(pk=user_membership_id).first()
+    if not user_membership or not user_membership.user.email:
+        return None
+    placeholder = user_membership.stripe_customer_id
+    if placeholder and not placeholder.startswith('temp_'):
+        return placeholder
+    customer = get_stripe().Customer.create(email=user_membership.user.email,
+                                            idempotency_key='customer-user-{}'.format(user_membership.user_id))
+    UserMembership.objects.filter(pk=user_membership.pk, stripe_customer_id=placeholder).update(
+        stripe_customer_id=customer['id'])
+    return customer['id']
+
+
+def post_save_create_user_membership(sender, instance, created, update_fields=None, *args, **kwargs):
+    # Logins only touch last_login
+    if not created and update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    user_membership, created_membership = UserMembership.objects.get_or_create(
+        user=instance, defaults={'stripe_customer_id': placeholder_customer_id(instance)})
+    if not user_membership.stripe_customer_id:
+        user_membership.stripe_customer_id = placeholder_customer_id(instance)
+        user_membership.save(update_fields=['stripe_customer_id'])
+    # The Stripe customer is created after commit so signup never waits on Stripe
+    if user_membership.stripe_customer_id.startswith('temp_') and instance.email and stripe_enabled():
+        background.defer(provision_stripe_customer, user_membership.pk)
 
 # Connect the signal
 post_save.connect(post_save_create_user_membership, sender=User)
 
+def stripe_enabled():
+    return bool(getattr(settings, 'STRIPE_SECRET_KEY', ''))
+
+# Stripe statuses that still grant the subscribed membership
+ACTIVE_SUBSCRIPTION_STATUSES = ('active', 'trialing', 'past_due')
+
+
+def stripe_timestamp(value):
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+
 class Subscription(models.Model):
     user_membership = models.ForeignKey(UserMembership,on_delete=models.CASCADE)
     stripe_subscription_id = models.CharField(max_length=40)
     active = models.BooleanField(default=False)
+    # Local mirror of the Stripe subscription, so pages never wait on Stripe
+    status = models.CharField(max_length=20, blank=True, default='')
+    created = models.DateTimeField(null=True, blank=True)
+    current_period_end = models.DateTimeField(null=True, blank=True)
+    synced_time = models.DateTimeField(null=True, blank=True)
+    # Creation time of the last webhook event applied, so late events can't roll it back
+    event_time = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.user_membership.user.username
 
+    @property
+    def is_stripe_backed(self):
+        return stripe_enabled() and not self.stripe_subscription_id.startswith('temp_')
+
+    def apply_stripe_subscription(self, stripe_subscription):
+        self.status = stripe_subscription.status
+        self.active = self.status in ACTIVE_SUBSCRIPTION_STATUSES
+        self.created = stripe_timestamp(stripe_subscription.created)
+        self.current_period_end = stripe_timestamp(stripe_subscription.current_period_end)
+        self.synced_time = timezone.now()
+
+    def refresh_from_stripe(self):
+        if not self.is_stripe_backed:
+            return False
+        self.apply_stripe_subscription(get_stripe().Subscription.retrieve(self.stripe_subscription_id))
+        self.save(update_fields=['status', 'active', 'created', 'current_period_end', 'synced_time'])
+        return True
+
     @property
     def get_created_date(self):
-        try:
-            if hasattr(settings, 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY and not self.stripe_subscription_id.startswith('temp_'):
-                subscription = stripe.Subscription.retrieve(
-                    self.stripe_subscription_id)
-                return datetime.fromtimestamp(subscription.created)
-        except Exception:
-            pass
-        return None
+        return self.created
 
     @property
     def get_next_billing_date(self):
-        try:
-            if hasattr(settings, 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY and not self.stripe_subscription_id.startswith('temp_'):
-                subscription = stripe.Subscription.retrieve(
-                    self.stripe_subscription_id)
-                return datetime.fromtimestamp(subscription.current_period_end)
-        except Exception:
-            pass
-        return None
+        return self.current_period_end
+
+
+def sync_subscription(subscription_id):
+    subscription = Subscription.objects.filter(pk=subscription_id).first()
+    if subscription:
+        subscription.refresh_from_stripe()
+
+
+class StripeEvent(models.Model):
+    """Append-only log of verified Stripe webhook events, deduplicated by event id."""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_time = models.DateTimeField(auto_now_add=True)
+    processed_time = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    # Failed events stay pending until webhooks.MAX_ATTEMPTS tries have been used up
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_time', 'received_time'], name='stripe_event_pending_idx'),
+        ]
+
+    def __str__(self):
+        return '{} ({})'.format(self.event_id, self.type)
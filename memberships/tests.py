@@ -1,3 +1,297 @@
-from django.test import TestCase
+import io
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from memberships.async_views import AsyncCancelSubscription, AsyncPaymentView
+from memberships.middleware import RequestMembership
+from memberships.models import Membership, StripeEvent, Subscription, UserMembership
+from memberships.webhooks import MAX_ATTEMPTS, process_pending_events, retry_failed_events
+
+
+def fake_stripe_subscription(**fields):
+    values = {'id': 'sub_123', 'object': 'subscription', 'status': 'active',
+              'created': 1700000000, 'current_period_end': 1702592000}
+    values.update(fields)
+    return stripe.Subscription.construct_from(values, 'sk_test_local')
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_local')
+class SubscriptionMirrorTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('student', '', 'password')
+        self.subscription = Subscription.objects.create(
+            user_membership=UserMembership.objects.get(user=user), stripe_subscription_id='sub_123', active=True)
+
+    @mock.patch('stripe.Subscription.retrieve')
+    def test_dates_are_read_from_local_columns(self, retrieve):
+        retrieve.return_value = fake_stripe_subscription()
+        self.subscription.refresh_from_stripe()
+        retrieve.reset_mock()
+
+        subscription = Subscription.objects.get(pk=self.subscription.pk)
+        self.assertEqual(subscription.get_created_date.timestamp(), 1700000000)
+        self.assertEqual(subscription.get_next_billing_date.timestamp(), 1702592000)
+        retrieve.assert_not_called()
+
+    @mock.patch('stripe.Subscription.retrieve')
+    def test_refresh_tracks_cancellation(self, retrieve):
+        retrieve.return_value = fake_stripe_subscription(status='canceled')
+        self.subscription.refresh_from_stripe()
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'canceled')
+        self.assertFalse(self.subscription.active)
+
+    @mock.patch('stripe.Subscription.retrieve')
+    def test_temporary_subscriptions_never_call_stripe(self, retrieve):
+        self.subscription.stripe_subscription_id = 'temp_sub_1_Professional'
+        self.assertFalse(self.subscription.refresh_from_stripe())
+        retrieve.assert_not_called()
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_local', BACKGROUND_TASKS_EAGER=True)
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        self.free = Membership.objects.create(slug='free', membership_type='Bepul', stripe_plan_id='plan_free')
+        self.pro = Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+        user = User.objects.create_user('student', '', 'password')
+        self.user_membership = UserMembership.objects.get(user=user)
+        self.user_membership.membership = self.pro
+        self.user_membership.save()
+        self.subscription = Subscription.objects.create(
+            user_membership=self.user_membership, stripe_subscription_id='sub_123', active=True)
+
+    def post_event(self, event_id, event_type, status, created=1700000000, secret='whsec_local'):
+        payload = json.dumps({
+            'id': event_id, 'type': event_type, 'created': created,
+            'data': {'object': {'id': 'sub_123', 'status': status, 'created': 1700000000,
+                                'current_period_end': 1702592000,
+                                'items': {'data': [{'price': {'id': 'plan_pro'}}]}}},
+        })
+        timestamp = int(time.time())
+        signature = stripe.WebhookSignature._compute_signature('{}.{}'.format(timestamp, payload), secret)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('memberships:stripe_webhook'), payload, content_type='application/json',
+                                    HTTP_STRIPE_SIGNATURE='t={},v1={}'.format(timestamp, signature))
+
+    def test_bad_signature_is_rejected(self):
+        response = self.post_event('evt_1', 'customer.subscription.updated', 'active', secret='whsec_other')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_events_are_deduplicated_and_applied(self):
+        self.assertEqual(self.post_event('evt_1', 'customer.subscription.updated', 'past_due').status_code, 200)
+        self.assertEqual(self.post_event('evt_1', 'customer.subscription.updated', 'past_due').status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.subscription.refresh_from_db()
+        self.assertEqual((self.subscription.status, self.subscription.active), ('past_due', True))
+
+        self.post_event('evt_2', 'customer.subscription.deleted', 'canceled', created=1700000100)
+        self.subscription.refresh_from_db()
+        self.user_membership.refresh_from_db()
+        self.assertFalse(self.subscription.active)
+        self.assertEqual(self.user_membership.membership, self.free)
+        self.assertFalse(StripeEvent.objects.filter(processed_time__isnull=True).exists())
+
+    def test_batch_keeps_latest_event_per_subscription(self):
+        StripeEvent.objects.bulk_create([
+            StripeEvent(event_id='evt_new', type='customer.subscription.updated',
+                        payload={'created': 2, 'data': {'object': {'id': 'sub_123', 'status': 'active'}}}),
+            StripeEvent(event_id='evt_old', type='customer.subscription.updated',
+                        payload={'created': 1, 'data': {'object': {'id': 'sub_123', 'status': 'unpaid'}}}),
+        ])
+        self.assertEqual(process_pending_events(), 2)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'active')
+
+    def test_older_event_in_a_later_batch_is_ignored(self):
+        self.post_event('evt_2', 'customer.subscription.deleted', 'canceled', created=1700000100)
+        self.post_event('evt_1', 'customer.subscription.updated', 'active', created=1700000000)
+        # Same second as the cancellation: the cancellation still wins
+        self.post_event('evt_3', 'customer.subscription.updated', 'active', created=1700000100)
+        self.subscription.refresh_from_db()
+        self.user_membership.refresh_from_db()
+        self.assertEqual((self.subscription.status, self.subscription.active), ('canceled', False))
+        self.assertEqual(self.user_membership.membership, self.free)
+
+        self.post_event('evt_4', 'customer.subscription.updated', 'active', created=1700000200)
+        self.subscription.refresh_from_db()
+        self.assertTrue(self.subscription.active)
+
+    def test_failed_events_stay_pending_until_attempts_run_out(self):
+        StripeEvent.objects.create(event_id='evt_bad', type='customer.subscription.updated', payload={'created': 1})
+        StripeEvent.objects.create(event_id='evt_good', type='customer.subscription.updated',
+                                   payload={'created': 1, 'data': {'object': {'id': 'sub_123', 'status': 'unpaid'}}})
+        self.assertEqual(process_pending_events(), 1)
+        bad = StripeEvent.objects.get(event_id='evt_bad')
+        self.assertIsNone(bad.processed_time)
+        self.assertEqual(bad.attempts, 1)
+        self.assertTrue(bad.error)
+        self.assertIsNotNone(StripeEvent.objects.get(event_id='evt_good').processed_time)
+
+        for attempt in range(MAX_ATTEMPTS):
+            process_pending_events()
+        self.assertEqual(StripeEvent.objects.get(event_id='evt_bad').attempts, MAX_ATTEMPTS)
+        self.assertEqual(retry_failed_events(), 1)
+        self.assertEqual(StripeEvent.objects.get(event_id='evt_bad').attempts, 0)
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_local', BACKGROUND_TASKS_EAGER=True)
+class CustomerProvisioningTests(TestCase):
+    @mock.patch('stripe.Customer.create')
+    def test_signup_creates_customer_after_commit(self, create):
+        create.return_value = {'id': 'cus_123'}
+        with self.captureOnCommitCallbacks() as callbacks:
+            user = User.objects.create_user('student', 'student@example.com', 'password')
+            self.assertTrue(UserMembership.objects.get(user=user).stripe_customer_id.startswith('temp_'))
+        create.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(UserMembership.objects.get(user=user).stripe_customer_id, 'cus_123')
+
+    @mock.patch('stripe.Customer.create')
+    def test_failed_provisioning_keeps_placeholder_and_can_retry(self, create):
+        create.side_effect = stripe.error.APIConnectionError('offline')
+        with self.assertLogs('Coursera.background', 'ERROR') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user('student', 'student@example.com', 'password')
+        self.assertIn('Background job provision_stripe_customer failed', logs.output[0])
+        user_membership = UserMembership.objects.get(user=user)
+        self.assertTrue(user_membership.stripe_customer_id.startswith('temp_'))
+
+        create.side_effect = None
+        create.return_value = {'id': 'cus_456'}
+        call_command('provision_stripe_customers', stdout=io.StringIO())
+        user_membership.refresh_from_db()
+        self.assertEqual(user_membership.stripe_customer_id, 'cus_456')
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_local')
+class AsyncPaymentViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', '', 'password')
+        self.pro = Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+        self.free = Membership.objects.create(slug='free', membership_type='Bepul', stripe_plan_id='plan_free')
+        self.user_membership = UserMembership.objects.get(user=self.user)
+        self.user_membership.stripe_customer_id = 'cus_123'
+        self.user_membership.save()
+
+    def make_request(self, method, path, data=None):
+        request = getattr(AsyncRequestFactory(), method)(path, data or {})
+        request.user = self.user
+        request.membership = RequestMembership(self.user)
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        return request
+
+    @mock.patch('memberships.async_views.charge_subscription', return_value='sub_999')
+    async def test_payment_charges_customer_off_the_event_loop(self, charge):
+        request = self.make_request('post', '/payments/', {'stripeToken': 'tok_visa'})
+        request.session['selected_membership_type'] = 'Professional'
+        response = await AsyncPaymentView(request)
+        charge.assert_called_once_with('cus_123', 'tok_visa', 'plan_pro')
+        self.assertEqual(response.url, reverse('memberships:update_transaction', args=['sub_999']))
+
+    async def test_payment_without_selection_redirects(self):
+        response = await AsyncPaymentView(self.make_request('get', '/payments/'))
+        self.assertEqual(response.url, reverse('memberships:select_membership'))
+
+    @mock.patch('memberships.async_views.cancel_stripe_subscription')
+    async def test_cancel_downgrades_to_free(self, cancel):
+        await Subscription.objects.acreate(user_membership=self.user_membership, stripe_subscription_id='sub_123',
+                                           active=True)
+        response = await AsyncCancelSubscription(self.make_request('get', '/cancel/'))
+        cancel.assert_called_once_with('sub_123')
+        self.assertEqual(response.url, reverse('memberships:select_membership'))
+        subscription = await Subscription.objects.aget(stripe_subscription_id='sub_123')
+        self.assertFalse(subscription.active)
+        user_membership = await UserMembership.objects.aget(pk=self.user_membership.pk)
+        self.assertEqual(user_membership.membership_id, self.free.pk)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class SessionStorageTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('student', '', 'password')
+        Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+
+    def assert_checkout_skips_session_table(self):
+        self.client.login(username='student', password='password')
+        response = self.client.post(reverse('memberships:select_membership'), {'membership_type': 'Professional'})
+        self.assertEqual(response.url, reverse('memberships:payment'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('memberships:payment'))
+        self.assertContains(response, 'Professional')
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
+
+    # Without CACHE_URL sessions default to the database; the test run is one process
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_cached_db_sessions_are_read_from_cache(self):
+        self.assert_checkout_skips_session_table()
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        self.assert_checkout_skips_session_table()
+
+
+class RequestMembershipTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', '', 'password')
+        self.pro = Membership.objects.create(slug='pro', membership_type='Professional', stripe_plan_id='plan_pro')
+        self.user_membership = UserMembership.objects.get(user=self.user)
+        self.user_membership.membership = self.pro
+        self.user_membership.save()
+
+    def test_membership_plan_and_subscription_load_in_one_query(self):
+        Subscription.objects.create(user_membership=self.user_membership, stripe_subscription_id='sub_1', active=True)
+        Subscription.objects.create(user_membership=self.user_membership, stripe_subscription_id='sub_2')
+        membership = RequestMembership(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(1):
+            self.assertEqual(membership.user_membership, self.user_membership)
+            self.assertEqual(membership.plan, self.pro)
+            self.assertEqual(membership.subscription.stripe_subscription_id, 'sub_1')
+            self.assertTrue(membership.subscription.active)
+            self.assertEqual(membership.subscription.user_membership, self.user_membership)
+            self.assertTrue(membership)
+
+    def test_missing_subscription(self):
+        membership = RequestMembership(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(membership.plan, self.pro)
+            self.assertIsNone(membership.subscription)
+
+    def test_anonymous_user_needs_no_query(self):
+        membership = RequestMembership(AnonymousUser())
+        with self.assertNumQueries(0):
+            self.assertFalse(membership)
+            self.assertIsNone(membership.plan)
+
+    def test_reload_after_a_write(self):
+        membership = RequestMembership(self.user)
+        self.assertIsNone(membership.subscription)
+        Subscription.objects.create(user_membership=self.user_membership, stripe_subscription_id='sub_1')
+        membership.reload()
+        self.assertEqual(membership.subscription.stripe_subscription_id, 'sub_1')
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_views_share_one_membership_query(self):
+        Subscription.objects.create(user_membership=self.user_membership, stripe_subscription_id='sub_1', active=True)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.context['user_subscription'].stripe_subscription_id, 'sub_1')
+        membership_queries = [query for query in queries
+                              if 'memberships_usermembership' in query['sql'] or
+                              'memberships_subscription' in query['sql']]
+        self.assertEqual(len(membership_queries), 1)
@@ -1,13 +1,19 @@
+from django.conf import settings
 from django.urls import path
 
-from memberships.views import MembershipSelectView,PaymentView,UpdateTransactionRecords,CancelSubscription
+from memberships.views import MembershipSelectView,PaymentView,UpdateTransactionRecords,CancelSubscription,StripeWebhook
 
 app_name = 'memberships'
 
+if settings.ASYNC_VIEWS:
+    from memberships.async_views import AsyncCancelSubscription, AsyncPaymentView
+    PaymentView, CancelSubscription = AsyncPaymentView, AsyncCancelSubscription
+
 urlpatterns = [
     path('memberships/', MembershipSelectView.as_view(), name='select_membership'),
     path('payments/', PaymentView, name='payment'),
     path('update_transaction/<subscription_id>/update/', UpdateTransactionRecords, name='update_transaction'),
-    path('cancel/', CancelSubscription, name='cancel')
+    path('cancel/', CancelSubscription, name='cancel'),
+    path('stripe/webhook/', StripeWebhook, name='stripe_webhook'),
 
 ]
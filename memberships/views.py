@@ -1,30 +1,24 @@
 from django.shortcuts import render,redirect,get_object_or_404
 from django.views.generic import TemplateView,ListView,DetailView,View
-from memberships.models import Membership,UserMembership,Subscription
+from memberships.models import (Membership,UserMembership,Subscription,get_stripe,provision_stripe_customer,
+                                stripe_enabled,sync_subscription)
+from memberships.webhooks import InvalidWebhook, process_pending_events, record_event, verify_event
+from Coursera import background
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.urls import reverse
-import stripe
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.mail import send_mail
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your views here.
-def get_user_membership(request):
-    user_membership_qs = UserMembership.objects.filter(user=request.user)
-    if user_membership_qs.exists():
-        return user_membership_qs.first()
-    return None
-
-def get_user_subscription(request):
-    user_subscription_qs = Subscription.objects.filter(user_membership = get_user_membership(request))
-    if user_subscription_qs.exists():
-        user_subscription = user_subscription_qs.first()
-        return user_subscription
-    return None
-
+# The user's membership and subscription come from request.membership
+# (memberships.middleware), loaded once per request.
 def get_selected_membership(request):
     membership_type =  request.session['selected_membership_type']
     selected_membership_qs = Membership.objects.filter(membership_type=membership_type)
@@ -32,6 +26,37 @@ def get_selected_membership(request):
         return selected_membership_qs.first()
     return None
 
+def charge_subscription(customer_id, token, plan_id):
+    """Attach the card token to the Stripe customer and start the plan. Returns the subscription id."""
+    stripe = get_stripe()
+    customer = stripe.Customer.retrieve(customer_id)
+    customer.source = token
+    customer.save()
+
+    subscription = stripe.Subscription.create(
+        customer=customer_id,
+        items=[
+            { "plan": plan_id },
+        ]
+    )
+    return subscription.id
+
+def cancel_stripe_subscription(subscription_id):
+    sub = get_stripe().Subscription.retrieve(subscription_id)
+    sub.delete()
+
+def send_cancellation_email(user_email):
+    try:
+        send_mail(
+            'Subscription successfully cancelled',
+            'Your subscription has been successfully cancelled. Thank you for using our service.',
+            'support@courseraclone.com',
+            [user_email],
+            fail_silently=True,
+        )
+    except Exception:
+        pass  # Email sending is optional
+
 class MembershipSelectView(LoginRequiredMixin, ListView):
     template_name = 'memberships/membership_list.html'
     context_object_name = 'memberships'
@@ -40,7 +65,7 @@ class MembershipSelectView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        current_membership = get_user_membership(self.request)
+        current_membership = self.request.membership.user_membership
         if current_membership:
             context['current_membership'] = str(current_membership.membership)
         else:
@@ -50,8 +75,8 @@ class MembershipSelectView(LoginRequiredMixin, ListView):
     def post(self,request,*args,**kwargs):
         selected_membership_type = request.POST.get('membership_type')
 
-        user_membership = get_user_membership(self.request)
-        user_subscription = get_user_subscription(self.request)
+        user_membership = request.membership.user_membership
+        user_subscription = request.membership.subscription
 
         selected_membership_qs = Membership.objects.filter(membership_type=selected_membership_type)
         if selected_membership_qs.exists():
@@ -72,7 +97,7 @@ class MembershipSelectView(LoginRequiredMixin, ListView):
 
 @login_required
 def PaymentView(request):
-    user_membership = get_user_membership(request)
+    user_membership = request.membership.user_membership
     if not user_membership:
         messages.error(request, 'Please create a membership first.')
         return redirect(reverse("memberships:select_membership"))
@@ -85,19 +110,15 @@ def PaymentView(request):
         try:
             token = request.POST['stripeToken']
 
+            # The customer may still be queued from signup; payment needs it now
+            if stripe_enabled() and user_membership.stripe_customer_id.startswith('temp_'):
+                provision_stripe_customer(user_membership.pk)
+                user_membership.refresh_from_db(fields=['stripe_customer_id'])
+
             # Only process Stripe if properly configured
             if hasattr(settings, 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY and not user_membership.stripe_customer_id.startswith('temp_'):
-                customer = stripe.Customer.retrieve(user_membership.stripe_customer_id)
-                customer.source = token 
-                customer.save()
-
-                subscription = stripe.Subscription.create(
-                    customer=user_membership.stripe_customer_id,
-                    items=[
-                        { "plan": selected_membership.stripe_plan_id },
-                    ]
-                )
-                subscription_id = subscription.id
+                subscription_id = charge_subscription(user_membership.stripe_customer_id, token,
+                                                      selected_membership.stripe_plan_id)
             else:
                 # Create a temporary subscription ID for testing
                 subscription_id = f'temp_sub_{request.user.id}_{selected_membership.membership_type}'
@@ -120,7 +141,7 @@ def PaymentView(request):
 
 @login_required
 def UpdateTransactionRecords(request, subscription_id):
-    user_membership = get_user_membership(request)
+    user_membership = request.membership.user_membership
     selected_membership = get_selected_membership(request)
     user_membership.membership = selected_membership
     user_membership.save()
@@ -129,7 +150,14 @@ def UpdateTransactionRecords(request, subscription_id):
         user_membership=user_membership)
     sub.stripe_subscription_id = subscription_id
     sub.active = True
+    sub.status = 'active'
+    sub.created = timezone.now()
+    sub.current_period_end = None
     sub.save()
+    request.membership.reload()
+    # Pull the authoritative dates from Stripe without holding up the redirect
+    if sub.is_stripe_backed:
+        background.defer(sync_subscription, sub.pk)
 
     try:
         del request.session['selected_membership_type']
@@ -142,7 +170,7 @@ def UpdateTransactionRecords(request, subscription_id):
 
 @login_required
 def CancelSubscription(request):
-    user_sub = get_user_subscription(request)
+    user_sub = request.membership.subscription
 
     if not user_sub or user_sub.active is False:
         messages.info(request, "You don't have an active membership")
@@ -151,12 +179,12 @@ def CancelSubscription(request):
     # Only cancel Stripe subscription if it's a real one
     if hasattr(settings, 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY and not user_sub.stripe_subscription_id.startswith('temp_'):
         try:
-            sub = stripe.Subscription.retrieve(user_sub.stripe_subscription_id)
-            sub.delete()
+            cancel_stripe_subscription(user_sub.stripe_subscription_id)
         except Exception as e:
             messages.warning(request, f'Stripe subscription cancellation failed: {str(e)}')
 
     user_sub.active = False
+    user_sub.status = 'canceled'
     user_sub.save()
 
     try:
@@ -167,7 +195,7 @@ def CancelSubscription(request):
             messages.error(request, 'Free membership not found. Please contact support.')
             return redirect(reverse('memberships:select_membership'))
     
-    user_membership = get_user_membership(request)
+    user_membership = request.membership.user_membership
     if user_membership:
         user_membership.membership = free_membership
         user_membership.save()
@@ -178,15 +206,19 @@ def CancelSubscription(request):
     messages.info(
         request, "Subscription successfully cancelled. We have sent you an email notification")
     # sending an email here
-    try:
-        send_mail(
-            'Subscription successfully cancelled',
-            'Your subscription has been successfully cancelled. Thank you for using our service.',
-            'support@courseraclone.com',
-            [user_email],
-            fail_silently=True,
-        )
-    except Exception:
-        pass  # Email sending is optional
+    send_cancellation_email(user_email)
     
     return redirect(reverse('memberships:select_membership'))
+
+
+@csrf_exempt
+@require_POST
+def StripeWebhook(request):
+    try:
+        event = verify_event(request.body, request.META.get('HTTP_STRIPE_SIGNATURE'))
+    except InvalidWebhook as e:
+        return HttpResponseBadRequest(str(e))
+    # Acknowledge right away; events are applied in batches by the worker
+    if record_event(event):
+        background.defer(process_pending_events)
+    return HttpResponse(status=200)
@@ -0,0 +1,175 @@
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from memberships.models import (ACTIVE_SUBSCRIPTION_STATUSES, Membership, StripeEvent, Subscription, get_stripe,
+                                stripe_timestamp)
+
+SUBSCRIPTION_EVENTS = (
+    'customer.subscription.created',
+    'customer.subscription.updated',
+    'customer.subscription.deleted',
+)
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+
+
+class InvalidWebhook(Exception):
+    pass
+
+
+def verify_event(payload, signature):
+    """Check the Stripe-Signature header and return the decoded event."""
+    secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', '')
+    if not secret:
+        raise InvalidWebhook('STRIPE_WEBHOOK_SECRET is not configured.')
+    stripe = get_stripe()
+    try:
+        payload = payload.decode('utf-8')
+        stripe.WebhookSignature.verify_header(payload, signature or '', secret,
+                                              stripe.Webhook.DEFAULT_TOLERANCE)
+        event = json.loads(payload)
+    except (UnicodeDecodeError, ValueError, stripe.error.SignatureVerificationError) as e:
+        raise InvalidWebhook(str(e))
+    if not isinstance(event, dict) or 'id' not in event or 'type' not in event:
+        raise InvalidWebhook('Payload is not a Stripe event.')
+    return event
+
+
+def record_event(event):
+    """Append an event to the log. Redeliveries of a known event id are dropped."""
+    try:
+        with transaction.atomic():
+            StripeEvent.objects.create(event_id=event['id'], type=event['type'], payload=event)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _plan_id(stripe_subscription):
+    items = (stripe_subscription.get('items') or {}).get('data') or []
+    if not items:
+        return None
+    item = items[0]
+    return (item.get('price') or item.get('plan') or {}).get('id')
+
+
+def _free_membership():
+    return (Membership.objects.filter(membership_type='Bepul').first()
+            or Membership.objects.filter(membership_type='free').first())
+
+
+def _is_stale(subscription, event_type, event_time):
+    if subscription.event_time is None or event_time is None:
+        return False
+    if event_time == subscription.event_time:
+        # Stripe times are whole seconds; on a tie a cancellation wins
+        return subscription.status == 'canceled' and event_type != 'customer.subscription.deleted'
+    return event_time < subscription.event_time
+
+
+def apply_events(events):
+    """
+    Apply a batch of subscription events. Only the newest event per
+    subscription matters, so retries and bursts collapse to one write each.
+    Events older than the last one applied to a subscription, including
+    ones that arrive in a later batch, are ignored.
+    """
+    latest = {}
+    for event in sorted(events, key=lambda event: (event.payload.get('created') or 0,
+                                                   event.type == 'customer.subscription.deleted', event.pk)):
+        if event.type in SUBSCRIPTION_EVENTS:
+            stripe_subscription = event.payload['data']['object']
+            latest[stripe_subscription['id']] = (event.type, stripe_subscription,
+                                                 stripe_timestamp(event.payload.get('created')))
+    if not latest:
+        return
+
+    subscriptions = Subscription.objects.select_related('user_membership').filter(
+        stripe_subscription_id__in=latest)
+    plan_ids = {_plan_id(data) for event_type, data, event_time in latest.values()}
+    memberships = {membership.stripe_plan_id: membership
+                   for membership in Membership.objects.filter(stripe_plan_id__in=plan_ids)}
+    free_membership = None
+
+    changed_subscriptions = []
+    for subscription in subscriptions:
+        event_type, data, event_time = latest[subscription.stripe_subscription_id]
+        if _is_stale(subscription, event_type, event_time):
+            continue
+        subscription.status = 'canceled' if event_type == 'customer.subscription.deleted' else data.get('status', '')
+        subscription.active = subscription.status in ACTIVE_SUBSCRIPTION_STATUSES
+        subscription.created = stripe_timestamp(data.get('created'))
+        subscription.current_period_end = stripe_timestamp(data.get('current_period_end'))
+        subscription.synced_time = timezone.now()
+        subscription.event_time = event_time or subscription.event_time
+        changed_subscriptions.append(subscription)
+
+        if subscription.active:
+            membership = memberships.get(_plan_id(data))
+        else:
+            free_membership = free_membership or _free_membership()
+            membership = free_membership
+        user_membership = subscription.user_membership
+        if membership and user_membership.membership_id != membership.pk:
+            user_membership.membership = membership
+            # Saved one by one so post_save listeners (entitlements) see the change
+            user_membership.save(update_fields=['membership'])
+
+    Subscription.objects.bulk_update(
+        changed_subscriptions, ['status', 'active', 'created', 'current_period_end', 'synced_time', 'event_time'])
+
+
+def _apply_one_by_one(events):
+    # Isolates the event that broke a batch so the rest still apply
+    failed = []
+    for event in events:
+        try:
+            with transaction.atomic():
+                apply_events([event])
+        except Exception as e:
+            event.error = str(e)
+            failed.append(event)
+    return failed
+
+
+def process_pending_events(batch_size=BATCH_SIZE):
+    """
+    Apply pending events batch by batch. Returns the number of events applied.
+    An event that fails stays pending with its error and is retried by later
+    runs until it has been tried MAX_ATTEMPTS times; retry_failed_events()
+    makes it pending again after that.
+    """
+    handled = 0
+    failed_ids = set()
+    while True:
+        with transaction.atomic():
+            events = list(StripeEvent.objects.select_for_update(skip_locked=True)
+                          .filter(processed_time__isnull=True, attempts__lt=MAX_ATTEMPTS)
+                          .exclude(pk__in=failed_ids)
+                          .order_by('received_time', 'pk')[:batch_size])
+            if not events:
+                return handled
+            try:
+                with transaction.atomic():
+                    apply_events(events)
+                failed = []
+            except Exception:
+                failed = _apply_one_by_one(events)
+            now = timezone.now()
+            for event in events:
+                event.attempts += 1
+                if event in failed:
+                    failed_ids.add(event.pk)
+                else:
+                    event.processed_time = now
+                    event.error = ''
+            StripeEvent.objects.bulk_update(events, ['processed_time', 'error', 'attempts'])
+        handled += len(events) - len(failed)
+
+
+def retry_failed_events():
+    """Make events that used up their attempts pending again. Returns how many."""
+    return StripeEvent.objects.filter(processed_time__isnull=True, attempts__gte=MAX_ATTEMPTS).update(attempts=0)
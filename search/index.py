@@ -0,0 +1,161 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from blog.models import Post
+from courses.models import Category, Course, Lesson
+from search.models import SearchDocument
+
+MAX_TERMS = 8
+# Control characters mark matches in snippets, so highlighting survives HTML escaping
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+
+def course_document(course):
+    return {'title': course.title, 'body': course.description, 'url': course.get_absolute_url()}
+
+
+def lesson_document(lesson):
+    if lesson.course is None:
+        return None
+    return {'title': lesson.title, 'body': lesson.course.title, 'url': lesson.get_absolute_url()}
+
+
+def category_document(category):
+    return {'title': category.category, 'body': '', 'url': reverse('courses:category_course_list', args=[category.pk])}
+
+
+def post_document(post):
+    return {'title': post.title, 'body': post.text, 'url': post.get_absolute_url(),
+            'visible_from': post.created_date}
+
+
+# kind -> (queryset used for a full rebuild, document builder)
+SOURCES = {
+    'course': (lambda: Course.objects.all(), course_document),
+    'lesson': (lambda: Lesson.objects.select_related('course'), lesson_document),
+    'category': (lambda: Category.objects.all(), category_document),
+    'post': (lambda: Post.objects.all(), post_document),
+}
+
+
+def index_object(kind, obj):
+    document = SOURCES[kind][1](obj)
+    if document is None:
+        remove_object(kind, obj.pk)
+        return
+    document.setdefault('visible_from', None)
+    SearchDocument.objects.update_or_create(kind=kind, object_id=obj.pk, defaults=document)
+
+
+def index_many(kind, objects):
+    """Replace the documents of many objects at once, for bulk writes that skip the signals."""
+    build = SOURCES[kind][1]
+    objects = list(objects)
+    SearchDocument.objects.filter(kind=kind, object_id__in=[obj.pk for obj in objects]).delete()
+    documents = []
+    for obj in objects:
+        document = build(obj)
+        if document is not None:
+            documents.append(SearchDocument(kind=kind, object_id=obj.pk, **document))
+    SearchDocument.objects.bulk_create(documents)
+    return len(documents)
+
+
+def remove_object(kind, pk):
+    SearchDocument.objects.filter(kind=kind, object_id=pk).delete()
+
+
+def rebuild(batch_size=500):
+    """Replace every document from the source tables. Returns the number indexed."""
+    SearchDocument.objects.all().delete()
+    indexed = 0
+    for kind, (queryset, build) in SOURCES.items():
+        batch = []
+        for obj in queryset().iterator(chunk_size=batch_size):
+            document = build(obj)
+            if document is not None:
+                batch.append(SearchDocument(kind=kind, object_id=obj.pk, **document))
+        SearchDocument.objects.bulk_create(batch, batch_size=batch_size)
+        indexed += len(batch)
+    return indexed
+
+
+def parse_terms(query):
+    # Only word characters reach the match expression, so user input can't break its syntax
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class SearchResults:
+    """
+    Ranked matches for a list of terms, every term matched as a prefix.
+    Supports count() and slicing so it can be handed to a Paginator.
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.vendor = connection.vendor
+        self.now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    def _sqlite(self, select, tail=''):
+        match = ' '.join('"{}"*'.format(term) for term in self.terms)
+        sql = ('SELECT {} FROM search_fts JOIN search_searchdocument d ON d.id = search_fts.rowid '
+               'WHERE search_fts MATCH %s AND (d.visible_from IS NULL OR d.visible_from <= %s) {}')
+        return sql.format(select, tail), [match, self.now]
+
+    def _postgres(self, select, tail=''):
+        match = ' & '.join('{}:*'.format(term) for term in self.terms)
+        sql = ("SELECT {} FROM search_searchdocument d, to_tsquery('simple', %s) query "
+               'WHERE d.search_vector @@ query AND (d.visible_from IS NULL OR d.visible_from <= %s) {}')
+        return sql.format(select, tail), [match, self.now]
+
+    def _fallback(self):
+        documents = SearchDocument.objects.exclude(visible_from__gt=timezone.now())
+        for term in self.terms:
+            documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+        return documents.order_by('-updated_time', 'id')
+
+    def count(self):
+        if not self.terms:
+            return 0
+        if self.vendor == 'sqlite':
+            sql, params = self._sqlite('count(*)')
+        elif self.vendor == 'postgresql':
+            sql, params = self._postgres('count(*)')
+        else:
+            return self._fallback().count()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, bounds):
+        if not isinstance(bounds, slice):
+            raise TypeError('SearchResults only supports slicing.')
+        start, stop = bounds.start or 0, bounds.stop
+        if not self.terms or stop <= start:
+            return []
+        columns = 'd.id, d.kind, d.object_id, d.title, d.url, {} AS snippet'
+        tail = 'ORDER BY {} LIMIT %s OFFSET %s'
+        if self.vendor == 'sqlite':
+            snippet = "snippet(search_fts, 1, char(2), char(3), '…', 24)"
+            sql, params = self._sqlite(columns.format(snippet), tail.format('bm25(search_fts, 10.0, 1.0), d.id'))
+        elif self.vendor == 'postgresql':
+            snippet = ("ts_headline('simple', d.body, query, "
+                       "'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=30, MinWords=12')")
+            sql, params = self._postgres(columns.format(snippet),
+                                         tail.format('ts_rank(d.search_vector, query) DESC, d.id'))
+        else:
+            documents = list(self._fallback()[start:stop])
+            for document in documents:
+                document.snippet = document.body[:200]
+            return documents
+        return list(SearchDocument.objects.raw(sql, params + [stop - start, start]))
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet or '').replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
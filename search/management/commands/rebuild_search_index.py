@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from search import index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from courses, lessons, categories and blog posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = index.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Indexed {} documents.'.format(indexed)))
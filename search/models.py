@@ -0,0 +1,32 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """
+    One searchable row per course, lesson, category or post. The full-text
+    index over title and body is maintained by the database: an FTS5 table
+    on SQLite, a generated tsvector column with a GIN index on Postgres.
+    """
+    KIND_CHOICES = (
+        ('course', 'Course'),
+        ('lesson', 'Lesson'),
+        ('category', 'Category'),
+        ('post', 'Post'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=300)
+    # Scheduled blog posts stay out of results until they go live
+    visible_from = models.DateTimeField(null=True, blank=True)
+    updated_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_unique'),
+        ]
+
+    def __str__(self):
+        return '{}: {}'.format(self.kind, self.title)
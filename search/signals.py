@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from blog.models import Post
+from courses.models import Category, Course, Lesson
+from search import index
+
+KINDS = {Course: 'course', Lesson: 'lesson', Category: 'category', Post: 'post'}
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Post)
+def update_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index.index_object(KINDS[sender], instance)
+    if sender is Course and instance.title_or_slug_changed():
+        # Lesson documents carry the course title and slug
+        index.index_many('lesson', instance.lesson_set.select_related('course'))
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Post)
+def remove_document(sender, instance, **kwargs):
+    index.remove_object(KINDS[sender], instance.pk)
@@ -0,0 +1,11 @@
+from django import template
+
+from search.index import highlight as highlight_snippet
+
+register = template.Library()
+
+
+@register.filter
+def highlight(snippet):
+    """Render a search snippet with its matched terms wrapped in <mark>."""
+    return highlight_snippet(snippet)
@@ -0,0 +1,107 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from blog.models import Post
+from courses.models import Category, Course, Lesson
+from search.index import SearchResults, highlight, parse_terms
+from search.models import SearchDocument
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        self.category = Category.objects.create(category='programming')
+        self.course = Course.objects.create(creator=self.user, slug='django', title='Django for beginners',
+                                            category=self.category, description='Build web applications in Python',
+                                            duration='1 hafta')
+        self.lesson = Lesson.objects.create(course=self.course, slug='models', title='Database models', position=1)
+        Post.objects.create(author=self.user, title='Why Python', text='Python reads like plain English', image='')
+
+    def search(self, query):
+        results = SearchResults(parse_terms(query))
+        return results.count(), [(hit.kind, hit.title) for hit in results[0:20]]
+
+    def test_matches_every_source_by_prefix(self):
+        self.assertEqual(self.search('progr')[1], [('category', 'programming')])
+        self.assertEqual(self.search('databa')[1], [('lesson', 'Database models')])
+        count, hits = self.search('python')
+        self.assertEqual(count, 2)
+        self.assertEqual({kind for kind, title in hits}, {'course', 'post'})
+
+    def test_title_matches_rank_above_body_matches(self):
+        Post.objects.create(author=self.user, title='Django tips', text='Small things', image='')
+        Post.objects.create(author=self.user, title='Release notes', text='Django 4.2 is out', image='')
+        titles = [title for kind, title in self.search('django')[1]]
+        self.assertEqual(titles[-1], 'Release notes')
+
+    def test_index_follows_saves_and_deletes(self):
+        self.course.title = 'Flask for beginners'
+        self.course.save()
+        # The lesson is found through its course title too, course first
+        self.assertEqual(self.search('flask')[1], [('course', 'Flask for beginners'), ('lesson', 'Database models')])
+
+        self.lesson.delete()
+        self.assertEqual(self.search('database')[0], 0)
+
+    def test_course_save_reindexes_lessons_only_when_title_or_slug_change(self):
+        Lesson.objects.create(course=self.course, slug='views', title='Views', position=2)
+        course = Course.objects.get(pk=self.course.pk)
+        course.description = 'Build web applications with Django'
+        with CaptureQueriesContext(connection) as queries:
+            course.save()
+        self.assertFalse([query for query in queries if "'lesson'" in query['sql'] or 'courses_lesson' in query['sql']])
+
+        course.slug = 'django-basics'
+        with CaptureQueriesContext(connection) as queries:
+            course.save()
+        # One read of the lessons, then their documents are replaced in bulk
+        self.assertEqual(len([query for query in queries if "'lesson'" in query['sql'] or
+                              'courses_lesson' in query['sql']]), 3)
+        self.assertEqual(SearchDocument.objects.get(kind='lesson', object_id=self.lesson.pk).url,
+                         '/courses/django-basics/models/')
+
+    def test_scheduled_posts_are_hidden_until_published(self):
+        Post.objects.create(author=self.user, title='Upcoming', text='Soon',
+                            created_date=timezone.now() + timedelta(days=1), image='')
+        self.assertEqual(self.search('upcoming')[0], 0)
+
+    def test_query_syntax_is_not_passed_through(self):
+        self.assertEqual(self.search('"python" OR NEAR( *')[0], 0)
+        self.assertEqual(self.search('***')[0], 0)
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        self.assertEqual(highlight('<b>\x02py\x03</b>'), '&lt;b&gt;<mark>py</mark>&lt;/b&gt;')
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 4)
+        self.assertEqual(self.search('python')[0], 2)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class SearchViewTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        for i in range(25):
+            Post.objects.create(author=user, title='Python {}'.format(i), text='About python', image='')
+
+    def test_results_are_paginated(self):
+        response = self.client.get('/search/', {'q': 'python'})
+        self.assertEqual(response.context['paginator'].count, 25)
+        self.assertEqual(len(response.context['results']), 20)
+        self.assertContains(response, '<mark>python</mark>')
+        response = self.client.get('/search/', {'q': 'python', 'page': 2})
+        self.assertEqual(len(response.context['results']), 5)
+
+    def test_empty_query_runs_no_search(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/search/')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,17 @@
+from django.views.generic import ListView
+
+from search.index import SearchResults, parse_terms
+
+
+class SearchView(ListView):
+    context_object_name = 'results'
+    template_name = 'search/search_results.html'
+    paginate_by = 20
+
+    def get_queryset(self):
+        return SearchResults(parse_terms(self.request.GET.get('q', '')))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from PIL import Image
+from Coursera import background
+from users.tasks import resize_profile_pic
 # Create your models here.
 
 class Profile(models.Model):
@@ -12,17 +13,21 @@ class Profile(models.Model):
     def __str__(self):
         return self.user.username + ' Profile'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_profile_pic = instance.__dict__.get('profile_pic')
+        return instance
+
+    def profile_pic_changed(self):
+        saved = getattr(self, '_saved_profile_pic', None)
+        return self.profile_pic.name != getattr(saved, 'name', saved)
+
     def save(self, *args, **kwargs):
+        changed = self.profile_pic_changed()
         super().save(*args, **kwargs)
+        self._saved_profile_pic = self.profile_pic.name
 
-        # Only process image if profile_pic exists and is not the default
-        if self.profile_pic and self.profile_pic.name != 'default.jpg':
-            try:
-                img = Image.open(self.profile_pic.path)
-                if img.height > 100 or img.width > 100:
-                    output_size = (200, 200)
-                    img.thumbnail(output_size)
-                    img.save(self.profile_pic.path)
-            except Exception as e:
-                # If image processing fails, continue anyway
-                pass
+        # Only resize a newly uploaded picture, and do it off the request path
+        if changed and self.profile_pic and self.profile_pic.name != 'default.jpg':
+            background.defer(resize_profile_pic, self.profile_pic.name)
@@ -9,7 +9,10 @@ def create_profile(sender,instance,created,**kwargs):
         Profile.objects.create(user=instance)
 
 @receiver(post_save,sender=User)
-def save_profile(sender,instance,**kwargs):
+def save_profile(sender,instance,update_fields=None,**kwargs):
+    # Logins only touch last_login; there is nothing to propagate to the profile
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
     # Only save if profile exists to avoid errors
     if hasattr(instance, 'profile'):
         try:
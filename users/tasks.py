@@ -0,0 +1,17 @@
+from django.core.files.storage import default_storage
+
+PROFILE_PIC_SIZE = (200, 200)
+
+
+def resize_profile_pic(name):
+    from PIL import Image
+
+    with default_storage.open(name, 'rb') as original:
+        img = Image.open(original)
+        img.load()
+    # Already resized (or small enough) pictures are left untouched
+    if img.height <= PROFILE_PIC_SIZE[1] and img.width <= PROFILE_PIC_SIZE[0]:
+        return
+    image_format = img.format
+    img.thumbnail(PROFILE_PIC_SIZE)
+    img.save(default_storage.path(name), format=image_format)
@@ -0,0 +1,46 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from users.models import Profile
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('student', 'student@example.com', 'password')
+
+    def upload(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600)).save(buffer, 'JPEG')
+        return SimpleUploadedFile('me.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_new_picture_is_resized_after_commit(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.profile_pic = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        with Image.open(profile.profile_pic.path) as img:
+            self.assertEqual(img.size, (200, 150))
+
+    def test_unchanged_picture_is_not_reprocessed(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.profile_pic = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+
+        with mock.patch('users.models.background.defer') as defer:
+            Profile.objects.get(pk=profile.pk).save()
+            self.client.login(username='student', password='password')
+        defer.assert_not_called()
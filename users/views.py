@@ -4,27 +4,12 @@ from users.forms import profileUpdateForm, userUpdateForm
 from users.models import Profile
 from django.contrib.auth.models import User
 from django.contrib import messages
-from memberships.models import Membership, UserMembership, Subscription
-
-
-def get_user_membership(request):
-    user_membership_qs = UserMembership.objects.filter(user=request.user)
-    if user_membership_qs.exists():
-        return user_membership_qs.first()
-    return None
-
-def get_user_subscription(request):
-    user_subscription_qs = Subscription.objects.filter(user_membership = get_user_membership(request))
-    if user_subscription_qs.exists():
-        user_subscription = user_subscription_qs.first()
-        return user_subscription
-    return None
 
 
 @login_required
 def profile_view(request):
-    user_membership = get_user_membership(request)
-    user_subscription = get_user_subscription(request)
+    user_membership = request.membership.user_membership
+    user_subscription = request.membership.subscription
     
     # Get or create profile for the user
     profile, created = Profile.objects.get_or_create(user=request.user)